@@ -24,6 +24,10 @@ INSTALL_REQUIRES = [
     'lxml'
 ]
 
+EXTRAS_REQUIRE = {
+    'columnar': ['pyarrow'],
+}
+
 if sys.version_info < (3,):
     INSTALL_REQUIRES.append('configparser')
 
@@ -76,6 +80,7 @@ setup(
     license=find_meta('license'),
     packages=PACKAGES,
     install_requires=INSTALL_REQUIRES,
+    extras_require=EXTRAS_REQUIRE,
     package_dir={'': 'src'},
     classifiers=[
         'Development Status :: 5 - Production/Stable',
@@ -54,9 +54,41 @@ def obo(path, taxids=None):
 @click.option('-f ', '--force_download', default=False, help="if is set latest version of UniProt will be downloaded",
               is_flag=True)
 @click.option('-s', '--silent', help="True if want no output (e.g. cron job)", is_flag=True)
-def update(taxids, conn, force_download, silent):
+@click.option('-w', '--workers', default=1, type=int, help="number of processes parsing the XML file in parallel")
+@click.option('--no-extract', 'no_extract', help="import gzipped XML without extracting it to disk", is_flag=True)
+@click.option('--stream', help="import XML while downloading (no copy on disk)", is_flag=True)
+@click.option('--bulk', help="write entries with batched inserts instead of the ORM (faster)", is_flag=True)
+@click.option('--incremental', help="update only new, changed and removed entries (no reimport)", is_flag=True)
+@click.option('--resume', help="continue an interrupted update of the same release after the last checkpoint",
+              is_flag=True)
+@click.option('-d', '--dataset', default='swissprot', type=click.Choice(['swissprot', 'trembl', 'both']),
+              help="UniProt knowledgebase(s) to import, TrEMBL is always imported with --bulk")
+@click.option('--profile', is_flag=False, flag_value=True, default=None, metavar='[PATH]',
+              help="measure time of import stages, print a table and write JSON report to PATH "
+                   "(default: import_profile.json in data folder)")
+@click.option('--batch-size', 'batch_size', default=None, type=click.IntRange(min=1),
+              help="entries per commit (default: 100, with --bulk 1000)")
+@click.option('--adaptive-batch', 'adaptive_batch', is_flag=True,
+              help="adapt the batch size to flush time and memory after every commit")
+@click.option('--max-rss', 'max_rss', default=None, type=click.IntRange(min=1), metavar='MIB',
+              help="memory budget (RSS in MiB) of the adaptive batch size, implies --adaptive-batch")
+@click.option('--pipeline', help="parse XML in a thread while entries are written", is_flag=True)
+@click.option('--writers', default=1, type=click.IntRange(min=1),
+              help="number of writers (database connections) of --pipeline with --bulk, implies --pipeline")
+@click.option('--compress-sequences', 'sequence_compression', default=None, type=click.Choice(['zlib', 'pack']),
+              help="store sequences compressed: zlib or 5 bits per residue (pack)")
+@click.option('--kmer-index', 'kmer_index', is_flag=True,
+              help="build k-mer index of sequences for motif search (QueryManager.sequence_search)")
+@click.option('--staging', is_flag=True,
+              help="import into staging tables and replace the live tables when completed (no downtime)")
+@click.option('--dry-run', 'dry_run', is_flag=True,
+              help="only parse and extract the XML without touching the database, report entries/s, elements per "
+                   "field and peak memory")
+def update(taxids, conn, force_download, silent, workers, no_extract, stream, bulk, incremental, resume, dataset,
+           profile, batch_size, adaptive_batch, max_rss, pipeline, writers, sequence_compression, kmer_index,
+           staging, dry_run):
     """Update local UniProt database"""
-    if not silent:
+    if not (silent or dry_run):
         click.secho("WARNING: Update is very time consuming and can take several "
                     "hours depending which organisms you are importing!", fg="yellow")
 
@@ -69,7 +101,105 @@ def update(taxids, conn, force_download, silent):
     if taxids:
         taxids = [int(taxid.strip()) for taxid in taxids.strip().split(',') if re.search('^ *\d+ *$', taxid)]
 
-    database.update(taxids=taxids, connection=conn, force_download=force_download, silent=silent)
+    report = database.update(taxids=taxids, connection=conn, force_download=force_download, silent=silent,
+                             workers=workers, extract=not no_extract, stream=stream, bulk=bulk,
+                             incremental=incremental, resume=resume, dataset=dataset, profile=profile,
+                             batch_size=batch_size, adaptive_batch=adaptive_batch,
+                             max_rss=max_rss * 2 ** 20 if max_rss else None, pipeline=pipeline, writers=writers,
+                             sequence_compression=sequence_compression, kmer_index=kmer_index, staging=staging,
+                             dry_run=dry_run)
+
+    if dry_run:
+        from .manager.dryrun import format_dry_run
+        click.echo(format_dry_run(report))
+
+    elif report is not None:
+        from .manager.profiler import format_report
+        click.echo(format_report(report))
+
+
+@main.command()
+@click.argument('directory')
+@click.option('-t', '--taxids', default=None, help='List of organisms converted by NCBI taxonomy IDs, '
+                                                   'e.g. 9606,10090,10116 ')
+@click.option('-f ', '--force_download', default=False, help="if is set latest version of UniProt will be downloaded",
+              is_flag=True)
+@click.option('-s', '--silent', help="True if want no output (e.g. cron job)", is_flag=True)
+@click.option('-w', '--workers', default=1, type=int, help="number of processes parsing the XML file in parallel")
+@click.option('--no-extract', 'no_extract', help="convert gzipped XML without extracting it to disk", is_flag=True)
+@click.option('--stream', help="convert XML while downloading (no copy on disk)", is_flag=True)
+@click.option('-d', '--dataset', default='swissprot', type=click.Choice(['swissprot', 'trembl', 'both']),
+              help="UniProt knowledgebase(s) to convert")
+@click.option('--format', 'file_format', default='parquet', type=click.Choice(['parquet', 'arrow']),
+              help="file format: Parquet (compressed) or Arrow IPC")
+@click.option('--batch-size', 'batch_size', default=None, type=click.IntRange(min=1),
+              help="entries per row group (default: 1000)")
+@click.option('--compress-sequences', 'sequence_compression', default=None, type=click.Choice(['zlib', 'pack']),
+              help="store sequences compressed: zlib or 5 bits per residue (pack)")
+def convert(directory, taxids, force_download, silent, workers, no_extract, stream, dataset, file_format, batch_size,
+            sequence_compression):
+    """Convert UniProt XML to one Parquet/Arrow file per table in DIRECTORY (needs pyarrow)"""
+    if taxids:
+        taxids = [int(taxid.strip()) for taxid in taxids.strip().split(',') if re.search('^ *\d+ *$', taxid)]
+
+    manifest = database.convert(directory, taxids=taxids, force_download=force_download, silent=silent,
+                                workers=workers, extract=not no_extract, stream=stream, dataset=dataset,
+                                file_format=file_format, batch_size=batch_size,
+                                sequence_compression=sequence_compression)
+
+    click.echo('{} entries converted to {}'.format(manifest['entries'], directory))
+
+
+@main.command()
+@click.argument('directory')
+@click.option('-c', '--conn', default=None, help='connection string to database, e.g. {}'.format(example_conn))
+@click.option('--batch-size', 'batch_size', default=None, type=click.IntRange(min=1),
+              help="rows per bulk load (default: 50000)")
+@click.option('--kmer-index', 'kmer_index', is_flag=True,
+              help="build k-mer index of sequences for motif search (QueryManager.sequence_search)")
+@click.option('--staging', is_flag=True,
+              help="load into staging tables and replace the live tables when completed (no downtime)")
+def load(directory, conn, batch_size, kmer_index, staging):
+    """Load a release converted with `pyuniprot convert` from DIRECTORY (replaces all tables)"""
+    counts = database.load(directory, connection=conn, batch_size=batch_size, kmer_index=kmer_index,
+                           staging=staging)
+
+    for name, rows in counts.items():
+        click.echo('{:>12} {}'.format(rows, name))
+
+
+@main.command()
+@click.option('-n', '--entries', default=10000, type=int, help="number of synthetic entries")
+@click.option('--shape', default='default', type=click.Choice(['default', 'swissprot']),
+              help="shape of entries: default (one feature, citation and keyword) or similar to Swiss-Prot")
+@click.option('--bulk', help="write entries with the bulk writer", is_flag=True)
+@click.option('-w', '--workers', default=1, type=int, help="number of processes parsing the XML file in parallel")
+@click.option('--seed', default=0, type=int, help="seed of random number generator")
+@click.option('--json', 'json_path', default=None, help="path to JSON file with results")
+@click.option('--batch-size', 'batch_size', default=None, type=click.IntRange(min=1),
+              help="entries per commit (default: 100, with --bulk 1000)")
+@click.option('--adaptive-batch', 'adaptive_batch', is_flag=True,
+              help="adapt the batch size to flush time and memory after every commit")
+@click.option('--pipeline', help="parse XML in a thread while entries are written", is_flag=True)
+@click.option('--compress-sequences', 'sequence_compression', default=None, type=click.Choice(['zlib', 'pack']),
+              help="store sequences compressed: zlib or 5 bits per residue (pack)")
+def benchmark(entries, shape, bulk, workers, seed, json_path, batch_size, adaptive_batch, pipeline,
+              sequence_compression):
+    """Benchmark import of synthetic UniProt XML into SQLite"""
+    import json
+
+    from .manager.benchmark import format_benchmark, run_benchmark
+    from .manager.synthetic import SWISSPROT_SHAPE
+
+    results = run_benchmark(entries, shape=SWISSPROT_SHAPE if shape == 'swissprot' else None, bulk=bulk,
+                            workers=workers, seed=seed, batch_size=batch_size, adaptive_batch=adaptive_batch,
+                            pipeline=pipeline, sequence_compression=sequence_compression)
+
+    click.echo(format_benchmark(results))
+
+    if json_path:
+        with open(json_path, 'w') as fd:
+            json.dump(results, fd, indent=2)
 
 
 @main.command()
@@ -88,6 +218,33 @@ def mysql(host, user, passwd, db, charset):
     test_connection(connection_string)
 
 
+@main.command('compress-sequences')
+@click.option('-c', '--conn', default=None, help='connection string to database, e.g. {}'.format(example_conn))
+@click.option('-m', '--method', default='zlib', type=click.Choice(['zlib', 'pack', 'text']),
+              help="zlib or 5 bits per residue (pack), text to store sequences uncompressed")
+def compress_sequences(conn, method):
+    """Compress sequences in an existing database and print its size before and after"""
+    db = database.DbManager(conn)
+    size_before, size_after = db.compress_sequences(None if method == 'text' else method)
+    db.session.close()
+
+    click.echo('database size: {} before, {} after'.format(database.format_size(size_before),
+                                                          database.format_size(size_after)))
+
+
+@main.command('build-kmer-index')
+@click.option('-c', '--conn', default=None, help='connection string to database, e.g. {}'.format(example_conn))
+@click.option('-k', '--kmer-size', 'kmer_size', default=4, type=click.IntRange(min=2, max=6),
+              help="length of k-mers (default: 4)")
+def build_kmer_index(conn, kmer_size):
+    """Build the k-mer index of sequences for motif search in an existing database"""
+    db = database.DbManager(conn)
+    kmers = db.build_kmer_index(kmer_size)
+    db.session.close()
+
+    click.echo('{} {}-mers indexed'.format(kmers, kmer_size))
+
+
 @main.command()
 def version():
     click.echo()
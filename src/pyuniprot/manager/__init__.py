@@ -6,5 +6,8 @@ from . import defaults
 from . import models
 from . import database
 from . import query
+from . import extractor
+from . import parallel
+from . import bulk
 
 from . import make_json_serializable
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Number of entries written to the database per transaction (``pyuniprot update --batch-size``).
+
+Larger batches need fewer transactions (commits, checkpoints, round-trips to the server) and write more rows per
+second, but hold more rows (ORM objects or rows buffered by the bulk writer) in memory and take longer to flush.
+
+By default the size is fixed. In adaptive mode (``--adaptive-batch`` or ``--max-rss``) the size of the next batch
+is set after every flush:
+
+1. RSS of the process above `max_rss`: size is halved and not increased above the new size again
+2. flush slower than `max_seconds`: size is reduced to flush within `max_seconds` (and not increased again)
+3. size was increased, but the write rate (entries per second of flush and commit) did not increase by more than
+   `TOLERANCE`: previous size is restored and kept as maximum
+4. otherwise size is doubled if the projected RSS is within `max_rss` (memory used since the start of the import is
+   assumed to grow with the size of the batch)
+"""
+import logging
+
+from .progress import get_rss
+
+log = logging.getLogger(__name__)
+
+MIN_BATCH_SIZE = 10
+MAX_BATCH_SIZE = 100000
+MAX_FLUSH_SECONDS = 10.0
+GROWTH = 2
+TOLERANCE = 0.05  # minimal relative increase of write rate to keep a larger size
+
+
+class BatchSizer(object):
+    """Size of the next batch, adapted to flush time and memory after every flush if `adaptive`
+
+    :param int size: (initial) number of entries per batch
+    :param bool adaptive: if True the size is adapted after every flush
+    :param Optional[int] max_rss: RSS budget of the process in bytes (adaptive only)
+    :param float max_seconds: maximum seconds per flush (adaptive only)
+    :param int minimum: minimum size (adaptive only)
+    :param int maximum: maximum size (adaptive only)
+    """
+
+    def __init__(self, size, adaptive=False, max_rss=None, max_seconds=MAX_FLUSH_SECONDS, minimum=MIN_BATCH_SIZE,
+                 maximum=MAX_BATCH_SIZE):
+        if size < 1:
+            raise ValueError('batch size must be positive, not {}'.format(size))
+
+        self.size = size
+        self.adaptive = adaptive
+        self.max_rss = max_rss
+        self.max_seconds = max_seconds
+        self.minimum = min(minimum, size)
+        self.maximum = max(maximum, size)
+        self.baseline_rss = get_rss()
+        self.previous_size = None
+        self.rates = {}  # size -> entries per second of last flush with this size
+        self.history = []  # (size, entries, seconds, RSS) per flush
+
+    def update(self, entries, seconds):
+        """Adds the time to write a batch and returns the size of the next batch
+
+        :param int entries: number of entries in the batch
+        :param float seconds: seconds to write (flush and commit) the batch
+        :rtype: int
+        """
+        rss = get_rss()
+        self.history.append((self.size, entries, seconds, rss))
+
+        # last batch of an import is smaller and not comparable
+        if not self.adaptive or entries < self.size:
+            return self.size
+
+        rate = entries / max(seconds, 1e-9)
+        previous_rate = self.rates.get(self.previous_size)
+        size = self.size
+
+        if self.max_rss and rss and rss > self.max_rss:
+            size = self.maximum = max(size // 2, self.minimum)
+            reason = 'RSS {:.1f} MiB above budget'.format(rss / 2 ** 20)
+
+        elif seconds > self.max_seconds:
+            size = self.maximum = max(int(size * self.max_seconds / seconds), self.minimum)
+            reason = 'flush took {:.1f} s'.format(seconds)
+
+        elif self.previous_size is not None and self.previous_size < size and previous_rate is not None \
+                and rate < previous_rate * (1 + TOLERANCE):
+            size = self.maximum = self.previous_size
+            reason = '{:.0f} entries/s, not faster than {:.0f} entries/s'.format(rate, previous_rate)
+
+        elif size < self.maximum and self.can_grow(rss):
+            size = min(size * GROWTH, self.maximum)
+            reason = '{:.0f} entries/s'.format(rate)
+
+        self.rates[self.size] = rate
+
+        if size != self.size:
+            log.info('batch size {} -> {} ({})'.format(self.size, size, reason))
+            self.previous_size, self.size = self.size, size
+
+        return self.size
+
+    def can_grow(self, rss):
+        """Returns True if the projected RSS of the next larger size is within the budget
+
+        :param Optional[int] rss: current RSS in bytes
+        :rtype: bool
+        """
+        if not self.max_rss or rss is None or self.baseline_rss is None:
+            return True
+
+        return self.baseline_rss + max(rss - self.baseline_rss, 0) * GROWTH <= self.max_rss
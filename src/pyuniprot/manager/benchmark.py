@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""Offline import benchmark with synthetic UniProt XML (see :mod:`pyuniprot.manager.synthetic`).
+
+:func:`run_benchmark` writes a gzipped synthetic XML file and imports it with :func:`DbManager.import_xml` into a new
+SQLite database. The import runs in a new (spawned) process, so the measured peak RSS is not influenced by the
+calling process::
+
+    from pyuniprot.manager.benchmark import format_benchmark, run_benchmark
+    from pyuniprot.manager.synthetic import SWISSPROT_SHAPE
+
+    print(format_benchmark(run_benchmark(100000, shape=SWISSPROT_SHAPE, bulk=True)))
+
+or on the command line::
+
+    pyuniprot benchmark --entries 100000 --shape swissprot --bulk
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from collections import OrderedDict
+
+from sqlalchemy import func, select
+
+from . import defaults, models
+from .progress import get_peak_rss
+from .synthetic import write_synthetic_version_file, write_synthetic_xml
+
+log = logging.getLogger(__name__)
+
+
+def import_benchmark(xml_file_path, version_file_path, database_path, bulk=False, workers=1,
+                     knowledgebase='Swiss-Prot', batch_size=None, adaptive_batch=False, pipeline=False,
+                     sequence_compression=None):
+    """Imports XML into a new SQLite database and measures time, peak RSS and rows per table (runs in own process)
+
+    :param str xml_file_path: path to XML file
+    :param str version_file_path: path to reldate.txt
+    :param str database_path: path to new SQLite database
+    :param bool bulk: if True entries are written with the bulk writer
+    :param int workers: number of parser processes
+    :param str knowledgebase: Swiss-Prot or TrEMBL
+    :param Optional[int] batch_size: entries per commit (default of :func:`DbManager.import_xml` if None)
+    :param bool adaptive_batch: if True the batch size is adapted (see :mod:`pyuniprot.manager.batching`)
+    :param bool pipeline: if True parsing and writing overlap (see :mod:`pyuniprot.manager.pipeline`)
+    :param Optional[str] sequence_compression: zlib or pack to store sequences compressed
+    :return: import and constraint seconds, RSS before import and peak RSS (bytes), rows per table, batch size
+    :rtype: dict
+    """
+    from .database import DbManager
+
+    db = DbManager('sqlite:///' + database_path)
+    db._create_tables(defer_constraints=bulk)
+    db.import_version(version_file_path)
+
+    baseline_rss = get_peak_rss()
+
+    start = time.perf_counter()
+    db.import_xml(xml_file_path, silent=True, workers=workers, bulk=bulk, knowledgebase=knowledgebase,
+                  batch_size=batch_size, adaptive_batch=adaptive_batch, pipeline=pipeline,
+                  sequence_compression=sequence_compression)
+    import_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    db._create_constraints()
+    constraints_seconds = time.perf_counter() - start
+
+    rows = OrderedDict()
+
+    with db.engine.connect() as connection:
+        for table in models.Base.metadata.sorted_tables:
+            if table.name.startswith(defaults.TABLE_PREFIX):
+                name = table.name[len(defaults.TABLE_PREFIX):]
+                rows[name] = connection.execute(select(func.count()).select_from(table)).scalar()
+
+    db.session.close()
+
+    return {
+        'entries': db.entries_read,
+        'import_seconds': import_seconds,
+        'constraints_seconds': constraints_seconds,
+        'baseline_rss': baseline_rss,
+        'peak_rss': get_peak_rss(),
+        'rows': rows,
+        'batch_size': db.batch_sizer.size,
+        'pipeline': db.import_pipeline.get_stats() if pipeline else None,
+    }
+
+
+def run_benchmark(entries=10000, shape=None, bulk=False, workers=1, dataset='Swiss-Prot', seed=0, tmp_dir=None,
+                  batch_size=None, adaptive_batch=False, pipeline=False, sequence_compression=None):
+    """Generates synthetic XML and measures its import into SQLite
+
+    :param int entries: number of entries
+    :param Optional[dict] shape: shape of entries (see :mod:`pyuniprot.manager.synthetic`)
+    :param bool bulk: if True entries are written with the bulk writer
+    :param int workers: number of parser processes
+    :param str dataset: Swiss-Prot or TrEMBL
+    :param int seed: seed of random number generator
+    :param Optional[str] tmp_dir: folder for XML file and database (kept), temporary folder (removed) if None
+    :param Optional[int] batch_size: entries per commit (default of :func:`DbManager.import_xml` if None)
+    :param bool adaptive_batch: if True the batch size is adapted (see :mod:`pyuniprot.manager.batching`)
+    :param bool pipeline: if True parsing and writing overlap (see :mod:`pyuniprot.manager.pipeline`)
+    :param Optional[str] sequence_compression: zlib or pack to store sequences compressed
+    :return: benchmark results: entries per second, peak RSS and rows (per second) per table
+    :rtype: dict
+    """
+    folder = tmp_dir or tempfile.mkdtemp()
+
+    try:
+        xml_file_path = os.path.join(folder, 'synthetic.xml.gz')
+        version_file_path = os.path.join(folder, defaults.VERSION_FILE_NAME)
+        database_path = os.path.join(folder, 'benchmark.db')
+
+        if os.path.exists(database_path):
+            os.remove(database_path)
+
+        start = time.perf_counter()
+        write_synthetic_xml(xml_file_path, entries, dataset, seed, shape)
+        write_synthetic_version_file(version_file_path)
+        generate_seconds = time.perf_counter() - start
+
+        log.info('import {} synthetic entries (bulk={}, workers={})'.format(entries, bulk, workers))
+
+        # spawned process: peak RSS of import only, not of this process
+        pool = multiprocessing.get_context('spawn').Pool(1)
+
+        try:
+            result = pool.apply(import_benchmark, (xml_file_path, version_file_path, database_path, bulk, workers,
+                                                   dataset, batch_size, adaptive_batch, pipeline,
+                                                   sequence_compression))
+        finally:
+            pool.close()
+            pool.join()
+
+        import_seconds = result['import_seconds']
+
+        tables = OrderedDict(
+            (table, OrderedDict([('rows', rows), ('rows_per_second', round(rows / import_seconds, 1))]))
+            for table, rows in result['rows'].items()
+        )
+
+        return OrderedDict([
+            ('entries', result['entries']),
+            ('bulk', bulk),
+            ('workers', workers),
+            ('adaptive_batch', adaptive_batch),
+            ('batch_size', result['batch_size']),
+            ('pipeline', result['pipeline']),
+            ('sequence_compression', sequence_compression),
+            ('xml_bytes', os.path.getsize(xml_file_path)),
+            ('generate_seconds', round(generate_seconds, 3)),
+            ('import_seconds', round(import_seconds, 3)),
+            ('constraints_seconds', round(result['constraints_seconds'], 3)),
+            ('entries_per_second', round(result['entries'] / import_seconds, 1)),
+            ('rows_per_second', round(sum(result['rows'].values()) / import_seconds, 1)),
+            ('baseline_rss', result['baseline_rss']),
+            ('peak_rss', result['peak_rss']),
+            ('database_bytes', os.path.getsize(database_path)),
+            ('tables', tables),
+        ])
+    finally:
+        if tmp_dir is None:
+            shutil.rmtree(folder)
+
+
+def format_benchmark(results):
+    """Formats results of :func:`run_benchmark` as text with one line per table
+
+    :param dict results: results of :func:`run_benchmark`
+    :rtype: str
+    """
+    mib = 2 ** 20
+
+    lines = [
+        '{} entries (bulk={}, workers={}), XML {:.1f} MiB gzipped'.format(
+            results['entries'], results['bulk'], results['workers'], results['xml_bytes'] / mib),
+        'batch size: {}{}'.format(results['batch_size'], ' (adaptive, last)' if results['adaptive_batch'] else ''),
+        'import: {:.2f} s, {:.1f} entries/s, {:.1f} rows/s'.format(
+            results['import_seconds'], results['entries_per_second'], results['rows_per_second']),
+        'constraints and indexes: {:.2f} s'.format(results['constraints_seconds']),
+    ]
+
+    if results['peak_rss'] is not None:
+        lines.append('peak RSS: {:.1f} MiB ({:.1f} MiB before import)'.format(
+            results['peak_rss'] / mib, results['baseline_rss'] / mib))
+
+    lines.append('database: {:.1f} MiB{}'.format(
+        results['database_bytes'] / mib,
+        ', sequences compressed with ' + results['sequence_compression'] if results.get('sequence_compression')
+        else ''))
+
+    pipeline = results.get('pipeline')
+
+    if pipeline:
+        lines.append('pipeline: parser busy {}% ({} entries/s), blocked {}%; writer busy {}% ({} entries/s), '
+                     'waiting {}%; queue depth mean {}'.format(
+                         pipeline['parser']['busy_percent'], pipeline['parser']['entries_per_second'],
+                         pipeline['parser']['wait_percent'], pipeline['writer']['busy_percent'],
+                         pipeline['writer']['entries_per_second'], pipeline['writer']['wait_percent'],
+                         pipeline['queue_depth_mean']))
+
+    width = max(len(table) for table in results['tables'])
+    lines.append('')
+    lines.append('{:<{width}}  {:>10}  {:>12}'.format('table', 'rows', 'rows/s', width=width))
+
+    for table, stats in results['tables'].items():
+        lines.append('{:<{width}}  {:>10}  {:>12.1f}'.format(table, stats['rows'], stats['rows_per_second'],
+                                                          width=width))
+
+    return '\n'.join(lines)
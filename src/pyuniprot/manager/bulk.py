@@ -0,0 +1,523 @@
+# -*- coding: utf-8 -*-
+"""Bulk writer for the import of UniProt entries with SQLAlchemy Core.
+
+Instead of building a graph of ORM objects for every entry, rows are collected per table and written with one
+`executemany` per table and batch. Primary keys are assigned in Python, so foreign keys (``entry_id``,
+``disease_id``) and the many-to-many tables (``entry_pmid``, ``entry_keyword``, ...) are known without a round-trip
+to the database.
+
+The writer consumes the plain row tuples created by :func:`pyuniprot.manager.database.DbManager.get_entry_rows`.
+
+Buffered rows can also be taken as batch (:func:`BulkWriter.take_batch`) and written by other threads
+(:func:`BulkWriter.write_batch`), every thread with its own connection (see :mod:`pyuniprot.manager.pipeline`).
+
+With `native=True` (default) the fastest load path of the database is used:
+
+- PostgreSQL: ``COPY ... FROM STDIN`` with tab separated text per table and batch
+- MySQL/MariaDB: ``LOAD DATA LOCAL INFILE`` with a temporary tab separated file per table and batch (needs
+  ``local_infile=1`` in the connection string and on the server, otherwise `executemany` is used)
+- SQLite: ``PRAGMA journal_mode=MEMORY`` and ``PRAGMA synchronous=OFF`` while the writer is open
+
+Every batch is committed in its own transaction (also on SQLite), because the checkpoint of a resumable import is
+saved with the batch. With the rollback journal in memory and without fsync a commit on SQLite costs almost nothing,
+while a failed batch is still rolled back (without journal, ``journal_mode=OFF``, a rollback corrupts the database).
+A crash of the process or operating system during a batch may still corrupt the database file.
+
+If ``LOAD DATA LOCAL INFILE`` fails once (e.g. ``local_infile`` disabled on the server), the writer uses
+`executemany` for the rest of the import.
+"""
+import abc
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import Date, LargeBinary, exc, func, select, text
+
+from . import models
+from .compression import get_sequence_columns
+from .database import ENTRY_COLUMNS, ENTRY_CHILD_ROWS
+
+log = logging.getLogger(__name__)
+
+PMID_COLUMNS = ('pmid', 'last', 'first', 'volume', 'name', 'date', 'title')
+DISEASE_COLUMNS = ('identifier', 'ref_id', 'ref_type', 'name', 'acronym', 'description')
+
+BATCH_SIZE = 1000  # entries written with one executemany per table
+
+NULL = '\\N'
+ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+SQLITE_PRAGMAS = OrderedDict([('journal_mode', 'MEMORY'), ('synchronous', 'OFF')])  # set while the writer is open
+
+
+def encode_tsv(table, rows):
+    """Encodes rows as tab separated text in the format of PostgreSQL ``COPY`` and MySQL ``LOAD DATA`` (``\\N`` is
+    NULL, tab, newline and backslash are escaped with a backslash, binary values are hex strings starting with
+    ``\\x`` like PostgreSQL ``bytea``)
+
+    :param table: `sqlalchemy.Table`
+    :param list[dict] rows: rows with the same keys
+    :return: column names and text
+    :rtype: tuple[list[str],str]
+    """
+    columns = list(rows[0])
+    dates = {name for name in columns if isinstance(table.c[name].type, Date)}
+    binaries = {name for name in columns if isinstance(table.c[name].type, LargeBinary)}
+    lines = []
+
+    for row in rows:
+        fields = []
+
+        for name in columns:
+            value = row[name]
+
+            if value is None:
+                fields.append(NULL)
+            else:
+                if name in dates and isinstance(value, datetime):
+                    value = value.date()
+                elif name in binaries:
+                    value = '\\x' + bytes(value).hex()
+                fields.append(str(value).translate(ESCAPES))
+
+        lines.append('\t'.join(fields))
+
+    return columns, '\n'.join(lines) + '\n'
+
+
+class RowBuffer(abc.ABC):
+    """Collects rows of UniProt entries per table with primary keys assigned in Python
+
+    Rows of tables with unique values (e.g. ``pmid``, ``keyword``) are buffered only once, later entries are linked to
+    the same primary key. Used by :class:`BulkWriter` and :class:`pyuniprot.manager.columnar.ColumnarWriter`.
+
+    :param int batch_size: number of entries buffered before rows are written
+    :param Optional[str] sequence_compression: zlib or pack to store sequences compressed (see
+        :mod:`pyuniprot.manager.compression`)
+    :param kmer_builder: optional :class:`pyuniprot.manager.kmers.KmerIndexBuilder` collecting the k-mers of every
+        buffered sequence
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, sequence_compression=None, kmer_builder=None):
+        self.batch_size = batch_size
+        self.sequence_compression = sequence_compression
+        self.kmer_builder = kmer_builder
+
+        # tables in order of insertion (referenced tables first)
+        self.tables = OrderedDict((table.name, table) for table in (
+            models.Entry.__table__,
+            models.Pmid.__table__,
+            models.Keyword.__table__,
+            models.SubcellularLocation.__table__,
+            models.TissueInReference.__table__,
+            models.Disease.__table__,
+            models.Sequence.__table__,
+            models.DiseaseComment.__table__,
+        ))
+
+        for _, model, _ in ENTRY_CHILD_ROWS:
+            self.tables[model.__table__.name] = model.__table__
+
+        self.link_columns = {}
+
+        for table in (models.entry_pmid, models.entry_keyword, models.entry_subcellular_location,
+                      models.entry_tissue_in_reference):
+            self.tables[table.name] = table
+            self.link_columns[table.name] = [c.name for c in table.columns if c.name != 'entry_id'][0]
+
+        self.buffers = OrderedDict((name, []) for name in self.tables)
+        self.next_ids = {}
+
+        # value -> primary key of tables with unique values
+        self.pmid_ids = {}
+        self.keyword_ids = {}
+        self.subcellular_location_ids = {}
+        self.tissue_ids = {}
+        self.disease_ids = {}
+
+        self.buffered_entries = 0
+
+    def get_max_id(self, table):
+        """Returns the highest primary key already used in a table (0 for new rows only)
+
+        :param table: `sqlalchemy.Table`
+        :rtype: int
+        """
+        return 0
+
+    def get_next_id(self, model):
+        """Returns next free primary key of a model
+
+        :param model: SQLAlchemy model
+        :rtype: int
+        """
+        table = model.__table__
+
+        if table.name not in self.next_ids:
+            self.next_ids[table.name] = self.get_max_id(table) + 1
+
+        next_id = self.next_ids[table.name]
+        self.next_ids[table.name] += 1
+        return next_id
+
+    def buffer(self, model, row_dict):
+        """Adds a row (with new primary key) to the buffer of the model table
+
+        :param model: SQLAlchemy model
+        :param dict row_dict: column name -> value
+        :return: primary key of the new row
+        :rtype: int
+        """
+        row_dict['id'] = self.get_next_id(model)
+        self.buffers[model.__table__.name].append(row_dict)
+        return row_dict['id']
+
+    def get_unique_id(self, cache, key, model, row_dict):
+        """Returns the primary key of a row in a table with unique values, new rows are buffered only once
+
+        :param dict cache: key -> primary key
+        :param key: unique value
+        :param model: SQLAlchemy model
+        :param dict row_dict: column name -> value (used if key is new)
+        :rtype: int
+        """
+        if key not in cache:
+            cache[key] = self.buffer(model, row_dict)
+        return cache[key]
+
+    def link(self, table, entry_id, other_id):
+        """Adds a row to a many-to-many table
+
+        :param table: many-to-many `sqlalchemy.Table`
+        :param int entry_id: primary key of entry
+        :param int other_id: primary key of linked row
+        """
+        self.buffers[table.name].append({'entry_id': entry_id, self.link_columns[table.name]: other_id})
+
+    def add_entry(self, rows):
+        """Adds an UniProt entry created by :func:`pyuniprot.manager.database.DbManager.get_entry_rows`, writes all
+        buffered rows if `batch_size` entries are buffered
+
+        :param dict rows: rows of one entry
+        """
+        self.buffer_entry(rows)
+
+        if self.buffered_entries >= self.batch_size:
+            self.flush()
+
+    def buffer_entry(self, rows):
+        """Adds the rows of an UniProt entry to the buffers
+
+        :param dict rows: rows of one entry
+        """
+        entry_id = self.buffer(models.Entry, dict(zip(ENTRY_COLUMNS, rows['entry'])))
+
+        for key, model, columns in ENTRY_CHILD_ROWS:
+            for row in rows[key]:
+                row_dict = dict(zip(columns, row))
+                row_dict['entry_id'] = entry_id
+                self.buffer(model, row_dict)
+
+        plain_sequence, compressed_sequence = get_sequence_columns(rows['sequence'], self.sequence_compression)
+        sequence_id = self.buffer(models.Sequence, {'sequence': plain_sequence,
+                                                    'compressed_sequence': compressed_sequence,
+                                                    'checksum': rows['sequence_checksum'], 'entry_id': entry_id})
+
+        if self.kmer_builder is not None:
+            self.kmer_builder.add(sequence_id, rows['sequence'])
+
+        for pmid, pmid_dict in rows['pmids']:
+            row_dict = {column: pmid_dict.get(column) for column in PMID_COLUMNS}
+            pmid_id = self.get_unique_id(self.pmid_ids, pmid, models.Pmid, row_dict)
+            self.link(models.entry_pmid, entry_id, pmid_id)
+
+        for identifier, name in rows['keywords']:
+            row_dict = {'identifier': identifier, 'name': name}
+            keyword_id = self.get_unique_id(self.keyword_ids, identifier, models.Keyword, row_dict)
+            self.link(models.entry_keyword, entry_id, keyword_id)
+
+        for location, in rows['subcellular_locations']:
+            row_dict = {'location': location}
+            location_id = self.get_unique_id(self.subcellular_location_ids, location, models.SubcellularLocation,
+                                             row_dict)
+            self.link(models.entry_subcellular_location, entry_id, location_id)
+
+        for tissue, in rows['tissue_in_references']:
+            tissue_id = self.get_unique_id(self.tissue_ids, tissue, models.TissueInReference, {'tissue': tissue})
+            self.link(models.entry_tissue_in_reference, entry_id, tissue_id)
+
+        for comment, disease_dict in rows['disease_comments']:
+            disease_id = None
+
+            if disease_dict is not None:
+                row_dict = {column: disease_dict.get(column) for column in DISEASE_COLUMNS}
+                disease_id = self.get_unique_id(self.disease_ids, disease_dict['identifier'], models.Disease,
+                                                row_dict)
+
+            self.buffer(models.DiseaseComment, {'comment': comment, 'disease_id': disease_id, 'entry_id': entry_id})
+
+        self.buffered_entries += 1
+
+    def take_batch(self):
+        """Returns all buffered rows and empties the buffers
+
+        :return: table name -> rows and number of entries
+        :rtype: tuple[OrderedDict,int]
+        """
+        buffers, entries = self.buffers, self.buffered_entries
+        self.buffers = OrderedDict((name, []) for name in self.tables)
+        self.buffered_entries = 0
+        return buffers, entries
+
+    @abc.abstractmethod
+    def flush(self):
+        """Writes (or discards) all buffered rows, implemented by the writers"""
+
+
+class BulkWriter(RowBuffer):
+    """Collects rows of UniProt entries per table and writes them in batches
+
+    :param engine: SQLAlchemy engine
+    :param int batch_size: number of entries buffered before rows are written to the database
+    :param on_flush: optional function called with the connection at the end of every flush transaction (e.g. to
+        save a checkpoint)
+    :param bool native: if True the native bulk load of the database is used (see module documentation)
+    :param batch_sizer: optional :class:`pyuniprot.manager.batching.BatchSizer` setting `batch_size` after every
+        flush
+    :param Optional[str] sequence_compression: zlib or pack to store sequences compressed (see
+        :mod:`pyuniprot.manager.compression`)
+    :param kmer_builder: optional :class:`pyuniprot.manager.kmers.KmerIndexBuilder` collecting the k-mers of every
+        written sequence (k-mer index built during the import)
+    """
+
+    def __init__(self, engine, batch_size=BATCH_SIZE, on_flush=None, native=True, batch_sizer=None,
+                 sequence_compression=None, kmer_builder=None):
+        super(BulkWriter, self).__init__(batch_size, sequence_compression, kmer_builder)
+        self.engine = engine
+        self.batch_sizer = batch_sizer
+        self.on_flush = on_flush
+        self.dialect = engine.dialect.name
+        self.native = native and self.dialect in ('postgresql', 'mysql', 'sqlite')
+        self.connection = engine.connect()
+        self.thread_id = threading.get_ident()
+        self.local = threading.local()  # connection of other threads writing batches
+        self.connections = []
+        self.lock = threading.Lock()
+        self.sqlite_pragmas = {}
+
+        if self.native and self.dialect == 'sqlite':
+            for pragma, value in SQLITE_PRAGMAS.items():
+                self.sqlite_pragmas[pragma] = self.connection.exec_driver_sql('PRAGMA ' + pragma).scalar()
+                self.connection.exec_driver_sql('PRAGMA {} = {}'.format(pragma, value))
+            self.connection.commit()
+
+        self.written_entries = 0
+
+    def get_max_id(self, table):
+        """Returns the highest primary key in a table of the database
+
+        :param table: `sqlalchemy.Table`
+        :rtype: int
+        """
+        with self.engine.connect() as connection:
+            return connection.execute(select(func.max(table.c.id))).scalar() or 0
+
+    def load_unique_ids(self):
+        """Loads primary keys of rows with unique values already in the database (incremental update)"""
+        with self.engine.connect() as connection:
+            for cache, column in ((self.pmid_ids, models.Pmid.pmid),
+                                  (self.keyword_ids, models.Keyword.identifier),
+                                  (self.subcellular_location_ids, models.SubcellularLocation.location),
+                                  (self.tissue_ids, models.TissueInReference.tissue),
+                                  (self.disease_ids, models.Disease.identifier)):
+                for key, primary_key in connection.execute(select(column, column.class_.id)):
+                    cache[str(key) if column is models.Pmid.pmid else key] = primary_key
+
+    def flush(self):
+        """Writes all buffered rows to the database in one transaction (one executemany or native load per table)"""
+        commit = self.write_batch(*self.take_batch(), on_flush=self.on_flush)
+        commit()
+
+    def write_batch(self, buffers, entries, on_flush=None):
+        """Writes a batch of rows (see :func:`take_batch`) in a new transaction of the connection of the calling
+        thread. The transaction is committed by the returned function.
+
+        :param dict buffers: table name -> rows
+        :param int entries: number of entries in batch
+        :param on_flush: optional function called with the connection at the end of the transaction
+        :return: function committing the transaction, its attribute `rollback` rolls the transaction back instead
+        """
+        start = time.perf_counter()
+        connection = self.get_connection()
+        transaction = connection.begin()
+
+        try:
+            for name, rows in buffers.items():
+                if rows:
+                    self.write(self.tables[name], rows, connection)
+
+            if on_flush is not None:
+                on_flush(connection)
+        except BaseException:
+            transaction.rollback()
+            raise
+
+        def commit():
+            transaction.commit()
+
+            with self.lock:
+                self.written_entries += entries
+
+                if self.batch_sizer is not None and entries:
+                    self.batch_size = self.batch_sizer.update(entries, time.perf_counter() - start)
+
+        commit.rollback = transaction.rollback
+        return commit
+
+    def get_connection(self):
+        """Returns the connection of the calling thread (connection of writer or new connection in other threads)"""
+        if threading.get_ident() == self.thread_id:
+            return self.connection
+
+        connection = getattr(self.local, 'connection', None)
+
+        if connection is None:
+            connection = self.local.connection = self.engine.connect()
+
+            with self.lock:
+                self.connections.append(connection)
+
+        return connection
+
+    def write(self, table, rows, connection=None):
+        """Writes rows to a table with `COPY` (PostgreSQL), `LOAD DATA` (MySQL) or `executemany`
+
+        :param table: `sqlalchemy.Table`
+        :param list[dict] rows: rows with the same keys
+        :param connection: connection, default connection of writer
+        """
+        connection = connection if connection is not None else self.connection
+
+        if self.native and self.dialect == 'postgresql':
+            self.copy_postgresql(table, rows, connection)
+
+        elif self.native and self.dialect == 'mysql':
+            try:
+                self.load_data_mysql(table, rows, connection)
+            except exc.DBAPIError as e:
+                log.warning('LOAD DATA LOCAL INFILE not possible (%s), INSERT is used for all remaining batches '
+                            'of this import', e.orig)
+                self.native = False
+                connection.execute(table.insert(), rows)
+
+        else:
+            connection.execute(table.insert(), rows)
+
+    def copy_postgresql(self, table, rows, connection=None):
+        """Writes rows with ``COPY ... FROM STDIN`` (psycopg2 or psycopg 3)
+
+        :param table: `sqlalchemy.Table`
+        :param list[dict] rows: rows with the same keys
+        :param connection: connection, default connection of writer
+        """
+        connection = connection if connection is not None else self.connection
+        columns, data = encode_tsv(table, rows)
+        quote = self.engine.dialect.identifier_preparer.quote
+        sql = 'COPY {} ({}) FROM STDIN'.format(quote(table.name), ', '.join(quote(c) for c in columns))
+
+        cursor = connection.connection.cursor()
+
+        if hasattr(cursor, 'copy_expert'):
+            cursor.copy_expert(sql, io.StringIO(data))
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(data)
+
+        cursor.close()
+
+    def load_data_mysql(self, table, rows, connection=None):
+        """Writes rows with ``LOAD DATA LOCAL INFILE`` from a temporary file
+
+        :param table: `sqlalchemy.Table`
+        :param list[dict] rows: rows with the same keys
+        :param connection: connection, default connection of writer
+        """
+        connection = connection if connection is not None else self.connection
+        columns, data = encode_tsv(table, rows)
+        quote = self.engine.dialect.identifier_preparer.quote
+
+        # binary values (hex strings with prefix \x, see encode_tsv) are read into variables and decoded
+        binaries = [c for c in columns if isinstance(table.c[c].type, LargeBinary)]
+        targets = ['@' + c if c in binaries else quote(c) for c in columns]
+        assignments = ', '.join('{} = UNHEX(SUBSTRING(@{}, 3))'.format(quote(c), c) for c in binaries)
+
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.tsv', delete=False) as fd:
+            fd.write(data)
+
+        try:
+            connection.exec_driver_sql(
+                "LOAD DATA LOCAL INFILE '{}' INTO TABLE {} CHARACTER SET utf8mb4 ({}){}".format(
+                    fd.name.replace('\\', '/'), quote(table.name), ', '.join(targets),
+                    ' SET ' + assignments if assignments else ''
+                )
+            )
+        finally:
+            os.remove(fd.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def close(self):
+        """Writes remaining rows, synchronizes sequences of primary keys (PostgreSQL) and restores settings
+        (SQLite)"""
+        try:
+            self.flush()
+
+            if self.dialect == 'postgresql':
+                with self.connection.begin():
+                    for name, table in self.tables.items():
+                        if 'id' in table.columns:
+                            self.connection.execute(text(
+                                "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                                "COALESCE((SELECT MAX(id) FROM {0}), 1))".format(name)
+                            ))
+        except BaseException:
+            self.abort()
+            raise
+
+        self.release()
+        log.info('%s entries written with bulk writer', self.written_entries)
+
+    def abort(self):
+        """Discards buffered rows, rolls back open transactions, restores settings (SQLite) and closes all
+        connections (after an error)"""
+        self.take_batch()
+        self.release()
+        log.info('bulk writer aborted after %s entries', self.written_entries)
+
+    def release(self):
+        """Rolls back open transactions, restores settings (SQLite) and closes all connections"""
+        try:
+            if self.connection.in_transaction():
+                self.connection.rollback()
+
+            for pragma, value in self.sqlite_pragmas.items():
+                self.connection.exec_driver_sql('PRAGMA {} = {}'.format(pragma, value))
+            self.connection.commit()
+        finally:
+            self.connection.close()
+
+            for connection in self.connections:
+                connection.close()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Checksums of amino acid sequences for indexed lookup of exact sequences.
+
+Every sequence gets the CRC64 checksum used by UniProt (ISO 3309 polynomial, see the attribute ``checksum`` of
+``<sequence>`` in UniProt XML) in the indexed column ``checksum`` of :class:`pyuniprot.manager.models.Sequence`.
+Queries of exact sequences look up the checksum first and compare only the sequences with the same checksum, so
+identical sequences are found without a full table scan.
+"""
+import re
+
+CHECKSUM_PATTERN = re.compile('[0-9A-Fa-f]{16}')
+
+
+def get_crc64_table():
+    """Returns lookup table of the reflected CRC64 polynomial x^64 + x^4 + x^3 + x + 1
+
+    :rtype: tuple[int]
+    """
+    table = []
+
+    for byte in range(256):
+        crc = byte
+
+        for _ in range(8):
+            crc = (crc >> 1) ^ (0xD800000000000000 if crc & 1 else 0)
+
+        table.append(crc)
+
+    return tuple(table)
+
+
+CRC64_TABLE = get_crc64_table()
+
+
+def crc64(sequence):
+    """Returns the CRC64 checksum of a sequence like in UniProt
+
+    :param Optional[str] sequence: amino acid sequence
+    :return: checksum as 16 upper case hex digits
+    :rtype: Optional[str]
+    """
+    if sequence is None:
+        return None
+
+    crc = 0
+    table = CRC64_TABLE
+
+    for byte in sequence.encode('utf-8'):
+        crc = table[(crc ^ byte) & 0xff] ^ (crc >> 8)
+
+    return '{:016X}'.format(crc)
+
+
+def get_checksum(sequence, checksum=None):
+    """Returns the checksum of a sequence, the checksum of the UniProt XML file if given
+
+    :param Optional[str] sequence: amino acid sequence
+    :param Optional[str] checksum: attribute ``checksum`` of ``<sequence>`` in UniProt XML (CRC64)
+    :rtype: Optional[str]
+    """
+    if checksum is not None and CHECKSUM_PATTERN.fullmatch(checksum):
+        return checksum.upper()
+
+    return crc64(sequence)
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""Columnar intermediate format of a UniProt release (``pyuniprot convert`` and ``pyuniprot load``).
+
+The XML is parsed once and written as one file per table (``entry``, ``accession``, ``feature``, ``db_reference``,
+the many-to-many tables ``entry_pmid``, ... with the table prefix) into a directory. Primary keys and foreign keys are
+assigned while converting (see :class:`pyuniprot.manager.bulk.RowBuffer`), so loading the files into a database is a
+bulk copy of every table without parsing (see :func:`pyuniprot.manager.database.DbManager.load_columnar`).
+
+Files are written as `parquet` (compressed, default) or `arrow` (Arrow IPC, uncompressed, memory mapped while
+loading) with `pyarrow <https://arrow.apache.org/docs/python/>`_, which has to be installed (``pip install pyarrow``).
+
+``manifest.json`` in the directory lists the tables with file name and number of rows, the releases of the
+knowledgebases and the number of entries, it is written after all tables and marks the conversion as complete.
+"""
+import json
+import logging
+import os
+
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import Date, DateTime, Integer, LargeBinary
+
+from .bulk import BATCH_SIZE, RowBuffer
+
+log = logging.getLogger(__name__)
+
+PARQUET = 'parquet'
+ARROW = 'arrow'
+FORMATS = (PARQUET, ARROW)
+
+FORMAT_VERSION = 1
+MANIFEST_FILE_NAME = 'manifest.json'
+
+LOAD_BATCH_SIZE = 50000  # rows per table written with one bulk load while loading
+
+
+def import_pyarrow():
+    """Returns the module pyarrow, raises ImportError with installation hint if not installed
+
+    :rtype: module
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('pyarrow is needed for the columnar format, install it with `pip install pyarrow`')
+
+    return pyarrow
+
+
+def check_file_format(file_format):
+    """Raises ValueError if `file_format` is not supported
+
+    :param str file_format: parquet or arrow
+    """
+    if file_format not in FORMATS:
+        raise ValueError('unknown file format {}, use one of {}'.format(file_format, ', '.join(FORMATS)))
+
+
+def get_arrow_type(column):
+    """Returns the Arrow type of a column
+
+    :param column: `sqlalchemy.Column`
+    :rtype: pyarrow.DataType
+    """
+    pa = import_pyarrow()
+
+    # DateTime before Date, LargeBinary before other types
+    for sql_type, arrow_type in ((DateTime, pa.timestamp('us')),
+                                 (Date, pa.date32()),
+                                 (Integer, pa.int64()),
+                                 (LargeBinary, pa.binary())):
+        if isinstance(column.type, sql_type):
+            return arrow_type
+
+    return pa.string()
+
+
+def get_arrow_schema(table):
+    """Returns the Arrow schema of a table (all columns, nullable)
+
+    :param table: `sqlalchemy.Table`
+    :rtype: pyarrow.Schema
+    """
+    pa = import_pyarrow()
+    return pa.schema([pa.field(column.name, get_arrow_type(column)) for column in table.columns])
+
+
+def get_file_name(table_name, file_format=PARQUET):
+    """Returns the file name of a table
+
+    :param str table_name: name of table
+    :param str file_format: parquet or arrow
+    :rtype: str
+    """
+    return '{}.{}'.format(table_name, file_format)
+
+
+def read_manifest(directory):
+    """Returns the manifest of a converted release
+
+    :param str directory: directory with files of :class:`ColumnarWriter`
+    :rtype: dict
+    """
+    path = os.path.join(directory, MANIFEST_FILE_NAME)
+
+    if not os.path.exists(path):
+        raise IOError('{} not found, convert the XML first (pyuniprot convert)'.format(path))
+
+    with open(path) as fd:
+        manifest = json.load(fd)
+
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError('format version {} of {} is not supported (expected {})'.format(
+            manifest.get('format_version'), path, FORMAT_VERSION))
+
+    return manifest
+
+
+def iter_table_rows(directory, manifest, table_name, batch_size=LOAD_BATCH_SIZE):
+    """Yields rows of a converted table in batches
+
+    :param str directory: directory with files of :class:`ColumnarWriter`
+    :param dict manifest: manifest (see :func:`read_manifest`)
+    :param str table_name: name of table
+    :param int batch_size: maximum number of rows per batch
+    :return: generator of lists of rows (dict)
+    :rtype: iter[list[dict]]
+    """
+    pa = import_pyarrow()
+    path = os.path.join(directory, manifest['tables'][table_name]['file'])
+
+    if manifest['file_format'] == ARROW:
+        with pa.memory_map(path) as source:
+            batches = pa.ipc.open_file(source).read_all().to_batches(max_chunksize=batch_size)
+
+            for batch in batches:
+                yield batch.to_pylist()
+    else:
+        for batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield batch.to_pylist()
+
+
+class ColumnarWriter(RowBuffer):
+    """Collects rows of UniProt entries per table and appends them to one Parquet or Arrow file per table
+
+    :param str directory: output directory (created if not exists)
+    :param str file_format: parquet or arrow
+    :param int batch_size: number of entries buffered before rows are appended to the files
+    :param Optional[str] sequence_compression: zlib or pack to store sequences compressed (see
+        :mod:`pyuniprot.manager.compression`)
+    """
+
+    def __init__(self, directory, file_format=PARQUET, batch_size=BATCH_SIZE, sequence_compression=None):
+        super(ColumnarWriter, self).__init__(batch_size, sequence_compression)
+        check_file_format(file_format)
+        self.pyarrow = import_pyarrow()
+
+        self.directory = directory
+        self.file_format = file_format
+        self.schemas = OrderedDict((name, get_arrow_schema(table)) for name, table in self.tables.items())
+        self.writers = {}
+        self.row_counts = OrderedDict((name, 0) for name in self.tables)
+        self.written_entries = 0
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # an old manifest would mark incomplete files as complete
+        manifest_path = os.path.join(directory, MANIFEST_FILE_NAME)
+
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+    def get_writer(self, name):
+        """Returns the file writer of a table (opened with first use)
+
+        :param str name: name of table
+        :rtype: pyarrow.parquet.ParquetWriter or pyarrow.ipc.RecordBatchFileWriter
+        """
+        if name not in self.writers:
+            path = os.path.join(self.directory, get_file_name(name, self.file_format))
+
+            if self.file_format == ARROW:
+                self.writers[name] = self.pyarrow.ipc.new_file(path, self.schemas[name])
+            else:
+                self.writers[name] = self.pyarrow.parquet.ParquetWriter(path, self.schemas[name])
+
+        return self.writers[name]
+
+    def flush(self):
+        """Appends all buffered rows to the files of their tables"""
+        buffers, entries = self.take_batch()
+
+        for name, rows in buffers.items():
+            if rows:
+                self.write(name, rows)
+
+        self.written_entries += entries
+
+    def write(self, name, rows):
+        """Appends rows to the file of a table
+
+        :param str name: name of table
+        :param list[dict] rows: rows
+        """
+        pa = self.pyarrow
+        schema = self.schemas[name]
+        arrays = []
+
+        for field in schema:
+            values = [row.get(field.name) for row in rows]
+
+            # numbers are extracted as text (e.g. version), the database would convert them
+            if pa.types.is_integer(field.type):
+                values = [None if value is None else int(value) for value in values]
+
+            arrays.append(pa.array(values, field.type))
+
+        self.get_writer(name).write_table(pa.Table.from_arrays(arrays, schema=schema))
+        self.row_counts[name] += len(rows)
+
+    def close(self, releases=()):
+        """Writes remaining rows, closes all files (tables without rows are written empty) and writes the manifest
+
+        :param releases: (knowledgebase, release name, release date) of the converted releases
+        :return: manifest
+        :rtype: dict
+        """
+        self.flush()
+
+        for name, schema in self.schemas.items():
+            writer = self.get_writer(name)
+
+            if not self.row_counts[name]:
+                writer.write_table(schema.empty_table())
+
+            writer.close()
+
+        manifest = OrderedDict([
+            ('format_version', FORMAT_VERSION),
+            ('file_format', self.file_format),
+            ('created', datetime.now().isoformat()),
+            ('entries', self.written_entries),
+            ('sequence_compression', self.sequence_compression),
+            ('releases', [{'knowledgebase': knowledgebase,
+                           'release_name': release_name,
+                           'release_date': release_date.strftime('%Y-%m-%d')}
+                          for knowledgebase, release_name, release_date in releases]),
+            ('tables', OrderedDict((name, {'file': get_file_name(name, self.file_format), 'rows': rows})
+                                   for name, rows in self.row_counts.items())),
+        ])
+
+        with open(os.path.join(self.directory, MANIFEST_FILE_NAME), 'w') as fd:
+            json.dump(manifest, fd, indent=2)
+
+        log.info('{} entries converted to {} in {}'.format(self.written_entries, self.file_format, self.directory))
+
+        return manifest
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Compact storage of amino acid sequences (``pyuniprot update --compress-sequences``).
+
+Sequences are stored in the binary column ``compressed_sequence`` of :class:`pyuniprot.manager.models.Sequence`
+instead of the text column ``sequence``. The first byte of the binary value is the method:
+
+- `zlib` (default): raw deflate stream (no header and checksum), about 60% of the text, less with repeats
+- `pack`: 5 bits per residue (``A`` to ``Z`` are 1 to 26, 0 is padding), always 62.5% of the text. Sequences with
+  other characters are stored with `zlib`.
+
+The deflate output depends on the zlib build (e.g. zlib-ng), so encoded values are not compared: exact sequences are
+queried by their checksum and decoded (see :func:`pyuniprot.manager.query.QueryManager.sequence`).
+:attr:`pyuniprot.manager.models.Sequence.sequence` decodes the sequence transparently.
+"""
+import zlib
+
+import numpy as np
+
+ZLIB = 'zlib'
+PACK = 'pack'
+METHODS = (ZLIB, PACK)
+
+PREFIXES = {ZLIB: b'z', PACK: b'p'}
+
+ZLIB_LEVEL = 9
+PACK_OFFSET = ord('A') - 1  # code of A is 1
+
+
+def pack_sequence(sequence):
+    """Packs a sequence of upper case letters with 5 bits per letter (8 letters in 5 bytes)
+
+    :param str sequence: amino acid sequence
+    :return: packed sequence, None if sequence has other characters than ``A`` to ``Z``
+    :rtype: Optional[bytes]
+    """
+    codes = np.frombuffer(sequence.encode('ascii', 'replace'), dtype=np.uint8) - np.uint8(PACK_OFFSET)
+
+    if codes.size and (codes.min() < 1 or codes.max() > 26):
+        return None
+
+    groups = np.zeros(-(-codes.size // 8) * 8, dtype=np.uint64)
+    groups[:codes.size] = codes
+    groups = (groups.reshape(-1, 8) << CODE_SHIFTS).sum(axis=1, dtype=np.uint64)
+
+    packed = ((groups[:, None] >> BYTE_SHIFTS) & np.uint64(0xff)).astype(np.uint8).ravel()
+    return packed[:-(-codes.size * 5 // 8)].tobytes()
+
+
+def unpack_sequence(data):
+    """Unpacks a sequence packed by :func:`pack_sequence`
+
+    :param bytes data: packed sequence
+    :rtype: str
+    """
+    packed = np.zeros(-(-len(data) // 5) * 5, dtype=np.uint64)
+    packed[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+    groups = (packed.reshape(-1, 5) << BYTE_SHIFTS).sum(axis=1, dtype=np.uint64)
+
+    codes = ((groups[:, None] >> CODE_SHIFTS) & np.uint64(31)).astype(np.uint8).ravel()
+
+    # padding of the last group is code 0
+    return (codes[codes != 0] + np.uint8(PACK_OFFSET)).tobytes().decode('ascii')
+
+
+# 8 codes of 5 bits in a group of 40 bits (5 bytes), first code in the highest bits
+CODE_SHIFTS = np.arange(35, -1, -5, dtype=np.uint64)
+BYTE_SHIFTS = np.arange(32, -1, -8, dtype=np.uint64)
+
+
+def encode_sequence(sequence, method=ZLIB):
+    """Encodes an amino acid sequence for the column ``compressed_sequence``
+
+    :param Optional[str] sequence: amino acid sequence
+    :param str method: `zlib` or `pack`
+    :rtype: Optional[bytes]
+    """
+    if sequence is None:
+        return None
+
+    if method not in PREFIXES:
+        raise ValueError('unknown compression method {}, use one of {}'.format(method, ', '.join(METHODS)))
+
+    if method == PACK:
+        packed = pack_sequence(sequence)
+
+        if packed is not None:
+            return PREFIXES[PACK] + packed
+
+    compressor = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return PREFIXES[ZLIB] + compressor.compress(sequence.encode('utf-8')) + compressor.flush()
+
+
+def decode_sequence(data):
+    """Decodes a value of the column ``compressed_sequence``
+
+    :param Optional[bytes] data: encoded sequence
+    :rtype: Optional[str]
+    """
+    if data is None:
+        return None
+
+    prefix, data = bytes(data[:1]), bytes(data[1:])
+
+    if prefix == PREFIXES[PACK]:
+        return unpack_sequence(data)
+
+    if prefix == PREFIXES[ZLIB]:
+        return zlib.decompress(data, -zlib.MAX_WBITS).decode('utf-8')
+
+    raise ValueError('unknown compression of sequence: {!r}'.format(prefix))
+
+
+def get_sequence_columns(sequence, method=None):
+    """Returns the values of the columns ``sequence`` (text) and ``compressed_sequence`` for a sequence
+
+    :param Optional[str] sequence: amino acid sequence
+    :param Optional[str] method: zlib, pack or None (stored as text)
+    :rtype: tuple[Optional[str],Optional[bytes]]
+    """
+    if method is None:
+        return sequence, None
+
+    return None, encode_sequence(sequence, method)
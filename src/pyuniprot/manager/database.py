@@ -10,29 +10,42 @@ import sys
 import time
 import lxml
 
+from collections import OrderedDict
 from configparser import RawConfigParser
+from contextlib import nullcontext
 from datetime import datetime
+from functools import partial
 from typing import Iterable
 
 import numpy as np
 
 import sqlalchemy
-from sqlalchemy.engine import reflection
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy import ForeignKeyConstraint, Index, UniqueConstraint
+from sqlalchemy.orm import make_transient_to_detached, sessionmaker, scoped_session
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.schema import AddConstraint, CreateIndex, CreateTable
 from sqlalchemy.sql import sqltypes
 
-from tqdm import tqdm
 from lxml.etree import iterparse
 
 from . import defaults
 from . import models
+from .batching import BatchSizer
+from .checksum import get_checksum
+from .compression import ZLIB, decode_sequence, get_sequence_columns
+from .download import download, get_release_checksums
+from .kmers import KMER_SIZE, MAX_PAIRS, KmerIndexBuilder
+from .pipeline import QUEUE_SIZE, Batch, ImportPipeline
+from .progress import ImportProgress
+from .staging import (MIN_ENTRY_RATIO, count_rows, get_staging_connection, get_swapped_tables, prepare_staging,
+                      swap_staging, validate_staging)
 from ..constants import PYUNIPROT_DATA_DIR, PYUNIPROT_DIR
 
 if sys.version_info[0] == 3:
-    from urllib.request import urlretrieve
+    from urllib.request import urlopen
     from requests.compat import urlparse, urlsplit
 else:
-    from urllib import urlretrieve
+    from urllib2 import urlopen
     from urlparse import urlparse, urlsplit
 
 log = logging.getLogger(__name__)
@@ -49,6 +62,53 @@ LxmlElement = lxml.etree._Element
 XN_URL = 'http://uniprot.org/uniprot'
 XN = {'n': XN_URL}  # xml namespace
 
+LOCATION_TAGS = {'{{{}}}{}'.format(XN_URL, tag): tag for tag in ('begin', 'end', 'position')}
+LOCATION = '{{{}}}location'.format(XN_URL)
+
+REMOTE_SCHEMES = ('ftp', 'http', 'https')
+
+# column order of plain row tuples exchanged between parser and writer (see DbManager.get_entry_rows)
+ENTRY_COLUMNS = ('dataset', 'created', 'modified', 'version', 'name', 'recommended_full_name',
+                 'recommended_short_name', 'taxid', 'gene_name')
+
+ENTRY_CHILD_ROWS = (
+    ('accessions', models.Accession, ('accession',)),
+    ('organism_hosts', models.OrganismHost, ('taxid',)),
+    ('db_references', models.DbReference, ('type_', 'identifier')),
+    ('other_gene_names', models.OtherGeneName, ('type_', 'name')),
+    ('features', models.Feature, ('type_', 'identifier', 'description', 'begin', 'end', 'position')),
+    ('functions', models.Function, ('text',)),
+    ('ec_numbers', models.ECNumber, ('ec_number',)),
+    ('alternative_full_names', models.AlternativeFullName, ('name',)),
+    ('alternative_short_names', models.AlternativeShortName, ('name',)),
+    ('tissue_specificities', models.TissueSpecificity, ('comment',)),
+)
+
+
+def get_feature_location(feature):
+    """Returns begin, end and position of a ``<feature>`` (begin and end of a single residue are its position, unknown
+    positions are None)
+
+    :param feature: XML node feature
+    :rtype: tuple[Optional[int],Optional[int],Optional[int]]
+    """
+    location = {}
+    element = feature.find(LOCATION)
+
+    if element is not None:
+        for child in element:
+            position = child.get('position')
+
+            if child.tag in LOCATION_TAGS and position is not None:
+                location[LOCATION_TAGS[child.tag]] = int(position)
+
+    position = location.get('position')
+
+    if position is not None:
+        return position, position, position
+
+    return location.get('begin'), location.get('end'), None
+
 
 def get_connection_string(connection=None):
     """return SQLAlchemy connection string if it is set
@@ -74,13 +134,23 @@ def get_connection_string(connection=None):
     return connection
 
 
+def format_size(size):
+    """Formats a size in bytes as MiB
+
+    :param Optional[int] size: size in bytes
+    :rtype: str
+    """
+    return 'unknown' if size is None else '{:.1f} MiB'.format(size / 2 ** 20)
+
+
 class BaseDbManager(object):
     """Creates a connection to database and a persistient session using SQLAlchemy"""
 
-    def __init__(self, connection=None, echo=False):
+    def __init__(self, connection=None, echo=False, connect_args=None):
         """
         :param str connection: SQLAlchemy 
         :param bool echo: True or False for SQL output of SQLAlchemy engine
+        :param Optional[dict] connect_args: arguments of DBAPI connections (e.g. search path of staging tables)
         """
         log.setLevel(logging.INFO)
         
@@ -93,9 +163,8 @@ class BaseDbManager(object):
 
         try:
             self.connection = get_connection_string(connection)
-            self.engine = sqlalchemy.create_engine(self.connection, echo=echo)
+            self.engine = sqlalchemy.create_engine(self.connection, echo=echo, connect_args=connect_args or {})
 
-            self.inspector = reflection.Inspector.from_engine(self.engine)
             self.sessionmaker = sessionmaker(
                 bind=self.engine,
                 autoflush=False,
@@ -106,15 +175,122 @@ class BaseDbManager(object):
         except:
             log.warning('No valid database connection. Execute `pyuniprot connection` on command line')
 
-    def _create_tables(self, checkfirst=True):
+    @property
+    def inspector(self):
+        """SQLAlchemy inspector of the database (connects on first use, not on creation of the manager)"""
+        return sqlalchemy.inspect(self.engine)
+
+    def get_database_size(self):
+        """Returns the size of the database in bytes (SQLite: file, PostgreSQL: database, MySQL: data and indexes of
+        all tables), None for other databases
+
+        :rtype: Optional[int]
+        """
+        dialect = self.engine.dialect.name
+
+        with self.engine.connect() as connection:
+            if dialect == 'sqlite':
+                page_count = connection.exec_driver_sql('PRAGMA page_count').scalar()
+                return page_count * connection.exec_driver_sql('PRAGMA page_size').scalar()
+
+            if dialect == 'postgresql':
+                return connection.exec_driver_sql('SELECT pg_database_size(current_database())').scalar()
+
+            if dialect == 'mysql':
+                size = connection.exec_driver_sql(
+                    'SELECT SUM(data_length + index_length) FROM information_schema.tables '
+                    'WHERE table_schema = DATABASE()'
+                ).scalar()
+                return int(size or 0)
+
+    def _create_tables(self, checkfirst=True, defer_constraints=False):
         """creates all tables from models in your database
         
         :param checkfirst: True or False check if tables already exists
         :type checkfirst: bool
+        :param bool defer_constraints: if True tables are created without indexes, unique constraints and foreign keys
+            (not SQLite), which are created after the import with :func:`_create_constraints`
         :return: 
         """
         log.info('create tables in {}'.format(self.engine.url))
-        models.Base.metadata.create_all(self.engine, checkfirst=checkfirst)
+
+        if not defer_constraints:
+            models.Base.metadata.create_all(self.engine, checkfirst=checkfirst)
+            return
+
+        # SQLite can not add foreign keys to existing tables (but does not check them by default)
+        foreign_keys = None if self.engine.dialect.name == 'sqlite' else []
+        bare_metadata = sqlalchemy.MetaData()
+        inspector = sqlalchemy.inspect(self.engine)
+
+        with self.engine.begin() as connection:
+            for table in models.Base.metadata.sorted_tables:
+                if checkfirst and inspector.has_table(table.name):
+                    continue
+
+                bare_table = table.to_metadata(bare_metadata)
+
+                for constraint in list(bare_table.constraints):
+                    if isinstance(constraint, UniqueConstraint):
+                        bare_table.constraints.remove(constraint)
+
+                connection.execute(CreateTable(bare_table, include_foreign_key_constraints=foreign_keys))
+
+    def _create_constraints(self):
+        """creates indexes, unique constraints and foreign keys missing in the database (after
+        :func:`_create_tables` with `defer_constraints`). Unique constraints are created as unique indexes in SQLite.
+
+        :return: seconds needed to create each index or constraint
+        :rtype: collections.OrderedDict
+        """
+        inspector = sqlalchemy.inspect(self.engine)
+        is_sqlite = self.engine.dialect.name == 'sqlite'
+        timings = OrderedDict()
+
+        for table in models.Base.metadata.sorted_tables:
+            indexes = inspector.get_indexes(table.name)
+            index_columns = {tuple(x['column_names']) for x in indexes}
+            unique_columns = {tuple(x['column_names']) for x in indexes if x['unique']}
+            unique_columns |= {tuple(x['column_names']) for x in inspector.get_unique_constraints(table.name)}
+            foreign_key_columns = {tuple(x['constrained_columns']) for x in inspector.get_foreign_keys(table.name)}
+
+            statements = []
+
+            for constraint in table.constraints:
+                columns = tuple(constraint.columns.keys())
+
+                if isinstance(constraint, UniqueConstraint) and columns not in unique_columns:
+                    if is_sqlite:
+                        # index on copy of table, an index on the model table would be created by create_all
+                        table_copy = table.to_metadata(sqlalchemy.MetaData())
+                        name = 'uq_{}_{}'.format(table.name, '_'.join(columns))
+                        index = Index(name, *[table_copy.c[column] for column in columns], unique=True)
+                        statements.append(CreateIndex(index))
+                    else:
+                        statements.append(AddConstraint(constraint))
+
+                elif isinstance(constraint, ForeignKeyConstraint) and not is_sqlite \
+                        and columns not in foreign_key_columns:
+                    statements.append(AddConstraint(constraint))
+
+            for index in table.indexes:
+                if tuple(index.columns.keys()) not in index_columns:
+                    statements.append(CreateIndex(index))
+
+            for statement in statements:
+                description = str(statement.compile(dialect=self.engine.dialect)).strip()
+                start = time.time()
+
+                with self.engine.begin() as connection:
+                    connection.execute(statement)
+
+                timings[description] = time.time() - start
+                log.info('{:.2f}s for {}'.format(timings[description], description))
+
+        if timings:
+            log.info('{:.2f}s to create {} indexes and constraints'.format(sum(timings.values()), len(timings)))
+
+        return timings
 
     def _drop_tables(self):
         """drops all tables in the database"""
@@ -123,6 +299,58 @@ class BaseDbManager(object):
         models.Base.metadata.drop_all(self.engine)
         self.session.commit()
 
+    def _iter_sequence_chunks(self, chunk_size, *conditions):
+        """Yields chunks of rows (id, sequence, compressed_sequence) of the sequence table ordered by id, every chunk
+        with the connection of its own transaction (compressed sequences are decoded by :func:`get_sequences`)
+
+        :param int chunk_size: number of rows per chunk
+        :param conditions: SQLAlchemy filter conditions
+        :rtype: iter[tuple]
+        """
+        table = models.Sequence.__table__
+        last_id = 0
+
+        while True:
+            with self.engine.begin() as connection:
+                rows = connection.execute(
+                    sqlalchemy.select(table.c.id, table.c.sequence, table.c.compressed_sequence)
+                    .where(table.c.id > last_id, *conditions)
+                    .order_by(table.c.id)
+                    .limit(chunk_size)
+                ).fetchall()
+
+                if not rows:
+                    return
+
+                yield connection, rows
+                last_id = rows[-1][0]
+
+    @staticmethod
+    def get_sequences(rows):
+        """Returns the sequences of rows (id, sequence, compressed_sequence) of the sequence table
+
+        :param list[tuple] rows: rows of the sequence table
+        :rtype: list[str]
+        """
+        return [decode_sequence(compressed_sequence) if plain_sequence is None else plain_sequence
+                for _, plain_sequence, compressed_sequence in rows]
+
+    def get_kmer_size(self):
+        """Returns the length of k-mers of the k-mer index (see :mod:`pyuniprot.manager.kmers`), None if the database
+        has no k-mer index
+
+        :rtype: Optional[int]
+        """
+        table = models.SequenceKmer.__table__
+
+        if not sqlalchemy.inspect(self.engine).has_table(table.name):
+            return None
+
+        with self.engine.connect() as connection:
+            kmer = connection.execute(sqlalchemy.select(table.c.kmer).limit(1)).scalar()
+
+        return len(kmer) if kmer else None
+
 
 class DbManager(BaseDbManager):
     """The DbManager implements all function to upload CTD files into the database. Prefered SQL Alchemy 
@@ -132,102 +360,1098 @@ class DbManager(BaseDbManager):
     :type connection: str
     """
     
-    pmids = set()
+    # caches of shared rows: key -> id of committed row or new ORM object (until next flush, see settle_caches)
+    pmids = {}
     keywords = {}
     subcellular_locations = {}
     tissues = {}
+    diseases = {}
+    new_cached = []  # (cache, key, ORM object) created since last flush
+
+    batch_commit_after = 100  # default number of entries inserted with the ORM per commit (checkpoint)
+    batch_sizer = None  # pyuniprot.manager.batching.BatchSizer of running (or last) import
+    pipeline_queue_size = QUEUE_SIZE  # batches between parser and writers of a pipelined import
+    sequence_compression = None  # zlib or pack if sequences are stored compressed (see compression module)
+    kmer_run_dir = None  # directory of sorted runs spilled while the k-mer index is built (None: system temp)
+    import_pipeline = None  # pyuniprot.manager.pipeline.ImportPipeline of running (or last) pipelined import
+    memory_report_after = 100000  # entries between reports of peak RSS
+    entries_read = 0  # XML entries read by running import
+    profiler = None  # pyuniprot.manager.profiler.StageProfiler if import is profiled
+    staging_min_entry_ratio = MIN_ENTRY_RATIO  # minimum ratio of entries in staging and live tables before swap
+
+    # methods creating ORM objects of an entry, timed as sub-stages of 'orm objects' if profiled
+    PROFILED_ORM_METHODS = ('get_pmids_from_rows', 'get_keywords_from_rows', 'get_subcellular_locations_from_rows',
+                            'get_tissue_in_references_from_rows', 'get_disease_comments_from_rows')
 
     def db_import_xml(self, url: Iterable[str] = None, force_download: bool = False, taxids: Iterable[int] = None,
-                      silent: bool = False):
+                      silent: bool = False, workers: int = 1, extract: bool = True, stream: bool = False,
+                      bulk: bool = False, incremental: bool = False, resume: bool = False,
+                      dataset: str = 'swissprot', profile=None, batch_size: int = None, adaptive_batch: bool = False,
+                      max_rss: int = None, pipeline: bool = False, writers: int = 1,
+                      sequence_compression: str = None, kmer_index: bool = False, staging: bool = False,
+                      dry_run: bool = False):
         """Updates the CTD database
         
         1. downloads gzipped XML
         2. Extracts gzipped XML
-        2. drops all tables in database
-        3. creates all tables in database
+        2. drops all tables in database (not if incremental or resumed)
+        3. creates all tables in database (without indexes and constraints if bulk)
         4. import XML
-        5. close session
+        5. creates indexes and constraints
+        6. builds k-mer index (if `kmer_index` or the database has one)
+        7. close session
+
+        TrEMBL (~200 million entries) is always imported from the gzipped file (or stream) with the bulk writer.
 
         :param Optional[list[int]] taxids: list of NCBI taxonomy identifier
-        :param Iterable[str] url: iterable of URL strings
+        :param Iterable[str] url: URL string or one URL string per dataset
         :param bool force_download: force method to download
         :param bool silent: Not stdout if True.
+        :param int workers: number of parser processes
+        :param bool extract: if False gzipped XML is imported without extracting it to disk
+        :param bool stream: if True gzipped XML is imported directly from URL without saving it to disk
+        :param bool bulk: if True entries are written with batched Core inserts instead of the ORM
+        :param bool incremental: if True only new, changed and removed entries are updated (no drop of tables)
+        :param bool resume: if True an interrupted import of the same release continues after the last checkpoint
+        :param str dataset: swissprot, trembl or both
+        :param profile: if True or path to JSON file, the time of every import stage is measured (see
+            :mod:`pyuniprot.manager.profiler`), the profile is logged and written to the JSON file (default
+            `import_profile.json` in the data folder)
+        :param Optional[int] batch_size: entries per commit, default `batch_commit_after` (ORM) or
+            `pyuniprot.manager.bulk.BATCH_SIZE` (bulk writer)
+        :param bool adaptive_batch: if True the batch size is adapted to flush time and memory (see
+            :mod:`pyuniprot.manager.batching`)
+        :param Optional[int] max_rss: RSS budget in bytes for the adaptive batch size (implies `adaptive_batch`)
+        :param bool pipeline: if True parsing and writing overlap (see :mod:`pyuniprot.manager.pipeline`)
+        :param int writers: number of writers of a pipelined import with the bulk writer (implies `pipeline`)
+        :param Optional[str] sequence_compression: zlib or pack to store sequences compressed (see
+            :mod:`pyuniprot.manager.compression`), None to store them as text
+        :param bool kmer_index: if True the k-mer index for motif search is built (see :mod:`pyuniprot.manager.kmers`),
+            an existing k-mer index is always rebuilt. The k-mers are collected while the sequences are written by a
+            full import with the bulk writer, otherwise read from the sequence table after the import.
+        :param bool staging: if True the release is imported into staging tables, which replace the live tables
+            after validation (see :mod:`pyuniprot.manager.staging`), the live tables are not changed until then
+        :param bool dry_run: if True the XML is only parsed and extracted, the database is not touched (see
+            :func:`dry_run_xml`)
+        :return: report of dry run if `dry_run`, profile if `profile` else None
+        :rtype: Optional[dict]
         """
+        if dry_run:
+            return self.dry_run_xml(url, force_download, taxids, silent, workers, extract, stream, dataset, bulk,
+                                    batch_size, sequence_compression)
+
+        if staging:
+            if incremental:
+                raise ValueError('incremental updates change the live tables, use a full update with staging')
+
+            staging_db = self.get_staging_manager()
+            report = staging_db.db_import_xml(url, force_download, taxids, silent, workers, extract, stream, bulk,
+                                              resume=resume, dataset=dataset, profile=profile,
+                                              batch_size=batch_size, adaptive_batch=adaptive_batch, max_rss=max_rss,
+                                              pipeline=pipeline, writers=writers,
+                                              sequence_compression=sequence_compression,
+                                              kmer_index=kmer_index or bool(self.get_kmer_size()))
+            self.replace_with_staging(staging_db)
+            return report
+
         log.info('Update UniProt database from {}'.format(url))
 
-        self._drop_tables()
-        xml_file_path, version_file_path = self.download_and_extract(url, force_download)
-        self._create_tables()
-        self.import_version(version_file_path)
-        self.import_xml(xml_file_path, taxids, silent)
+        if profile:
+            from .profiler import StageProfiler
+            self.profiler = StageProfiler()
+
+        knowledgebases = list(defaults.DATASETS) if dataset == 'both' else [dataset]
+        urls = [url] * len(knowledgebases) if url is None or isinstance(url, str) else list(url)
+
+        if len(urls) != len(knowledgebases):
+            raise ValueError('{} URLs for {} datasets'.format(len(urls), len(knowledgebases)))
+
+        if dataset != 'swissprot' and not bulk:
+            log.info('TrEMBL is imported with bulk writer')
+            bulk = True
+
+        imports = []
+
+        for dataset_name, dataset_url in zip(knowledgebases, urls):
+            knowledgebase, file_name = defaults.DATASETS[dataset_name]
+
+            with self.profile_stage('download'):
+                xml_file_path, version_file_path = self.download_and_extract(
+                    dataset_url, force_download, extract and knowledgebase == 'Swiss-Prot', stream, file_name
+                )
+
+            skip = self.get_checkpoint(version_file_path, knowledgebase) if resume and not incremental else 0
+            imports.append((knowledgebase, xml_file_path, skip))
+
+        size_before = self.get_database_size()
+        kmer_size = self.get_kmer_size()  # before the tables are dropped
+        kmer_builder = None
+
+        # all sequences are written by this import
+        if (kmer_index or kmer_size) and bulk and not incremental and all(skip == 0 for _, _, skip in imports):
+            kmer_builder = KmerIndexBuilder(kmer_size or KMER_SIZE, directory=self.kmer_run_dir)
+
+        with self.profile_stage('create tables'):
+            if not (incremental or any(skip != 0 for _, _, skip in imports)):
+                self._drop_tables()
+            else:
+                self._upgrade_tables()
+            self._create_tables(defer_constraints=bulk)
+            self.import_version(version_file_path)
+
+        entries = 0
+
+        for knowledgebase, xml_file_path, skip in imports:
+            if skip is None:
+                log.info('{} release already imported'.format(knowledgebase))
+                continue
+
+            self.import_xml(xml_file_path, taxids, silent, workers, bulk, incremental, skip, knowledgebase,
+                            batch_size, adaptive_batch, max_rss, pipeline or writers > 1, writers,
+                            sequence_compression, kmer_builder)
+            entries += self.entries_read - skip
+
+        with self.profile_stage('create constraints'):
+            self._create_constraints()
+
+        if kmer_builder is not None:
+            with self.profile_stage('k-mer index'):
+                self.write_kmer_index(kmer_builder)
+
+        elif kmer_index or kmer_size:
+            with self.profile_stage('k-mer index'):
+                self.build_kmer_index(kmer_size or KMER_SIZE)
+
         self.session.close()
 
-    def import_version(self, version_file_path):
+        log.info('database size {} before, {} after update'.format(format_size(size_before),
+                                                                    format_size(self.get_database_size())))
+
+        if self.profiler is not None:
+            return self.stop_profiler(entries, profile)
+
+    def profile_stage(self, stage):
+        """Returns context manager timing `stage` if import is profiled
+
+        :param str stage: name of stage
+        """
+        return self.profiler.stage(stage) if self.profiler is not None else nullcontext()
+
+    def stop_profiler(self, entries, path=True):
+        """Stops profiling, logs the profile as table and writes it to a JSON file
+
+        :param int entries: number of imported XML entries
+        :param path: path to JSON file, if True `import_profile.json` in the data folder
+        :return: profile
+        :rtype: dict
+        """
+        from .profiler import format_report
+
+        profiler, self.profiler = self.profiler, None
+        profiler.stop(entries)
+
+        if path is True:
+            path = os.path.join(PYUNIPROT_DATA_DIR, defaults.PROFILE_FILE_NAME)
+
+        report = profiler.get_report()
+
+        if self.import_pipeline is not None:
+            report['pipeline'] = self.import_pipeline.get_stats()
+
+        log.info('import profile:\n{}'.format(format_report(report)))
+        profiler.write_report(path)
+
+        return report
+
+    @classmethod
+    def get_releases(cls, version_file_path):
+        """Returns releases in version file (reldate.txt)
+
+        :param str version_file_path: path to version file
+        :return: list of (knowledgebase, release name, release date)
+        :rtype: list[tuple[str,str,datetime]]
+        """
         pattern = "UniProtKB/(?P<knowledgebase>Swiss-Prot|TrEMBL) Release" \
                   " (?P<release_name>\\d{4}_\\d{2}) of (?P<release_date>\\d{2}-\\w{3}-\\d{4})"
         with open(version_file_path) as fd:
             content = fd.read()
 
-        for knowledgebase, release_name, release_date_str in re.findall(pattern, content):
-            release_date = datetime.strptime(release_date_str, '%d-%b-%Y')
+        return [(knowledgebase, release_name, datetime.strptime(release_date_str, '%d-%b-%Y'))
+                for knowledgebase, release_name, release_date_str in re.findall(pattern, content)]
 
-            version = models.Version(
-                knowledgebase=knowledgebase,
-                release_name=release_name,
-                release_date=release_date
-            )
+    def get_checkpoint(self, version_file_path, knowledgebase='Swiss-Prot'):
+        """Returns the number of XML entries already imported by an interrupted import of the release in the
+        version file, 0 if there is nothing to resume and None if the import of the release is completed.
+
+        :param str version_file_path: path to version file
+        :param str knowledgebase: Swiss-Prot or TrEMBL
+        :rtype: Optional[int]
+        """
+        if not sqlalchemy.inspect(self.engine).has_table(models.Version.__tablename__):
+            return 0
+
+        version = self.session.query(models.Version).filter(models.Version.knowledgebase == knowledgebase).first()
+        release_names = {release_name for kb, release_name, _ in self.get_releases(version_file_path)
+                         if kb == knowledgebase}
 
-            self.session.add(version)
+        if version is None or version.release_name not in release_names:
+            log.info('no {} import to resume, start new import'.format(knowledgebase))
+            return 0
+
+        if version.import_completed_date:
+            return None
+
+        return version.import_checkpoint or 0
+
+    def import_version(self, version_file_path):
+        self.import_releases(self.get_releases(version_file_path))
+
+    def import_releases(self, releases):
+        """Saves releases of knowledgebases in the version table
+
+        :param releases: (knowledgebase, release name, release date) as returned by :func:`get_releases`
+        """
+        for knowledgebase, release_name, release_date in releases:
+
+            version = self.session.query(models.Version).filter_by(knowledgebase=knowledgebase).first()
+
+            if version is None:
+                version = models.Version(knowledgebase=knowledgebase)
+                self.session.add(version)
+
+            version.release_name = release_name
+            version.release_date = release_date
 
         self.session.commit()
 
-    def import_xml(self, xml_file_path, taxids=None, silent=False):
+    def import_xml(self, xml_file_path, taxids=None, silent=False, workers=1, bulk=False, incremental=False,
+                   skip=0, knowledgebase='Swiss-Prot', batch_size=None, adaptive_batch=False, max_rss=None,
+                   pipeline=False, writers=1, sequence_compression=None, kmer_builder=None):
         """Imports XML
 
-        :param str xml_file_path: path to XML file
+        In incremental mode `(name, version, modified)` of every entry is compared with the stored entries. Only new
+        and changed entries are inserted, changed entries (with all children) and entries not in the XML anymore
+        are deleted after the import (see :func:`iter_changed_entry_rows`).
+
+        After every commit the number of read XML entries is saved in `models.Version.import_checkpoint` (in the
+        same transaction). An interrupted import is resumed by skipping this number of entries with `skip`. The
+        checkpoint is an entry number, not a byte offset: the file is read (and decompressed) again from the start,
+        but skipped entries are only counted on ``</entry>``, not parsed (see
+        :func:`pyuniprot.manager.parallel.iter_entry_chunks`).
+
+        :param str xml_file_path: path or URL to XML file (gzipped if ends with .gz) or binary file object
         :param Optional[list[int]] taxids: NCBI taxonomy identifier
         :param bool silent: no output if True
+        :param int workers: number of parser processes, if > 1 entries are parsed in parallel
+        :param bool bulk: if True entries are written with :class:`pyuniprot.manager.bulk.BulkWriter` instead of
+            the ORM
+        :param bool incremental: if True existing entries are updated instead of imported again
+        :param int skip: number of XML entries already imported (resume import after checkpoint)
+        :param str knowledgebase: Swiss-Prot or TrEMBL (dataset in XML file)
+        :param Optional[int] batch_size: entries per commit, default `batch_commit_after` (ORM) or
+            `pyuniprot.manager.bulk.BATCH_SIZE` (bulk writer)
+        :param bool adaptive_batch: if True the batch size is adapted to flush time and memory after every commit
+            (see :class:`pyuniprot.manager.batching.BatchSizer`)
+        :param Optional[int] max_rss: RSS budget in bytes for the adaptive batch size (implies `adaptive_batch`)
+        :param bool pipeline: if True the XML is parsed in a thread while batches are written (see
+            :mod:`pyuniprot.manager.pipeline`)
+        :param int writers: number of writers of a pipelined import (bulk writer only, each with own connection)
+        :param Optional[str] sequence_compression: zlib or pack to store sequences compressed (see
+            :mod:`pyuniprot.manager.compression`), None to store them as text
+        :param kmer_builder: optional :class:`pyuniprot.manager.kmers.KmerIndexBuilder` collecting the k-mers of all
+            sequences written by the bulk writer
+        :return: number of inserted, updated, deleted and unchanged entries if incremental
+        :rtype: Optional[dict]
         """
-        version = self.session.query(models.Version).filter(models.Version.knowledgebase == 'Swiss-Prot').first()
-        version.import_start_date = datetime.now()
+        version = self.session.query(models.Version).filter(models.Version.knowledgebase == knowledgebase).first()
+
+        if skip:
+            log.info('resume import after {} entries'.format(skip))
+        else:
+            version.import_start_date = datetime.now()
+
+        version.import_completed_date = None
+        version.import_checkpoint = skip
+        self.session.commit()
 
         log.info('Load gzipped XML from {}'.format(xml_file_path))
 
-        doc = iterparse(xml_file_path, events=('start', 'end'))
+        # caches are class attributes, ids of previous imports may be not valid in this database
+        self.pmids, self.keywords, self.subcellular_locations, self.tissues, self.diseases = {}, {}, {}, {}, {}
+        self.new_cached = []
+        self.sequence_compression = sequence_compression
 
-        batch_commit_after = 100
-        counter = 0
+        delta = None
 
-        for action, elem in tqdm(doc, mininterval=1, disable=silent):
-            if action == 'end' and elem.tag == f'{{{XN_URL}}}entry':
-                counter += 1
-                self.insert_entry(elem, taxids)
-                if counter%batch_commit_after == 0:
-                    self.session.commit()
-                elem.clear()
+        if incremental:
+            delta = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+            stored_entries = self.get_stored_entries(taxids, knowledgebase)
+            outdated_entry_ids = []
+
+        # rows of other imports (e.g. Swiss-Prot before TrEMBL), resumed or incremental imports
+        if not bulk:
+            self.load_caches()
+
+        if batch_size is None:
+            from .bulk import BATCH_SIZE
+            batch_size = BATCH_SIZE if bulk else self.batch_commit_after
+
+        batch = self.batch_sizer = BatchSizer(batch_size, adaptive_batch or max_rss is not None, max_rss)
+
+        progress = ImportProgress(knowledgebase, silent, skip, memory_interval=self.memory_report_after)
+        fd = self.open_xml(xml_file_path, progress)
+        profiler = self.profiler
+
+        if profiler is not None and not bulk:
+            profiler.patch(self, 'insert_entry_rows', 'orm objects')
+
+            for method in self.PROFILED_ORM_METHODS:
+                profiler.patch(self, method, 'orm objects: ' + method[4:-10])
+
+        try:
+            entries_rows = self.iter_entry_rows(fd, taxids, silent, workers, skip, progress)
+
+            if incremental:
+                entries_rows = self.iter_changed_entry_rows(entries_rows, stored_entries, outdated_entry_ids, delta)
+
+            if bulk:
+                from .bulk import BulkWriter
+
+                version_id = version.id
+
+                def save_checkpoint(connection, checkpoint=None):
+                    connection.execute(
+                        models.Version.__table__.update()
+                        .where(models.Version.__table__.c.id == version_id)
+                        .values(import_checkpoint=self.entries_read if checkpoint is None else checkpoint)
+                    )
+
+                # rolled back and connections closed (SQLite settings restored) also after an error
+                with BulkWriter(self.engine, batch.size, on_flush=save_checkpoint, batch_sizer=batch,
+                                sequence_compression=sequence_compression, kmer_builder=kmer_builder) as writer:
+                    writer.load_unique_ids()
+
+                    if profiler is not None:
+                        profiler.patch(writer, 'buffer_entry' if pipeline else 'add_entry', 'bulk rows')
+                        profiler.patch(writer, 'flush', 'commit')
+                        profiler.patch(writer, 'write', 'flush')
+
+                    if pipeline:
+                        if writers > 1 and self.engine.dialect.name == 'sqlite':
+                            log.info('SQLite allows only one writer')
+                            writers = 1
+
+                        def write_batch(rows_batch):
+                            return writer.write_batch(rows_batch.data, rows_batch.entries,
+                                                      partial(save_checkpoint, checkpoint=rows_batch.checkpoint))
+
+                        self.run_pipeline(self.iter_batches(entries_rows, batch, writer), write_batch, writers)
+
+                    else:
+                        for entry_rows in entries_rows:
+                            writer.add_entry(entry_rows)
+
+            elif pipeline:
+                if writers > 1:
+                    log.info('entries are written with the ORM by one writer, use bulk writer for more writers')
+
+                def write_batch(rows_batch):
+                    for entry_rows in rows_batch.data:
+                        self.insert_entry_rows(entry_rows)
+
+                    self.commit_batch(version, rows_batch.entries, rows_batch.checkpoint)
+
+                self.run_pipeline(self.iter_batches(entries_rows, batch), write_batch)
+
+            else:
+                entries = 0
+
+                for entry_rows in entries_rows:
+                    self.insert_entry_rows(entry_rows)
+                    entries += 1
+
+                    if entries >= batch.size:
+                        self.commit_batch(version, entries)
+                        entries = 0
+
+                self.commit_batch(version, entries)
+        finally:
+            if fd is not xml_file_path:
+                fd.close()
+            progress.close()
+
+            if profiler is not None:
+                profiler.restore()
+
+        if incremental:
+            # entries not in XML anymore
+            outdated_entry_ids.extend(entry_id for entry_id, _, _ in stored_entries.values())
+            delta['deleted'] = len(stored_entries)
+
+            self.delete_entries(outdated_entry_ids)
+            log.info('incremental update: {}'.format(delta))
 
         version.import_completed_date = datetime.now()
         self.session.commit()
 
+        return delta
+
+    def convert_xml(self, directory, url: Iterable[str] = None, force_download: bool = False,
+                    taxids: Iterable[int] = None, silent: bool = False, workers: int = 1, extract: bool = True,
+                    stream: bool = False, dataset: str = 'swissprot', file_format: str = 'parquet',
+                    batch_size: int = None, sequence_compression: str = None):
+        """Converts UniProt XML to one Parquet or Arrow file per table (see :mod:`pyuniprot.manager.columnar`),
+        which are loaded without parsing by :func:`load_columnar`. The database is not used.
+
+        :param str directory: output directory
+        :param Iterable[str] url: URL string or one URL string per dataset
+        :param bool force_download: force method to download
+        :param Optional[list[int]] taxids: list of NCBI taxonomy identifier
+        :param bool silent: Not stdout if True.
+        :param int workers: number of parser processes
+        :param bool extract: if False gzipped XML is converted without extracting it to disk
+        :param bool stream: if True gzipped XML is converted directly from URL without saving it to disk
+        :param str dataset: swissprot, trembl or both
+        :param str file_format: parquet or arrow
+        :param Optional[int] batch_size: entries per appended row group, default `pyuniprot.manager.bulk.BATCH_SIZE`
+        :param Optional[str] sequence_compression: zlib or pack to store sequences compressed (see
+            :mod:`pyuniprot.manager.compression`), None to store them as text
+        :return: manifest (see :func:`pyuniprot.manager.columnar.ColumnarWriter.close`)
+        :rtype: dict
+        """
+        from .bulk import BATCH_SIZE
+        from .columnar import ColumnarWriter
+
+        knowledgebases = list(defaults.DATASETS) if dataset == 'both' else [dataset]
+        urls = [url] * len(knowledgebases) if url is None or isinstance(url, str) else list(url)
+
+        if len(urls) != len(knowledgebases):
+            raise ValueError('{} URLs for {} datasets'.format(len(urls), len(knowledgebases)))
+
+        writer = ColumnarWriter(directory, file_format, batch_size or BATCH_SIZE, sequence_compression)
+        releases = OrderedDict()
+
+        for dataset_name, dataset_url in zip(knowledgebases, urls):
+            knowledgebase, file_name = defaults.DATASETS[dataset_name]
+
+            xml_file_path, version_file_path = self.download_and_extract(
+                dataset_url, force_download, extract and knowledgebase == 'Swiss-Prot', stream, file_name
+            )
+
+            for release in self.get_releases(version_file_path):
+                releases[release[0]] = release
+
+            log.info('convert {} to {}'.format(xml_file_path, directory))
+
+            progress = ImportProgress(knowledgebase, silent, memory_interval=self.memory_report_after)
+            fd = self.open_xml(xml_file_path, progress)
+
+            try:
+                for entry_rows in self.iter_entry_rows(fd, taxids, silent, workers, progress=progress):
+                    writer.add_entry(entry_rows)
+            finally:
+                if fd is not xml_file_path:
+                    fd.close()
+                progress.close()
+
+        return writer.close(releases.values())
+
+    def dry_run_xml(self, url: Iterable[str] = None, force_download: bool = False, taxids: Iterable[int] = None,
+                    silent: bool = False, workers: int = 1, extract: bool = True, stream: bool = False,
+                    dataset: str = 'swissprot', bulk: bool = False, batch_size: int = None,
+                    sequence_compression: str = None):
+        """Downloads and parses UniProt XML like :func:`db_import_xml`, but without touching the database (see
+        :mod:`pyuniprot.manager.dryrun`). Every entry is extracted and counted, with `bulk` also the table rows of
+        the bulk writer are built and discarded.
+
+        :param Iterable[str] url: URL string or one URL string per dataset
+        :param bool force_download: force method to download
+        :param Optional[list[int]] taxids: list of NCBI taxonomy identifier
+        :param bool silent: Not stdout if True.
+        :param int workers: number of parser processes
+        :param bool extract: if False gzipped XML is parsed without extracting it to disk
+        :param bool stream: if True gzipped XML is parsed directly from URL without saving it to disk
+        :param str dataset: swissprot, trembl or both
+        :param bool bulk: if True the rows of the bulk writer are built (always for TrEMBL)
+        :param Optional[int] batch_size: entries per discarded batch of bulk rows, default
+            `pyuniprot.manager.bulk.BATCH_SIZE`
+        :param Optional[str] sequence_compression: zlib or pack to compress sequences as by an import
+        :return: entries, entries per second, peak RSS and elements per field (see
+            :func:`pyuniprot.manager.dryrun.DryRunStats.get_report`)
+        :rtype: collections.OrderedDict
+        """
+        from .bulk import BATCH_SIZE
+        from .dryrun import DiscardingRowBuffer, DryRunStats
+
+        knowledgebases = list(defaults.DATASETS) if dataset == 'both' else [dataset]
+        urls = [url] * len(knowledgebases) if url is None or isinstance(url, str) else list(url)
+
+        if len(urls) != len(knowledgebases):
+            raise ValueError('{} URLs for {} datasets'.format(len(urls), len(knowledgebases)))
+
+        stats = DryRunStats()
+        row_buffer = None
+
+        if bulk or dataset != 'swissprot':
+            row_buffer = DiscardingRowBuffer(stats, batch_size or BATCH_SIZE, sequence_compression)
+
+        for dataset_name, dataset_url in zip(knowledgebases, urls):
+            knowledgebase, file_name = defaults.DATASETS[dataset_name]
+
+            xml_file_path, _ = self.download_and_extract(
+                dataset_url, force_download, extract and knowledgebase == 'Swiss-Prot', stream, file_name
+            )
+
+            log.info('dry run of {} (nothing is written to the database)'.format(xml_file_path))
+            stats.knowledgebases.append(knowledgebase)
+
+            progress = ImportProgress(knowledgebase, silent, memory_interval=self.memory_report_after)
+            fd = self.open_xml(xml_file_path, progress)
+
+            try:
+                for entry_rows in self.iter_entry_rows(fd, taxids, silent, workers, progress=progress):
+                    stats.add(entry_rows)
+
+                    if row_buffer is not None:
+                        row_buffer.add_entry(entry_rows)
+            finally:
+                if fd is not xml_file_path:
+                    fd.close()
+                progress.close()
+
+            stats.entries_read += self.entries_read
+            stats.bytes_read += progress.bytes_read
+
+        if row_buffer is not None:
+            row_buffer.flush()
+
+        return stats.get_report(workers)
+
+    def load_columnar(self, directory, batch_size: int = None, kmer_index: bool = False, staging: bool = False):
+        """Loads a release converted by :func:`convert_xml`. All tables are dropped and every file is bulk loaded
+        into its table (see :class:`pyuniprot.manager.bulk.BulkWriter`) before indexes and constraints are created.
+
+        :param str directory: directory with files and manifest of :func:`convert_xml`
+        :param Optional[int] batch_size: rows per bulk load, default `pyuniprot.manager.columnar.LOAD_BATCH_SIZE`
+        :param bool kmer_index: if True the k-mer index for motif search is built (see :mod:`pyuniprot.manager.kmers`)
+        :param bool staging: if True files are loaded into staging tables, which replace the live tables after
+            validation (see :mod:`pyuniprot.manager.staging`)
+        :return: number of loaded rows by table name
+        :rtype: collections.OrderedDict
+        """
+        if staging:
+            staging_db = self.get_staging_manager()
+            counts = staging_db.load_columnar(directory, batch_size, kmer_index or bool(self.get_kmer_size()))
+            self.replace_with_staging(staging_db)
+            return counts
+
+        from .bulk import BulkWriter
+        from .columnar import LOAD_BATCH_SIZE, iter_table_rows, read_manifest
+
+        manifest = read_manifest(directory)
+        log.info('load {} entries from {}'.format(manifest['entries'], directory))
+
+        self._drop_tables()
+        self._create_tables(defer_constraints=True)
+
+        self.import_releases([
+            (release['knowledgebase'], release['release_name'],
+             datetime.strptime(release['release_date'], '%Y-%m-%d'))
+            for release in manifest['releases']
+        ])
+
+        start_date = datetime.now()
+        counts = OrderedDict()
+
+        with BulkWriter(self.engine) as writer:
+            for name, table in writer.tables.items():
+                counts[name] = 0
+
+                for rows in iter_table_rows(directory, manifest, name, batch_size or LOAD_BATCH_SIZE):
+                    with writer.connection.begin():
+                        writer.write(table, rows)
+                    counts[name] += len(rows)
+
+                if counts[name] != manifest['tables'][name]['rows']:
+                    raise ValueError('{} rows of {} loaded, manifest has {}'.format(
+                        counts[name], name, manifest['tables'][name]['rows']))
+
+                log.info('{} rows loaded into {}'.format(counts[name], name))
+
+            writer.written_entries = manifest['entries']
+
+        self._create_constraints()
+
+        if kmer_index:
+            self.build_kmer_index()
+
+        for version in self.session.query(models.Version):
+            version.import_start_date = start_date
+            version.import_completed_date = datetime.now()
+
+        self.session.commit()
+
+        return counts
+
+    def get_staging_manager(self):
+        """Returns a manager of the staging tables of this database (see :mod:`pyuniprot.manager.staging`)
+
+        :rtype: DbManager
+        """
+        connection, connect_args = get_staging_connection(self.engine.url)
+        prepare_staging(self.engine)
+        log.info('import into staging tables of {}'.format(self.engine.url))
+        return type(self)(connection, connect_args=connect_args)
+
+    def replace_with_staging(self, staging_db):
+        """Validates the staging tables and replaces the live tables with them in one atomic step. If the
+        validation fails the live tables are not changed and the staging tables are kept.
+
+        :param DbManager staging_db: manager of the staging tables (see :func:`get_staging_manager`)
+        :return: number of rows by table name in the live tables before and after
+        :rtype: tuple[collections.OrderedDict,collections.OrderedDict]
+        """
+        table_names = get_swapped_tables()
+        live_counts = count_rows(self.engine, table_names)
+        staging_counts = count_rows(staging_db.engine, table_names)
+
+        # versions of imported knowledgebases (reldate.txt lists also knowledgebases not imported)
+        versions = staging_db.session.query(models.Version).filter(models.Version.import_start_date.isnot(None)).all()
+        staging_db.session.close()
+
+        if not versions or not all(version.import_completed_date for version in versions):
+            raise ValueError('import into staging tables is not completed')
+
+        validate_staging(live_counts, staging_counts, self.staging_min_entry_ratio)
+
+        for name, rows in staging_counts.items():
+            log.info('{}: {} rows in staging, {} in live tables'.format(name, rows, live_counts.get(name, 0)))
+
+        self.session.close()
+        swap_staging(self.engine, staging_db.engine)
+        log.info('staging tables are live')
+
+        return live_counts, staging_counts
+
+    def get_stored_entries(self, taxids=None, dataset='Swiss-Prot'):
+        """Returns `(id, version, modified)` of all entries of a dataset in the database by entry name
+
+        :param Optional[list[int]] taxids: NCBI taxonomy identifier, if set only entries of these organisms
+        :param str dataset: Swiss-Prot or TrEMBL
+        :return: entry name -> (id, version, modified)
+        :rtype: dict
+        """
+        query = self.session.query(models.Entry.name, models.Entry.id, models.Entry.version, models.Entry.modified)
+        query = query.filter(models.Entry.dataset == dataset)
+
+        if taxids is not None:
+            query = query.filter(models.Entry.taxid.in_(taxids))
+
+        return {name: (entry_id, version, modified) for name, entry_id, version, modified in query}
+
+    @classmethod
+    def iter_changed_entry_rows(cls, entries_rows, stored_entries, outdated_entry_ids, delta):
+        """Filters new and changed entries by comparing `(name, version, modified)` with the stored entries
+
+        Found entries are removed from `stored_entries`, so after the import only entries not in the XML anymore
+        are left. IDs of changed entries are added to `outdated_entry_ids`.
+
+        :param iter[dict] entries_rows: rows (dict) per entry from XML
+        :param dict stored_entries: entry name -> (id, version, modified), see :func:`get_stored_entries`
+        :param list[int] outdated_entry_ids: IDs of stored entries to delete
+        :param dict delta: counter of inserted, updated and unchanged entries
+        :return: generator of rows (dict) per new or changed entry
+        :rtype: iter[dict]
+        """
+        name_index = ENTRY_COLUMNS.index('name')
+        version_index = ENTRY_COLUMNS.index('version')
+        modified_index = ENTRY_COLUMNS.index('modified')
+
+        for entry_rows in entries_rows:
+            entry = entry_rows['entry']
+            stored_entry = stored_entries.pop(entry[name_index], None)
+
+            if stored_entry is None:
+                delta['inserted'] += 1
+
+            else:
+                entry_id, version, modified = stored_entry
+
+                if version == int(entry[version_index]) and modified == entry[modified_index].date():
+                    delta['unchanged'] += 1
+                    continue
+
+                outdated_entry_ids.append(entry_id)
+                delta['updated'] += 1
+
+            yield entry_rows
+
+    def delete_entries(self, entry_ids, chunk_size=500):
+        """Deletes entries with all children and links to other tables
+
+        Rows of shared tables (e.g. PMIDs, keywords, diseases) are not deleted.
+
+        :param list[int] entry_ids: IDs of entries
+        :param int chunk_size: number of entries deleted with one statement
+        """
+        tables = [model.__table__ for _, model, _ in ENTRY_CHILD_ROWS]
+        tables += [models.Sequence.__table__, models.DiseaseComment.__table__, models.entry_pmid,
+                   models.entry_keyword, models.entry_subcellular_location, models.entry_tissue_in_reference]
+
+        for start in range(0, len(entry_ids), chunk_size):
+            chunk = entry_ids[start:start + chunk_size]
+
+            for table in tables:
+                self.session.execute(table.delete().where(table.c.entry_id.in_(chunk)))
+
+            self.session.execute(models.Entry.__table__.delete().where(models.Entry.__table__.c.id.in_(chunk)))
+
+        self.session.commit()
+        log.info('{} entries deleted'.format(len(entry_ids)))
+
+    def load_caches(self):
+        """Loads ids of PMIDs, keywords, subcellular locations, tissues and diseases already in the database in the
+        caches, so they are not inserted twice by an incremental update or resumed import
+        """
+        self.pmids = {str(pmid): id_ for pmid, id_ in self.session.query(models.Pmid.pmid, models.Pmid.id)}
+        self.keywords = {hash(identifier): id_ for identifier, id_ in
+                         self.session.query(models.Keyword.identifier, models.Keyword.id)}
+        self.subcellular_locations = dict(self.session.query(models.SubcellularLocation.location,
+                                                             models.SubcellularLocation.id))
+        self.tissues = dict(self.session.query(models.TissueInReference.tissue, models.TissueInReference.id))
+        self.diseases = dict(self.session.query(models.Disease.identifier, models.Disease.id))
+        self.new_cached = []
+
+    def get_cached(self, cache, key, model, values):
+        """Returns ORM object of a shared row (e.g. `models.Pmid`) from cache, creates it if not in cache
+
+        Caches hold only ids of flushed rows, so ORM objects (and all entries linked to them) are not kept in memory
+        for the whole import. For an id a detached reference is added to the session without query.
+
+        :param dict cache: cache (e.g. `pmids`)
+        :param key: key in cache
+        :param model: model of shared row (e.g. `models.Pmid`)
+        :param dict values: column values used if row is not in cache
+        :return: object of `model`
+        """
+        value = cache.get(key)
+
+        if value is None:
+            value = cache[key] = model(**values)
+            self.new_cached.append((cache, key, value))
+
+        elif isinstance(value, int):
+            reference = self.session.identity_map.get(identity_key(model, value))
+
+            if reference is None:
+                reference = model(id=value)
+                make_transient_to_detached(reference)
+                self.session.add(reference)
+
+            value = reference
+
+        return value
+
+    def settle_caches(self):
+        """Replaces ORM objects created since last call by their ids in the caches (call after flush)"""
+        for cache, key, obj in self.new_cached:
+            cache[key] = obj.id
+
+        self.new_cached = []
+
+    def commit_batch(self, version, entries=0, checkpoint=None):
+        """Commits inserted entries with checkpoint of import in `version`, afterwards caches hold only ids
+
+        The time of flush and commit is added to `batch_sizer` (sets the size of the next batch).
+
+        :param version: `models.Version` of running import
+        :param int entries: number of entries in the batch
+        :param Optional[int] checkpoint: XML entries read until the end of the batch, default `entries_read`
+        """
+        start = time.perf_counter()
+
+        with self.profile_stage('flush'):
+            self.session.flush()
+
+        self.settle_caches()
+        version.import_checkpoint = self.entries_read if checkpoint is None else checkpoint
+
+        with self.profile_stage('commit'):
+            self.session.commit()
+
+        if entries and self.batch_sizer is not None:
+            self.batch_sizer.update(entries, time.perf_counter() - start)
+
+    def iter_batches(self, entries_rows, batch_sizer, writer=None):
+        """Groups entries in batches of `batch_sizer.size` entries (parser thread of a pipelined import)
+
+        The last batch is yielded also if empty, its checkpoint is the number of all XML entries read.
+
+        :param iter[dict] entries_rows: rows (dict) per entry
+        :param batch_sizer: :class:`pyuniprot.manager.batching.BatchSizer`
+        :param writer: optional :class:`pyuniprot.manager.bulk.BulkWriter`, if given data of batches are the rows
+            per table (see :func:`pyuniprot.manager.bulk.BulkWriter.take_batch`), else lists of rows per entry
+        :return: generator of :class:`pyuniprot.manager.pipeline.Batch`
+        """
+        rows = []
+
+        for entry_rows in entries_rows:
+            if writer is None:
+                rows.append(entry_rows)
+
+                if len(rows) >= batch_sizer.size:
+                    yield Batch(rows, len(rows), self.entries_read)
+                    rows = []
+
+            else:
+                writer.buffer_entry(entry_rows)
+
+                if writer.buffered_entries >= batch_sizer.size:
+                    yield Batch(*writer.take_batch(), checkpoint=self.entries_read)
+
+        if writer is None:
+            yield Batch(rows, len(rows), self.entries_read)
+        else:
+            yield Batch(*writer.take_batch(), checkpoint=self.entries_read)
+
+    def run_pipeline(self, batches, write, writers=1):
+        """Writes batches with a pipeline overlapping parsing and writing (see :mod:`pyuniprot.manager.pipeline`)
+
+        :param batches: iterable of :class:`pyuniprot.manager.pipeline.Batch`
+        :param write: function writing a batch
+        :param int writers: number of writers
+        """
+        self.import_pipeline = ImportPipeline(batches, write, writers, self.pipeline_queue_size)
+        log.info('import with pipeline ({} writers, queue of {} batches)'.format(writers,
+                                                                                 self.pipeline_queue_size))
+        self.import_pipeline.run()
+
+    @classmethod
+    def open_xml(cls, xml_file_path, progress=None):
+        """Opens UniProt XML as binary stream. Gzipped files (.gz) are decompressed on the fly, URLs (FTP, HTTP) are
+        read while downloading, so no extracted (or downloaded) copy is needed on disk.
+
+        :param xml_file_path: path or URL to XML file or binary file object
+        :param progress: optional :class:`pyuniprot.manager.progress.ImportProgress` counting the (compressed) bytes
+            read from file or URL, closes the file with :func:`ImportProgress.close`
+        :return: binary file object
+        """
+        if hasattr(xml_file_path, 'read'):
+            return xml_file_path
+
+        is_gzipped = xml_file_path.endswith('.gz')
+
+        if urlsplit(xml_file_path).scheme in REMOTE_SCHEMES:
+            log.info('stream {}'.format(xml_file_path))
+            fd = urlopen(xml_file_path)
+            total = fd.headers.get('Content-Length') if fd.headers else None
+
+        elif progress is None:
+            return gzip.open(xml_file_path, 'rb') if is_gzipped else open(xml_file_path, 'rb')
+
+        else:
+            fd = open(xml_file_path, 'rb')
+            total = os.path.getsize(xml_file_path)
+
+        if progress is not None:
+            fd = progress.wrap(fd, int(total) if total else None)
+
+        return gzip.GzipFile(fileobj=fd, mode='rb') if is_gzipped else fd
+
+    def iter_entry_rows(self, fd, taxids=None, silent=False, workers=1, skip=0, progress=None):
+        """Parses XML to plain row tuples (see :func:`get_entry_rows`). With more than one worker entries are parsed
+        in a pool of processes (see :func:`pyuniprot.manager.parallel.parse_chunk`).
+
+        Before every yielded entry `entries_read` is set to the number of XML entries read including this entry.
+
+        :param fd: binary file object of XML file
+        :param Optional[list[int]] taxids: NCBI taxonomy identifier
+        :param bool silent: no output if True
+        :param int workers: number of parser processes
+        :param int skip: number of entries at the beginning of the file skipped without parsing (the file is still
+            read from the start)
+        :param progress: :class:`pyuniprot.manager.progress.ImportProgress` of the import, created if None
+        :return: generator of rows (dict) per entry
+        :rtype: iter[dict]
+        """
+        self.entries_read = skip
+        own_progress = progress is None
+
+        if own_progress:
+            progress = ImportProgress(silent=silent, initial_entries=skip)
+
+        try:
+            if workers > 1 or skip:
+                from .parallel import parse_xml_parallel
+
+                chunks = parse_xml_parallel(fd, workers, taxids, skip=skip)
+
+                if self.profiler is not None:
+                    chunks = self.profiler.iter_timed('parse XML chunks', chunks)
+
+                for entries_in_chunk, entries_rows in chunks:
+                    chunk_start = self.entries_read
+
+                    for index, entry_rows in entries_rows:
+                        self.entries_read = chunk_start + index + 1
+                        yield entry_rows
+
+                    self.entries_read = chunk_start + entries_in_chunk
+                    progress.update(entries_in_chunk)
+
+            else:
+                from .extractor import extract_entry_rows
+
+                entries = self.iter_entries(fd, taxids, progress)
+
+                if self.profiler is not None:
+                    entries = self.profiler.iter_timed('parse XML', entries)
+                    extract_entry_rows = self.profiler.wrap('extract entry', extract_entry_rows)
+
+                for number, entry in entries:
+                    self.entries_read = number
+                    yield extract_entry_rows(entry)
+        finally:
+            if own_progress:
+                progress.close()
+
+    @classmethod
+    def iter_entries(cls, fd, taxids=None, progress=None):
+        """Iterates over ``<entry>`` nodes of XML, entries are cleared and removed from the tree after use, so
+        memory does not grow with the size of the file.
+
+        If `taxids` are given the NCBI taxonomy identifier is checked when ``<organism>`` of an entry is parsed.
+        Entries of other organisms and entries without ``<organism>`` are not yielded (libxml2 still parses them
+        completely). The serial and the parallel import (:func:`pyuniprot.manager.parallel.parse_chunk`) use this
+        filter.
+
+        :param fd: binary file object of XML file
+        :param Optional[list[int]] taxids: NCBI taxonomy identifier
+        :param progress: optional progress (e.g. :class:`pyuniprot.manager.progress.ImportProgress`) updated for
+            every (also skipped) entry
+        :return: generator of (number of entry in XML starting with 1, XML node entry)
+        """
+        entry_tag = defaults.XML_TAG_PREFIX + 'entry'
+        organism_tag = defaults.XML_TAG_PREFIX + 'organism'
+
+        if taxids is not None:
+            taxids = set(taxids)
+            tags = (entry_tag, organism_tag)
+        else:
+            tags = (entry_tag,)
+
+        # with taxids an entry is skipped until its <organism> is one of them
+        other_organism = taxids is not None
+        number = 0
+
+        for _, elem in iterparse(fd, events=('end',), tag=tags, huge_tree=True):
+
+            if elem.tag == organism_tag:
+                db_reference = elem.find("./n:dbReference[@type='NCBI Taxonomy']", namespaces=XN)
+                other_organism = db_reference is None or int(db_reference.get('id')) not in taxids
+
+            else:
+                number += 1
+
+                if not other_organism:
+                    yield number, elem
+
+                other_organism = taxids is not None
+                elem.clear()
+
+                # processed entries stay attached to the root element, memory would grow with the file
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+                if progress is not None:
+                    progress.update()
+
     # profile
     def insert_entry(self, entry, taxids):
-        """Insert UniProt entry"
+        """Insert UniProt entry, data is extracted in a single pass over the XML node
+        (see :func:`pyuniprot.manager.extractor.extract_entry_rows`)
 
         :param entry: XML node entry
         :param taxids: Optional[iter[int]] taxids: NCBI taxonomy IDs
         """
+        from .extractor import extract_entry_rows
+
+        entry_rows = extract_entry_rows(entry, taxids)
+
+        if entry_rows is not None:
+            self.insert_entry_rows(entry_rows)
+
+    @classmethod
+    def get_entry_rows(cls, entry, taxids=None):
+        """Get all data of an UniProt entry as plain row tuples (picklable, no SQLAlchemy objects). Returns None if
+        the entry is not in `taxids`.
+
+        Calls the `get_*` method of every field. The import uses the faster single-pass equivalent
+        :func:`pyuniprot.manager.extractor.extract_entry_rows`.
+
+        Column order of tuples is defined in `ENTRY_COLUMNS` and `ENTRY_CHILD_ROWS`.
+
+        :param entry: XML node entry
+        :param Optional[iter[int]] taxids: NCBI taxonomy IDs
+        :rtype: Optional[dict]
+        """
+        taxid = cls.get_taxid(entry)
+
+        if taxids is not None and taxid not in taxids:
+            return None
+
+        rp_full, rp_short = cls.get_recommended_protein_name(entry)
+
         entry_dict = dict(entry.attrib)
-        entry_dict['created'] = datetime.strptime(entry_dict['created'], '%Y-%m-%d')
-        entry_dict['modified'] = datetime.strptime(entry_dict['modified'], '%Y-%m-%d')
+        entry_dict.update(
+            created=datetime.strptime(entry_dict['created'], '%Y-%m-%d'),
+            modified=datetime.strptime(entry_dict['modified'], '%Y-%m-%d'),
+            name=cls.get_entry_name(entry),
+            recommended_full_name=rp_full,
+            recommended_short_name=rp_short,
+            taxid=taxid,
+            gene_name=cls.get_gene_name(entry)
+        )
 
-        taxid = self.get_taxid(entry)
+        sequence = cls.get_sequence(entry)
 
-        if taxids is None or taxid in taxids:
-            entry_dict = self.update_entry_dict(entry, entry_dict, taxid)
-            entry_obj = models.Entry(**entry_dict)
-            del entry_dict
+        rows = {
+            'entry': tuple(entry_dict.get(column) for column in ENTRY_COLUMNS),
+            'sequence': sequence.sequence,
+            'sequence_checksum': sequence.checksum,
+            'pmids': cls.get_pmid_rows(entry),
+            'keywords': cls.get_keyword_rows(entry),
+            'subcellular_locations': cls.get_subcellular_location_rows(entry),
+            'tissue_in_references': cls.get_tissue_in_reference_rows(entry),
+            'disease_comments': cls.get_disease_comment_rows(entry),
+        }
 
-            self.session.add(entry_obj)
+        for key, _, columns in ENTRY_CHILD_ROWS:
+            getter = getattr(cls, 'get_' + key)
+            rows[key] = [tuple(getattr(obj, column) for column in columns) for obj in getter(entry)]
+
+        return rows
+
+    def insert_entry_rows(self, rows):
+        """Insert UniProt entry from plain row tuples created by :func:`get_entry_rows`
+
+        :param dict rows: rows of one entry
+        """
+        entry_dict = dict(zip(ENTRY_COLUMNS, rows['entry']))
+
+        for key, model, columns in ENTRY_CHILD_ROWS:
+            entry_dict[key] = [model(**dict(zip(columns, row))) for row in rows[key]]
+
+        entry_dict.update(
+            sequence=self.get_sequence_model(rows['sequence'], rows['sequence_checksum']),
+            pmids=self.get_pmids_from_rows(rows['pmids']),
+            keywords=self.get_keywords_from_rows(rows['keywords']),
+            subcellular_locations=self.get_subcellular_locations_from_rows(rows['subcellular_locations']),
+            tissue_in_references=self.get_tissue_in_references_from_rows(rows['tissue_in_references']),
+            disease_comments=self.get_disease_comments_from_rows(rows['disease_comments'])
+        )
+
+        self.session.add(models.Entry(**entry_dict))
 
     # @profile
     def update_entry_dict(self, entry, entry_dict, taxid):
@@ -284,6 +1508,189 @@ class DbManager(BaseDbManager):
         )
         return entry_dict
 
+    def get_sequence_model(self, sequence, checksum=None):
+        """Returns :class:`pyuniprot.manager.models.Sequence` with the sequence as text or compressed (if
+        `sequence_compression` is set)
+
+        :param str sequence: amino acid sequence
+        :param Optional[str] checksum: CRC64 checksum of the sequence (calculated if None)
+        :rtype: pyuniprot.manager.models.Sequence
+        """
+        plain_sequence, compressed_sequence = get_sequence_columns(sequence, self.sequence_compression)
+        return models.Sequence(plain_sequence=plain_sequence, compressed_sequence=compressed_sequence,
+                               checksum=checksum or get_checksum(sequence))
+
+    def _upgrade_tables(self, chunk_size=10000):
+        """adds columns (and their indexes) missing in tables created by older versions of PyUniProt and calculates
+        missing checksums of sequences
+
+        :param int chunk_size: number of sequences updated per transaction
+        """
+        inspector = sqlalchemy.inspect(self.engine)
+
+        for table in models.Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            missing = [column for column in table.columns if column.name not in existing]
+
+            if not missing:
+                continue
+
+            with self.engine.begin() as connection:
+                for column in missing:
+                    log.info('add column {}.{}'.format(table.name, column.name))
+                    connection.exec_driver_sql('ALTER TABLE {} ADD COLUMN {} {}'.format(
+                        table.name, column.name, column.type.compile(dialect=self.engine.dialect)))
+
+                for index in table.indexes:
+                    if any(column in missing for column in index.columns):
+                        connection.execute(CreateIndex(index))
+
+        self.update_sequence_checksums(chunk_size)
+
+    @staticmethod
+    def _update_sequence_rows(connection, values):
+        """Updates rows of the sequence table
+
+        :param connection: SQLAlchemy connection
+        :param list[dict] values: `row_id` and new values of columns (with prefix `new_`)
+        """
+        if not values:
+            return
+
+        table = models.Sequence.__table__
+        columns = [key[4:] for key in values[0] if key != 'row_id']
+
+        connection.execute(
+            table.update().where(table.c.id == sqlalchemy.bindparam('row_id'))
+            .values({column: sqlalchemy.bindparam('new_' + column) for column in columns}),
+            values
+        )
+
+    def update_sequence_checksums(self, chunk_size=10000):
+        """Calculates missing checksums of sequences (e.g. imported by older versions of PyUniProt)
+
+        :param int chunk_size: number of sequences updated per transaction
+        :return: number of updated sequences
+        :rtype: int
+        """
+        table = models.Sequence.__table__
+        updated = 0
+
+        for connection, rows in self._iter_sequence_chunks(chunk_size, table.c.checksum.is_(None)):
+            self._update_sequence_rows(connection, [
+                {'row_id': row[0], 'new_checksum': get_checksum(sequence)}
+                for row, sequence in zip(rows, self.get_sequences(rows))
+            ])
+            updated += len(rows)
+
+        if updated:
+            log.info('checksums of {} sequences calculated'.format(updated))
+
+        return updated
+
+    def compress_sequences(self, method=ZLIB, chunk_size=10000):
+        """Stores all sequences in the database compressed with `method` or as text (if `method` is None) and
+        reclaims the space (SQLite: ``VACUUM``, PostgreSQL/MySQL: run ``VACUUM FULL`` / ``OPTIMIZE TABLE``)
+
+        Tables created by older versions are upgraded (see :func:`_upgrade_tables`).
+
+        :param Optional[str] method: zlib, pack or None (text)
+        :param int chunk_size: number of sequences updated per transaction
+        :return: size of the database in bytes before and after
+        :rtype: tuple[Optional[int],Optional[int]]
+        """
+        size_before = self.get_database_size()
+        self._upgrade_tables(chunk_size)
+        converted = 0
+
+        for connection, rows in self._iter_sequence_chunks(chunk_size):
+            values = []
+
+            for (id_, plain_sequence, compressed_sequence), sequence in zip(rows, self.get_sequences(rows)):
+                new_plain_sequence, new_compressed_sequence = get_sequence_columns(sequence, method)
+
+                if (new_plain_sequence, new_compressed_sequence) != (plain_sequence, compressed_sequence):
+                    values.append({'row_id': id_, 'new_sequence': new_plain_sequence,
+                                   'new_compressed_sequence': new_compressed_sequence})
+
+            self._update_sequence_rows(connection, values)
+            converted += len(values)
+
+        if self.engine.dialect.name == 'sqlite':
+            with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                connection.exec_driver_sql('VACUUM')
+
+        size_after = self.get_database_size()
+        log.info('{} sequences stored {}, database size {} -> {}'.format(
+            converted, 'compressed with ' + method if method else 'as text', format_size(size_before),
+            format_size(size_after)))
+
+        return size_before, size_after
+
+    def build_kmer_index(self, kmer_size=KMER_SIZE, max_pairs=MAX_PAIRS, chunk_size=10000):
+        """Builds the k-mer index of all sequences used by
+        :func:`pyuniprot.manager.query.QueryManager.sequence_search` (an existing index is replaced)
+
+        Sequences are read in one pass, not more than `max_pairs` pairs of k-mer and sequence id are held in memory
+        (see :class:`pyuniprot.manager.kmers.KmerIndexBuilder`).
+
+        :param int kmer_size: length of k-mers
+        :param int max_pairs: maximum number of pairs of k-mer and sequence id in memory
+        :param int chunk_size: number of sequences read and k-mers inserted per query
+        :return: number of k-mers in the index
+        :rtype: int
+        """
+        kmer_builder = KmerIndexBuilder(kmer_size, max_pairs, chunk_size, self.kmer_run_dir)
+
+        for _, rows in self._iter_sequence_chunks(chunk_size):
+            for (sequence_id, _, _), sequence in zip(rows, self.get_sequences(rows)):
+                kmer_builder.add(sequence_id, sequence)
+
+        return self.write_kmer_index(kmer_builder, chunk_size)
+
+    def write_kmer_index(self, kmer_builder, chunk_size=10000):
+        """Replaces the k-mer index with the postings lists of all sequences added to a k-mer index builder
+
+        The old index is deleted and the new index inserted in one transaction, queries use the old index until the
+        commit and keep it if the build fails.
+
+        :param pyuniprot.manager.kmers.KmerIndexBuilder kmer_builder: k-mer index builder, closed afterwards
+        :param int chunk_size: number of k-mers inserted per query
+        :return: number of k-mers in the index
+        :rtype: int
+        """
+        start = time.time()
+        table = models.SequenceKmer.__table__
+        table.create(self.engine, checkfirst=True)
+        kmers = 0
+
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(table.delete())
+                values = []
+
+                for kmer, sequences, postings in kmer_builder.iter_postings():
+                    values.append({'kmer': kmer, 'sequences': sequences, 'postings': postings})
+
+                    if len(values) >= chunk_size:
+                        connection.execute(table.insert(), values)
+                        kmers += len(values)
+                        values = []
+
+                if values:
+                    connection.execute(table.insert(), values)
+                    kmers += len(values)
+
+            log.info('k-mer index: {} {}-mers of {} sorted runs built in {:.1f} s'.format(
+                kmers, kmer_builder.kmer_size, max(len(kmer_builder.runs), 1), time.time() - start))
+        finally:
+            kmer_builder.close()
+
+        return kmers
+
     @classmethod
     def get_sequence(cls, entry):
         """
@@ -294,8 +1701,9 @@ class DbManager(BaseDbManager):
         """
         seq_tag = entry.find("./n:sequence", namespaces=XN)
         seq = seq_tag.text
+        checksum = get_checksum(seq, seq_tag.get('checksum'))
         seq_tag.clear()
-        return models.Sequence(sequence=seq)
+        return models.Sequence(plain_sequence=seq, checksum=checksum)
 
     def get_tissue_in_references(self, entry):
         """
@@ -304,15 +1712,32 @@ class DbManager(BaseDbManager):
         :param entry: XML node entry
         :return: list of :class:`pyuniprot.manager.models.TissueInReference` objects
         """
-        tissue_in_references = []
+        return self.get_tissue_in_references_from_rows(self.get_tissue_in_reference_rows(entry))
+
+    @classmethod
+    def get_tissue_in_reference_rows(cls, entry):
+        """
+        get list of unique (tissue,) rows from XML node entry
+
+        :param entry: XML node entry
+        :return: list of tuples
+        """
         query = "./n:reference/n:source/n:tissue"
-        tissues = {x.text for x in entry.iterfind(query, namespaces=XN)}
+        return [(tissue,) for tissue in OrderedDict.fromkeys(x.text for x in entry.iterfind(query, namespaces=XN))]
+
+    def get_tissue_in_references_from_rows(self, rows):
+        """
+        get list of cached models.TissueInReference objects from (tissue,) rows
+
+        :param rows: list of (tissue,) tuples
+        :return: list of :class:`pyuniprot.manager.models.TissueInReference` objects
+        """
+        tissue_in_references = []
 
-        for tissue in tissues:
+        for tissue, in rows:
 
-            if tissue not in self.tissues:
-                self.tissues[tissue] = models.TissueInReference(tissue=tissue)
-            tissue_in_references.append(self.tissues[tissue])
+            tissue_in_references.append(
+                self.get_cached(self.tissues, tissue, models.TissueInReference, {'tissue': tissue}))
 
         return tissue_in_references
 
@@ -340,15 +1765,32 @@ class DbManager(BaseDbManager):
         :param entry: XML node entry
         :return: list of :class:`pyuniprot.manager.models.SubcellularLocation` object
         """
+        return self.get_subcellular_locations_from_rows(self.get_subcellular_location_rows(entry))
+
+    @classmethod
+    def get_subcellular_location_rows(cls, entry):
+        """
+        get list of unique (location,) rows from XML node entry
+
+        :param entry: XML node entry
+        :return: list of tuples
+        """
+        query = './n:comment/n:subcellularLocation/n:location'
+        return [(sl,) for sl in OrderedDict.fromkeys(x.text for x in entry.iterfind(query, namespaces=XN))]
+
+    def get_subcellular_locations_from_rows(self, rows):
+        """
+        get list of cached models.SubcellularLocation objects from (location,) rows
+
+        :param rows: list of (location,) tuples
+        :return: list of :class:`pyuniprot.manager.models.SubcellularLocation` object
+        """
         subcellular_locations = []
-        query = './n:comment/n:subcellularLocation/location'
-        sls = {x.text for x in entry.iterfind(query, namespaces=XN)}
 
-        for sl in sls:
+        for sl, in rows:
 
-            if sl not in self.subcellular_locations:
-                self.subcellular_locations[sl] = models.SubcellularLocation(location=sl)
-            subcellular_locations.append(self.subcellular_locations[sl])
+            subcellular_locations.append(
+                self.get_cached(self.subcellular_locations, sl, models.SubcellularLocation, {'location': sl}))
 
         return subcellular_locations
 
@@ -359,17 +1801,30 @@ class DbManager(BaseDbManager):
         :param entry: XML node entry
         :return: list of :class:`pyuniprot.manager.models.Keyword` objects
         """
-        keyword_objects = []
+        return self.get_keywords_from_rows(self.get_keyword_rows(entry))
 
-        for keyword in entry.iterfind("./n:keyword", namespaces=XN):
-            identifier = keyword.get('id')
-            name = keyword.text
-            keyword_hash = hash(identifier)
+    @classmethod
+    def get_keyword_rows(cls, entry):
+        """
+        get list of (identifier, name) rows from XML node entry
 
-            if keyword_hash not in self.keywords:
-                self.keywords[keyword_hash] = models.Keyword(**{'identifier': identifier, 'name': name})
+        :param entry: XML node entry
+        :return: list of tuples
+        """
+        return [(keyword.get('id'), keyword.text) for keyword in entry.iterfind("./n:keyword", namespaces=XN)]
+
+    def get_keywords_from_rows(self, rows):
+        """
+        get list of cached models.Keyword objects from (identifier, name) rows
+
+        :param rows: list of (identifier, name) tuples
+        :return: list of :class:`pyuniprot.manager.models.Keyword` objects
+        """
+        keyword_objects = []
 
-            keyword_objects.append(self.keywords[keyword_hash])
+        for identifier, name in rows:
+            keyword_objects.append(self.get_cached(self.keywords, hash(identifier), models.Keyword,
+                                                   {'identifier': identifier, 'name': name}))
 
         return keyword_objects
 
@@ -391,11 +1846,23 @@ class DbManager(BaseDbManager):
         :param entry: XML node entry
         :return: list of :class:`pyuniprot.manager.models.Disease` objects
         """
-        disease_comments = []
+        return self.get_disease_comments_from_rows(self.get_disease_comment_rows(entry))
+
+    @classmethod
+    def get_disease_comment_rows(cls, entry):
+        """
+        get list of (comment, disease_dict) rows from XML node entry, disease_dict is None if the comment is not
+        linked to a disease
+
+        :param entry: XML node entry
+        :return: list of tuples
+        """
+        rows = []
         query = "./n:comment[@type='disease']"
 
         for disease_comment in entry.iterfind(query, namespaces=XN):
-            value_dict = {'comment': disease_comment.find('./n:text', namespaces=XN).text}
+            comment = disease_comment.find('./n:text', namespaces=XN).text
+            disease_dict = None
 
             disease = disease_comment.find("./n:disease", namespaces=XN)
 
@@ -403,7 +1870,7 @@ class DbManager(BaseDbManager):
                 disease_dict = {'identifier': disease.get('id')}
 
                 for element in disease:
-                    key = element.tag
+                    key = lxml.etree.QName(element).localname
 
                     if key in ['acronym', 'description', 'name']:
                         disease_dict[key] = element.text
@@ -412,10 +1879,28 @@ class DbManager(BaseDbManager):
                         disease_dict['ref_id'] = element.get('id')
                         disease_dict['ref_type'] = element.get('type')
 
-                disease_obj = models.get_or_create(self.session, models.Disease, **disease_dict)
-                self.session.add(disease_obj)
-                self.session.flush()
-                value_dict['disease_id'] = disease_obj.id
+            rows.append((comment, disease_dict))
+
+        return rows
+
+    def get_disease_comments_from_rows(self, rows):
+        """
+        get list of models.DiseaseComment objects from (comment, disease_dict) rows
+
+        Diseases are cached by UniProt disease identifier (no queries or flushes, see :func:`get_cached`), new
+        `models.Disease` objects are inserted with the next commit.
+
+        :param rows: list of (comment, disease_dict) tuples
+        :return: list of :class:`pyuniprot.manager.models.DiseaseComment` objects
+        """
+        disease_comments = []
+
+        for comment, disease_dict in rows:
+            value_dict = {'comment': comment}
+
+            if disease_dict is not None:
+                value_dict['disease'] = self.get_cached(self.diseases, disease_dict['identifier'], models.Disease,
+                                                        disease_dict)
 
             disease_comments.append(models.DiseaseComment(**value_dict))
 
@@ -549,10 +2034,15 @@ class DbManager(BaseDbManager):
 
         for feature in entry.iterfind("./n:feature", namespaces=XN):
 
+            begin, end, position = get_feature_location(feature)
+
             feature_dict = {
                 'description': feature.attrib.get('description'),
                 'type_': feature.attrib['type'],
-                'identifier': feature.attrib.get('id')
+                'identifier': feature.attrib.get('id'),
+                'begin': begin,
+                'end': end,
+                'position': position
             }
 
             features.append(models.Feature(**feature_dict))
@@ -607,7 +2097,19 @@ class DbManager(BaseDbManager):
         :param entry: XML node entry
         :return: list of :class:`pyuniprot.manager.models.Pmid` objects
         """
-        pmids = []
+        return self.get_pmids_from_rows(self.get_pmid_rows(entry))
+
+    @classmethod
+    def get_pmid_rows(cls, entry):
+        """
+        get list of (pmid, pmid_dict) rows from XML node entry, PubMed identifiers cited more than once in the
+        entry are returned only once
+
+        :param entry: XML node entry
+        :return: list of tuples
+        """
+        rows = []
+        pmid_numbers = set()
 
         for citation in entry.iterfind("./n:reference/n:citation", namespaces=XN):
 
@@ -615,33 +2117,43 @@ class DbManager(BaseDbManager):
 
                 pmid_number = pubmed_ref.get('id')
 
-                if pmid_number in self.pmids:
+                if pmid_number in pmid_numbers:
+                    continue
 
-                    pmid_sqlalchemy_obj = self.session.query(models.Pmid)\
-                        .filter(models.Pmid.pmid == pmid_number).one()
+                pmid_numbers.add(pmid_number)
 
-                    pmids.append(pmid_sqlalchemy_obj)
+                pmid_dict = dict(citation.attrib)
+                if not re.search('^\d+$', pmid_dict['volume']):
+                    pmid_dict['volume'] = -1
 
-                else:
-                    pmid_dict = dict(citation.attrib)
-                    if not re.search('^\d+$', pmid_dict['volume']):
-                        pmid_dict['volume'] = -1
+                del pmid_dict['type'] # not needed because already filtered for PubMed
 
-                    del pmid_dict['type'] # not needed because already filtered for PubMed
+                pmid_dict.update(pmid=pmid_number)
+                title_tag = citation.find('./n:title', namespaces=XN)
 
-                    pmid_dict.update(pmid=pmid_number)
-                    title_tag = citation.find('./n:title', namespaces=XN)
+                if title_tag is not None:
+                    pmid_dict.update(title=title_tag.text)
 
-                    if title_tag is not None:
-                        pmid_dict.update(title=title_tag.text)
+                rows.append((pmid_number, pmid_dict))
 
-                    pmid_sqlalchemy_obj = models.Pmid(**pmid_dict)
-                    self.session.add(pmid_sqlalchemy_obj)
-                    self.session.flush()
+        return rows
+
+    def get_pmids_from_rows(self, rows):
+        """
+        get cached `models.Pmid` objects from (pmid, pmid_dict) rows
 
-                    pmids.append(pmid_sqlalchemy_obj)
+        Every PubMed identifier is created only once per import, the cache (PubMed identifier -> id, see
+        :func:`get_cached`) avoids queries and flushes. New `models.Pmid` objects and links to entries are inserted
+        with the next commit.
 
-                    self.pmids |= set([pmid_number, ]) # extend the cache of identifiers
+        :param rows: list of (pmid, pmid_dict) tuples
+        :return: list of :class:`pyuniprot.manager.models.Pmid` objects
+        """
+        pmids = []
+
+        for pmid_number, pmid_dict in rows:
+
+            pmids.append(self.get_cached(self.pmids, pmid_number, models.Pmid, pmid_dict))
 
         return pmids
 
@@ -668,8 +2180,10 @@ class DbManager(BaseDbManager):
         return dtypes
 
     @classmethod
-    def download_and_extract(cls, url=None, force_download=False):
-        """Downloads uniprot_sprot.xml.gz and reldate.txt (release date information) from URL or file path
+    def download_and_extract(cls, url=None, force_download=False, extract=True, stream=False,
+                             file_name=defaults.SWISSPROT_FILE_NAME, segments=defaults.DOWNLOAD_SEGMENTS):
+        """Downloads uniprot_sprot.xml.gz (or uniprot_trembl.xml.gz) and reldate.txt (release date information) from
+        URL or file path
 
         .. note::
 
@@ -679,37 +2193,56 @@ class DbManager(BaseDbManager):
         :param str url: UniProt gzipped URL or file path
         :param force_download: force method to download
         :type force_download: bool
+        :param bool extract: if False path to gzipped file is returned and file is not extracted
+        :param bool stream: if True (and URL is FTP or HTTP) only reldate.txt is downloaded and the URL itself is
+            returned to be streamed by :func:`DbManager.import_xml`
+        :param str file_name: file name of gzipped XML in :data:`defaults.XML_DIR_NAME` (if no URL is given)
+        :param int segments: number of segments downloaded in parallel (see :func:`pyuniprot.manager.download.download`)
+        :return: path to XML file (or URL) and path to reldate.txt
+        :rtype: tuple[str, str]
         """
         if url:
             version_url = os.path.join(os.path.dirname(url), defaults.VERSION_FILE_NAME)
         else:
-            url = os.path.join(defaults.XML_DIR_NAME, defaults.SWISSPROT_FILE_NAME)
+            url = os.path.join(defaults.XML_DIR_NAME, file_name)
             version_url = os.path.join(defaults.XML_DIR_NAME, defaults.VERSION_FILE_NAME)
 
         xml_file_path = cls.get_path_to_file_from_url(url)
         xml_file_path_extracted = xml_file_path.split(".gz")[0]
         version_file_path = cls.get_path_to_file_from_url(version_url)
 
-        if force_download or not os.path.exists(xml_file_path):
+        scheme = urlsplit(url).scheme
 
-            log.info('download {} and {}'.format(xml_file_path, version_file_path))
+        if stream and scheme in REMOTE_SCHEMES:
+            download(version_url, version_file_path, segments=1, force=True)
+            return url, version_file_path
 
-            scheme = urlsplit(url).scheme
+        downloaded = False
 
-            if scheme in ('ftp', 'http'):
-                urlretrieve(version_url, version_file_path)
-                urlretrieve(url, xml_file_path)
+        if scheme in REMOTE_SCHEMES:
+            # a valid local copy (size and MD5 of release) is not downloaded again
+            metalink_url = os.path.join(os.path.dirname(url), defaults.RELEASE_METALINK_FILE_NAME)
+            size, md5 = get_release_checksums(metalink_url).get(os.path.basename(xml_file_path), (None, None))
 
-            elif not scheme and os.path.isfile(url):
-                shutil.copyfile(url, xml_file_path)
-                shutil.copyfile(version_url, version_file_path)
+            download(version_url, version_file_path, segments=1, force=True)
+            downloaded = download(url, xml_file_path, segments, size, md5, force_download)
 
+        elif (force_download or not os.path.exists(xml_file_path)) and not scheme and os.path.isfile(url):
+            log.info('copy {} and {}'.format(xml_file_path, version_file_path))
+            shutil.copyfile(url, xml_file_path)
+            shutil.copyfile(version_url, version_file_path)
+            downloaded = True
+
+        if downloaded and extract:
             log.info('extract {}'.format(xml_file_path))
 
             with gzip.open(xml_file_path, 'rb') as f_in:
                 with open(xml_file_path_extracted, 'wb') as f_out:
                     shutil.copyfileobj(f_in, f_out)
 
+        if not extract or not os.path.exists(xml_file_path_extracted):
+            return xml_file_path, version_file_path
+
         return xml_file_path_extracted, version_file_path
 
     @classmethod
@@ -769,7 +2302,12 @@ class DbManager(BaseDbManager):
 
 
 def update(connection=None, urls: Iterable[str] = None,
-           force_download: bool = False, taxids: Iterable[int] = None, silent: bool = False):
+           force_download: bool = False, taxids: Iterable[int] = None, silent: bool = False, workers: int = 1,
+           extract: bool = True, stream: bool = False, bulk: bool = False, incremental: bool = False,
+           resume: bool = False, dataset: str = 'swissprot', profile=None, batch_size: int = None,
+           adaptive_batch: bool = False, max_rss: int = None, pipeline: bool = False, writers: int = 1,
+           sequence_compression: str = None, kmer_index: bool = False, staging: bool = False,
+           dry_run: bool = False):
     """Updates CTD database
 
     :param urls: list of urls to download
@@ -783,12 +2321,83 @@ def update(connection=None, urls: Iterable[str] = None,
     :param taxids: NCBI Taxonomy IDs to be imported
     :type silent: bool
     :param silent: If `True` no prints in stdout.
+    :param int workers: number of processes parsing the XML file in parallel
+    :param bool extract: if False gzipped XML is imported without extracting it to disk
+    :param bool stream: if True XML is imported while downloading (no copy on disk)
+    :param bool bulk: if True entries are written with batched inserts instead of the ORM (faster)
+    :param bool incremental: if True only new, changed and removed entries are updated
+    :param bool resume: if True an interrupted update continues after the last checkpoint
+    :param str dataset: swissprot, trembl or both (TrEMBL is always imported with the bulk writer)
+    :param profile: if True or path to JSON file, time of import stages is measured and written to JSON file
+    :param Optional[int] batch_size: entries per commit (default 100 with ORM, 1000 with bulk writer)
+    :param bool adaptive_batch: if True the batch size is adapted to flush time and memory
+    :param Optional[int] max_rss: RSS budget in bytes for the adaptive batch size (implies `adaptive_batch`)
+    :param bool pipeline: if True the XML is parsed while entries are written (parser thread and writers)
+    :param int writers: number of writers (database connections) of a pipelined import with bulk writer
+    :param Optional[str] sequence_compression: zlib or pack to store sequences compressed, None as text
+    :param bool kmer_index: if True the k-mer index for motif search (`QueryManager.sequence_search`) is built
+    :param bool staging: if True the release is imported into staging tables, which replace the live tables after
+        validation of the row counts (queries use the previous release until then)
+    :param bool dry_run: if True the XML is parsed without touching the database, entries per second, elements per
+        field and peak memory are reported
+    :return: report of dry run (see :mod:`pyuniprot.manager.dryrun`) if `dry_run`, profile (see
+        :class:`pyuniprot.manager.profiler.StageProfiler`) if `profile` else None
+    :rtype: Optional[dict]
+    """
+    if isinstance(taxids, int):
+        taxids = (taxids,)
+    db = DbManager(connection)
+    report = db.db_import_xml(urls, force_download, taxids, silent, workers, extract, stream, bulk, incremental,
+                              resume, dataset, profile, batch_size, adaptive_batch, max_rss, pipeline, writers,
+                              sequence_compression, kmer_index, staging, dry_run)
+    db.session.close()
+    return report
+
+
+def convert(directory, urls: Iterable[str] = None, force_download: bool = False, taxids: Iterable[int] = None,
+            silent: bool = False, workers: int = 1, extract: bool = True, stream: bool = False,
+            dataset: str = 'swissprot', file_format: str = 'parquet', batch_size: int = None,
+            sequence_compression: str = None):
+    """Converts UniProt XML to one Parquet or Arrow file per table, loaded into databases with :func:`load`
+
+    :param str directory: output directory
+    :param urls: URL or one URL per dataset
+    :param bool force_download: force method to download
+    :param int,list,tuple taxids: int or iterable of NCBI taxonomy identifiers (default is None = convert all)
+    :param bool silent: If `True` no prints in stdout.
+    :param int workers: number of processes parsing the XML file in parallel
+    :param bool extract: if False gzipped XML is converted without extracting it to disk
+    :param bool stream: if True XML is converted while downloading (no copy on disk)
+    :param str dataset: swissprot, trembl or both
+    :param str file_format: parquet or arrow
+    :param Optional[int] batch_size: entries per appended row group (default 1000)
+    :param Optional[str] sequence_compression: zlib or pack to store sequences compressed, None as text
+    :return: manifest with number of rows per table
+    :rtype: dict
     """
     if isinstance(taxids, int):
         taxids = (taxids,)
+    db = DbManager()
+    return db.convert_xml(directory, urls, force_download, taxids, silent, workers, extract, stream, dataset,
+                          file_format, batch_size, sequence_compression)
+
+
+def load(directory, connection=None, batch_size: int = None, kmer_index: bool = False, staging: bool = False):
+    """Loads a release converted by :func:`convert` into a database (all tables are replaced)
+
+    :param str directory: directory with files of :func:`convert`
+    :param connection: custom database connection string
+    :param Optional[int] batch_size: rows per bulk load (default 50000)
+    :param bool kmer_index: if True the k-mer index for motif search (`QueryManager.sequence_search`) is built
+    :param bool staging: if True files are loaded into staging tables, which replace the live tables after
+        validation of the row counts
+    :return: number of loaded rows by table name
+    :rtype: collections.OrderedDict
+    """
     db = DbManager(connection)
-    db.db_import_xml(urls, force_download, taxids, silent)
+    counts = db.load_columnar(directory, batch_size, kmer_index, staging)
     db.session.close()
+    return counts
 
 
 def set_mysql_connection(host='localhost', user='pyuniprot_user', passwd='pyuniprot_passwd', db='pyuniprot',
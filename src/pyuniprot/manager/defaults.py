@@ -5,6 +5,8 @@ This file contains a listing of the default CTD URLs.
 """
 import os
 
+from collections import OrderedDict
+
 from ..constants import PYUNIPROT_DIR, PYUNIPROT_DATA_DIR
 
 DEFAULT_SQLITE_DATABASE_NAME = 'pyuniprot.db'
@@ -13,10 +15,21 @@ DEFAULT_DATABASE_LOCATION = os.path.join(PYUNIPROT_DATA_DIR, DEFAULT_SQLITE_DATA
 DEFAULT_TEST_DATABASE_LOCATION = os.path.join(PYUNIPROT_DATA_DIR, DEFAULT_SQLITE_TEST_DATABASE_NAME)
 
 
-XML_DIR_NAME = "ftp://ftp.uniprot.org/pub/databases/uniprot/current_release/knowledgebase/complete/"
+XML_DIR_NAME = "https://ftp.uniprot.org/pub/databases/uniprot/current_release/knowledgebase/complete/"
 SWISSPROT_FILE_NAME = "uniprot_sprot.xml.gz"
 TREMBEL_FILE_NAME = "uniprot_trembl.xml.gz"
 VERSION_FILE_NAME = "reldate.txt"
+RELEASE_METALINK_FILE_NAME = "RELEASE.metalink"  # size and MD5 checksum of all files in release
+
+DOWNLOAD_SEGMENTS = 4  # segments of a file downloaded in parallel
+
+PROFILE_FILE_NAME = "import_profile.json"  # profile of last import (pyuniprot update --profile)
+
+# dataset -> (knowledgebase, file name)
+DATASETS = OrderedDict([
+    ('swissprot', ('Swiss-Prot', SWISSPROT_FILE_NAME)),
+    ('trembl', ('TrEMBL', TREMBEL_FILE_NAME)),
+])
 
 sqlalchemy_connection_string_default = 'sqlite:///' + DEFAULT_DATABASE_LOCATION
 sqlalchemy_connection_string_4_tests = 'sqlite:///' + DEFAULT_TEST_DATABASE_LOCATION
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""Parallel and resumable download of UniProt release files.
+
+Files are split into segments which are fetched in parallel with HTTP range requests. Every segment is written to its
+own part file (``<file>.part<index>``), so an interrupted segment (or an interrupted download) continues where it
+stopped. After all segments are joined the file is verified against size and MD5 checksum of the release
+(``RELEASE.metalink`` in the same folder). A valid local copy is not downloaded again.
+
+Servers without range requests (and FTP) are downloaded in one segment without resume.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+from lxml import etree
+
+from . import defaults
+
+log = logging.getLogger(__name__)
+
+BLOCK_SIZE = 1 << 20  # bytes read from response at once
+MIN_SEGMENT_SIZE = 1 << 20  # smaller files are not split
+TIMEOUT = 60  # seconds
+RETRIES = 5
+
+
+class DownloadError(IOError):
+    """Download failed or downloaded file does not match size or checksum of the release"""
+
+
+def get_release_checksums(url):
+    """Returns size and MD5 checksum of all files in ``RELEASE.metalink`` of a UniProt release folder
+
+    :param str url: URL of ``RELEASE.metalink``
+    :return: dictionary of file name to (size, MD5), empty if metalink is not available
+    :rtype: dict[str,tuple[Optional[int],Optional[str]]]
+    """
+    try:
+        with urlopen(url, timeout=TIMEOUT) as response:
+            root = etree.fromstring(response.read())
+    except (URLError, HTTPException, OSError, etree.XMLSyntaxError) as e:
+        log.warning('no checksums from {}: {}'.format(url, e))
+        return {}
+
+    checksums = {}
+
+    for file_element in root.iterfind('.//{*}file'):
+        size = file_element.findtext('{*}size')
+        md5 = file_element.findtext('{*}verification/{*}hash[@type="md5"]')
+        checksums[file_element.get('name')] = (int(size) if size else None, md5)
+
+    return checksums
+
+
+def get_remote_size(url):
+    """Returns size of remote file and if the server accepts range requests
+
+    :param str url: URL
+    :return: size in bytes (None if unknown) and True if range requests are supported
+    :rtype: tuple[Optional[int],bool]
+    """
+    if urlsplit(url).scheme not in ('http', 'https'):
+        return None, False
+
+    with urlopen(Request(url, method='HEAD'), timeout=TIMEOUT) as response:
+        size = response.headers.get('Content-Length')
+        accept_ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+
+    return (int(size) if size else None), accept_ranges
+
+
+def get_md5(path, block_size=BLOCK_SIZE):
+    """Returns MD5 checksum of a file
+
+    :param str path: path to file
+    :param int block_size: bytes read at once
+    :rtype: str
+    """
+    md5 = hashlib.md5()
+
+    with open(path, 'rb') as fd:
+        for block in iter(lambda: fd.read(block_size), b''):
+            md5.update(block)
+
+    return md5.hexdigest()
+
+
+def is_valid(path, size=None, md5=None):
+    """Checks if a local file exists and has the expected size and MD5 checksum
+
+    :param str path: path to file
+    :param Optional[int] size: expected size in bytes (not checked if None)
+    :param Optional[str] md5: expected MD5 checksum (not checked if None)
+    :rtype: bool
+    """
+    if not os.path.isfile(path):
+        return False
+
+    if size is not None and os.path.getsize(path) != size:
+        return False
+
+    return md5 is None or get_md5(path) == md5.lower()
+
+
+def get_segments(size, segments):
+    """Splits `size` bytes in at most `segments` ranges of at least :data:`MIN_SEGMENT_SIZE` bytes
+
+    :param int size: size of file in bytes
+    :param int segments: maximum number of segments
+    :return: list of (first byte, last byte) (inclusive like in HTTP range requests)
+    :rtype: list[tuple[int,int]]
+    """
+    segments = max(1, min(segments, size // MIN_SEGMENT_SIZE))
+    bounds = [size * index // segments for index in range(segments + 1)]
+    return [(bounds[index], bounds[index + 1] - 1) for index in range(segments)]
+
+
+def download_segment(url, part_path, first=None, last=None, retries=RETRIES):
+    """Downloads bytes `first` to `last` of `url` to `part_path`. Bytes already in `part_path` are not downloaded
+    again. If the connection fails the download continues after the last received byte (up to `retries` times).
+
+    Without `first` and `last` the whole file is downloaded without range request (and without resume).
+
+    :param str url: URL
+    :param str part_path: path to part file
+    :param Optional[int] first: first byte of segment
+    :param Optional[int] last: last byte of segment
+    :param int retries: number of retries after failed requests
+    """
+    ranged = first is not None
+
+    for attempt in range(retries + 1):
+        done = os.path.getsize(part_path) if ranged and os.path.exists(part_path) else 0
+
+        if ranged and done >= last - first + 1:
+            return
+
+        headers = {'Range': 'bytes={}-{}'.format(first + done, last)} if ranged else {}
+
+        try:
+            with urlopen(Request(url, headers=headers), timeout=TIMEOUT) as response:
+                if ranged and response.status != 206:
+                    raise DownloadError('{} does not support range requests'.format(url))
+
+                with open(part_path, 'ab' if ranged else 'wb') as fd:
+                    shutil.copyfileobj(response, fd, BLOCK_SIZE)
+
+            if not ranged:
+                return
+
+        except DownloadError:
+            raise
+
+        except HTTPError as e:
+            if e.code < 500 and e.code != 429:
+                raise DownloadError('download of {} failed: {}'.format(url, e))
+            error = e
+
+        except (URLError, HTTPException, OSError) as e:
+            error = e
+
+        else:
+            continue  # size of part file is checked at start of next iteration
+
+        if attempt < retries:
+            log.warning('download of {} failed ({}), retry {} of {}'.format(url, error, attempt + 1, retries))
+            time.sleep(min(2 ** attempt, 30))
+
+    raise DownloadError('download of {} failed after {} retries'.format(url, retries))
+
+
+def download(url, path, segments=defaults.DOWNLOAD_SEGMENTS, size=None, md5=None, force=False, retries=RETRIES):
+    """Downloads `url` to `path` in parallel segments with HTTP range requests
+
+    If `size` is not given, the size is taken from the Content-Length of the server. A local file with the expected
+    size and `md5` is not downloaded again (unless `force`). If neither size nor MD5 is known (e.g. FTP without
+    metalink), an existing local file is kept.
+
+    :param str url: URL of file
+    :param str path: path to local file
+    :param int segments: maximum number of segments downloaded in parallel
+    :param Optional[int] size: expected size in bytes
+    :param Optional[str] md5: expected MD5 checksum
+    :param bool force: download even if local file is valid
+    :param int retries: number of retries per segment
+    :return: True if file was downloaded, False if local copy is valid
+    :rtype: bool
+    :raises DownloadError: if download failed or file does not match `size` or `md5`
+    """
+    try:
+        remote_size, accept_ranges = get_remote_size(url)
+    except (URLError, HTTPException, OSError) as e:
+        raise DownloadError('{} not available: {}'.format(url, e))
+
+    size = size if size is not None else remote_size
+
+    if not force and is_valid(path, size, md5):
+        if size is None and not md5:
+            log.info('{} exists (size and checksum unknown), skip download'.format(path))
+        else:
+            log.info('{} is valid, skip download'.format(path))
+        return False
+
+    if accept_ranges and size:
+        ranges = get_segments(size, segments)
+    else:
+        ranges = [(None, None)]
+
+    part_paths = ['{}.part{}'.format(path, index) for index in range(len(ranges))]
+
+    if force:
+        for part_path in part_paths:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    log.info('download {} in {} segment(s)'.format(url, len(ranges)))
+
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(download_segment, url, part_path, first, last, retries)
+                   for part_path, (first, last) in zip(part_paths, ranges)]
+
+        for future in futures:
+            future.result()
+
+    with open(path, 'wb') as fd:
+        for part_path in part_paths:
+            with open(part_path, 'rb') as part_fd:
+                shutil.copyfileobj(part_fd, fd, BLOCK_SIZE)
+
+    for part_path in part_paths:
+        os.remove(part_path)
+
+    if not is_valid(path, size, md5):
+        os.remove(path)
+        raise DownloadError('{} does not match size {} and MD5 {} of release'.format(url, size, md5))
+
+    return True
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Parse-only dry run of an update (``pyuniprot update --dry-run``).
+
+The XML is read and every entry is extracted exactly as by an import (same parser processes, taxonomy filter and
+extractor), but nothing is written to the database. With the bulk writer the rows of every table are also built
+(:class:`pyuniprot.manager.bulk.RowBuffer`) and discarded after every batch.
+
+The report shows entries per second, the number of elements extracted per field and the peak memory (RSS), so the
+throughput of parsing can be compared with the throughput of an import (is parsing or the database the bottleneck?)
+and a new release file can be validated quickly.
+"""
+import time
+
+from collections import OrderedDict
+
+from .bulk import RowBuffer
+from .database import ENTRY_CHILD_ROWS
+from .progress import get_peak_rss
+
+# fields of the plain entry rows (see pyuniprot.manager.database.DbManager.get_entry_rows) with a list of elements
+ROW_FIELDS = tuple(key for key, _, _ in ENTRY_CHILD_ROWS) + (
+    'pmids', 'keywords', 'subcellular_locations', 'tissue_in_references', 'disease_comments'
+)
+
+
+class DryRunStats(object):
+    """Counts extracted entries and elements per field of a dry run"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.entries = 0
+        self.entries_read = 0
+        self.bytes_read = 0
+        self.knowledgebases = []
+        self.fields = OrderedDict((field, 0) for field in ROW_FIELDS)
+        self.sequences = 0
+        self.residues = 0
+        self.table_rows = OrderedDict()  # rows per table built by DiscardingRowBuffer (bulk writer)
+
+    def add(self, rows):
+        """Adds the rows of an entry
+
+        :param dict rows: rows of one entry (see :func:`pyuniprot.manager.database.DbManager.get_entry_rows`)
+        """
+        self.entries += 1
+
+        for field in ROW_FIELDS:
+            self.fields[field] += len(rows[field])
+
+        if rows['sequence'] is not None:
+            self.sequences += 1
+            self.residues += len(rows['sequence'])
+
+    def get_report(self, workers=1):
+        """Returns the report of the dry run
+
+        :param int workers: number of parser processes (peak RSS of the largest worker is reported if > 1)
+        :rtype: collections.OrderedDict
+        """
+        seconds = time.perf_counter() - self.start
+        fields = OrderedDict(self.fields)
+        fields['sequences'] = self.sequences
+        fields['residues'] = self.residues
+
+        return OrderedDict([
+            ('knowledgebases', self.knowledgebases),
+            ('entries', self.entries),
+            ('entries_read', self.entries_read),
+            ('bytes_read', self.bytes_read),
+            ('seconds', seconds),
+            ('entries_per_second', self.entries / max(seconds, 1e-9)),
+            ('workers', workers),
+            ('peak_rss', get_peak_rss()),
+            ('peak_rss_workers', get_peak_rss(children=True) if workers > 1 else None),
+            ('fields', fields),
+            ('table_rows', OrderedDict(self.table_rows)),
+        ])
+
+
+class DiscardingRowBuffer(RowBuffer):
+    """Builds the table rows of the bulk writer (primary keys, unique values, links) and discards them on flush
+
+    :param DryRunStats stats: counts the discarded rows per table
+    :param int batch_size: number of entries buffered before rows are discarded
+    :param Optional[str] sequence_compression: zlib or pack to compress sequences as by an import
+    """
+
+    def __init__(self, stats, batch_size, sequence_compression=None):
+        super(DiscardingRowBuffer, self).__init__(batch_size, sequence_compression)
+        self.stats = stats
+
+    def flush(self):
+        """Discards all buffered rows"""
+        buffers, _ = self.take_batch()
+
+        for name, rows in buffers.items():
+            self.stats.table_rows[name] = self.stats.table_rows.get(name, 0) + len(rows)
+
+
+def format_dry_run(report):
+    """Formats the report of a dry run as text with one line per field
+
+    :param dict report: report of :func:`DryRunStats.get_report`
+    :rtype: str
+    """
+    mib = 2 ** 20
+
+    lines = [
+        'dry run of {}: {} entries extracted ({} read) in {:.2f} s, {:.1f} entries/s, {:.1f} MiB read'.format(
+            ', '.join(report['knowledgebases']), report['entries'], report['entries_read'], report['seconds'],
+            report['entries_per_second'], report['bytes_read'] / mib),
+    ]
+
+    if report['peak_rss'] is not None:
+        line = 'peak RSS: {:.1f} MiB'.format(report['peak_rss'] / mib)
+
+        if report['peak_rss_workers'] is not None:
+            line += ', {:.1f} MiB per parser process ({} processes)'.format(report['peak_rss_workers'] / mib,
+                                                                          report['workers'])
+        lines.append(line)
+
+    width = max(len(field) for field in report['fields'])
+    lines.append('')
+    lines.append('{:<{width}}  {:>12}  {:>10}'.format('field', 'elements', 'per entry', width=width))
+
+    for field, count in report['fields'].items():
+        lines.append('{:<{width}}  {:>12}  {:>10.2f}'.format(field, count, count / max(report['entries'], 1),
+                                                             width=width))
+
+    if report['table_rows']:
+        width = max(len(name) for name in report['table_rows'])
+        lines.append('')
+        lines.append('{:<{width}}  {:>12}'.format('table', 'rows', width=width))
+
+        for name, rows in report['table_rows'].items():
+            lines.append('{:<{width}}  {:>12}'.format(name, rows, width=width))
+
+    return '\n'.join(lines)
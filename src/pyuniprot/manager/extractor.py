@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""Single-pass extraction of UniProt entries.
+
+:func:`extract_entry_rows` walks the children of an ``<entry>`` element once and dispatches on tag and ``type``
+attribute. It returns the same plain row tuples as :func:`pyuniprot.manager.database.DbManager.get_entry_rows`, which
+calls one `get_*` method (with its own `find`/`iterfind` path query) per field.
+
+Compare both approaches with :func:`benchmark_extraction`.
+"""
+import re
+import time
+
+from collections import OrderedDict
+from datetime import datetime
+
+from lxml.etree import iterparse
+
+from .checksum import get_checksum
+from .database import DbManager, ENTRY_COLUMNS, ENTRY_CHILD_ROWS, XN_URL, get_feature_location
+
+TAG_PREFIX = '{' + XN_URL + '}'
+
+ENTRY = TAG_PREFIX + 'entry'
+ACCESSION = TAG_PREFIX + 'accession'
+NAME = TAG_PREFIX + 'name'
+PROTEIN = TAG_PREFIX + 'protein'
+RECOMMENDED_NAME = TAG_PREFIX + 'recommendedName'
+ALTERNATIVE_NAME = TAG_PREFIX + 'alternativeName'
+FULL_NAME = TAG_PREFIX + 'fullName'
+SHORT_NAME = TAG_PREFIX + 'shortName'
+EC_NUMBER = TAG_PREFIX + 'ecNumber'
+GENE = TAG_PREFIX + 'gene'
+ORGANISM = TAG_PREFIX + 'organism'
+ORGANISM_HOST = TAG_PREFIX + 'organismHost'
+DB_REFERENCE = TAG_PREFIX + 'dbReference'
+REFERENCE = TAG_PREFIX + 'reference'
+CITATION = TAG_PREFIX + 'citation'
+TITLE = TAG_PREFIX + 'title'
+SOURCE = TAG_PREFIX + 'source'
+TISSUE = TAG_PREFIX + 'tissue'
+COMMENT = TAG_PREFIX + 'comment'
+TEXT = TAG_PREFIX + 'text'
+DISEASE = TAG_PREFIX + 'disease'
+SUBCELLULAR_LOCATION = TAG_PREFIX + 'subcellularLocation'
+LOCATION = TAG_PREFIX + 'location'
+KEYWORD = TAG_PREFIX + 'keyword'
+FEATURE = TAG_PREFIX + 'feature'
+SEQUENCE = TAG_PREFIX + 'sequence'
+
+DISEASE_KEYS = {TAG_PREFIX + key: key for key in ('acronym', 'description', 'name')}
+
+VOLUME_PATTERN = re.compile(r'^\d+$')
+
+
+def get_taxid(organism):
+    """Returns NCBI taxonomy identifier of an ``<organism>`` or ``<organismHost>`` element
+
+    :param organism: XML node organism
+    :rtype: Optional[str]
+    """
+    for db_reference in organism.iterchildren(DB_REFERENCE):
+        if db_reference.get('type') == 'NCBI Taxonomy':
+            return db_reference.get('id')
+
+
+def extract_entry_rows(entry, taxids=None):
+    """Get all data of an UniProt entry as plain row tuples walking the children of the entry only once. Returns
+    None if the entry is not in `taxids`.
+
+    :param entry: XML node entry
+    :param Optional[iter[int]] taxids: NCBI taxonomy IDs
+    :rtype: Optional[dict]
+    """
+    entry_dict = dict(entry.attrib)
+    entry_dict['created'] = datetime.strptime(entry_dict['created'], '%Y-%m-%d')
+    entry_dict['modified'] = datetime.strptime(entry_dict['modified'], '%Y-%m-%d')
+
+    rows = {key: [] for key, _, _ in ENTRY_CHILD_ROWS}
+    rows.update(pmids=[], keywords=[], disease_comments=[], sequence=None, sequence_checksum=None)
+
+    accessions = rows['accessions']
+    db_references = rows['db_references']
+    features = rows['features']
+    keywords = rows['keywords']
+
+    pmids = OrderedDict()
+    subcellular_locations = OrderedDict()
+    tissues = OrderedDict()
+
+    for child in entry:
+        tag = child.tag
+
+        if tag == FEATURE:
+            features.append((child.get('type'), child.get('id'), child.get('description')) +
+                            get_feature_location(child))
+
+        elif tag == DB_REFERENCE:
+            db_references.append((child.get('type'), child.get('id')))
+
+        elif tag == REFERENCE:
+            for element in child:
+
+                if element.tag == CITATION:
+                    title = None
+                    pubmed_ids = []
+
+                    for citation_element in element:
+                        if citation_element.tag == TITLE and title is None:
+                            title = citation_element.text
+
+                        elif citation_element.tag == DB_REFERENCE and citation_element.get('type') == 'PubMed':
+                            pubmed_ids.append(citation_element.get('id'))
+
+                    for pmid_number in pubmed_ids:
+                        if pmid_number not in pmids:
+                            pmid_dict = dict(element.attrib)
+                            if not VOLUME_PATTERN.search(pmid_dict['volume']):
+                                pmid_dict['volume'] = -1
+                            del pmid_dict['type']  # not needed because already filtered for PubMed
+                            pmid_dict['pmid'] = pmid_number
+                            if title is not None:
+                                pmid_dict['title'] = title
+                            pmids[pmid_number] = pmid_dict
+
+                elif element.tag == SOURCE:
+                    for tissue in element.iterchildren(TISSUE):
+                        tissues[tissue.text] = None
+
+        elif tag == COMMENT:
+            comment_type = child.get('type')
+
+            if comment_type == 'function':
+                text = child.find(TEXT)
+                rows['functions'].append((text.text,))
+
+            elif comment_type == 'tissue specificity':
+                rows['tissue_specificities'].extend((text.text,) for text in child.iterchildren(TEXT))
+
+            elif comment_type == 'disease':
+                text = child.find(TEXT)
+                disease_dict = None
+                disease = child.find(DISEASE)
+
+                if disease is not None:
+                    disease_dict = {'identifier': disease.get('id')}
+
+                    for element in disease:
+                        if element.tag in DISEASE_KEYS:
+                            disease_dict[DISEASE_KEYS[element.tag]] = element.text
+
+                        elif element.tag == DB_REFERENCE:
+                            disease_dict['ref_id'] = element.get('id')
+                            disease_dict['ref_type'] = element.get('type')
+
+                rows['disease_comments'].append((text.text if text is not None else None, disease_dict))
+
+            for subcellular_location in child.iterchildren(SUBCELLULAR_LOCATION):
+                for location in subcellular_location.iterchildren(LOCATION):
+                    subcellular_locations[location.text] = None
+
+        elif tag == KEYWORD:
+            keywords.append((child.get('id'), child.text))
+
+        elif tag == ACCESSION:
+            accessions.append((child.text,))
+
+        elif tag == NAME:
+            if 'name' not in entry_dict:
+                entry_dict['name'] = child.text
+
+        elif tag == PROTEIN:
+            for names in child:
+
+                if names.tag == RECOMMENDED_NAME:
+                    for element in names:
+                        if element.tag == FULL_NAME:
+                            entry_dict.setdefault('recommended_full_name', element.text)
+                        elif element.tag == SHORT_NAME:
+                            entry_dict.setdefault('recommended_short_name', element.text)
+                        elif element.tag == EC_NUMBER:
+                            rows['ec_numbers'].append((element.text,))
+
+                elif names.tag == ALTERNATIVE_NAME:
+                    for element in names:
+                        if element.tag == FULL_NAME:
+                            rows['alternative_full_names'].append((element.text,))
+                        elif element.tag == SHORT_NAME:
+                            rows['alternative_short_names'].append((element.text,))
+
+        elif tag == GENE:
+            for gene_name in child.iterchildren(NAME):
+                gene_name_type = gene_name.get('type')
+
+                if gene_name_type == 'primary':
+                    if 'gene_name' not in entry_dict:
+                        text = gene_name.text
+                        entry_dict['gene_name'] = text if text is not None and text.strip() else None
+                else:
+                    rows['other_gene_names'].append((gene_name_type, gene_name.text))
+
+        elif tag == ORGANISM:
+            if 'taxid' not in entry_dict:
+                entry_dict['taxid'] = int(get_taxid(child))
+
+                if taxids is not None and entry_dict['taxid'] not in taxids:
+                    return None
+
+        elif tag == ORGANISM_HOST:
+            taxid = get_taxid(child)
+            if taxid is not None:
+                rows['organism_hosts'].append((taxid,))
+
+        elif tag == SEQUENCE:
+            rows['sequence'] = child.text
+            rows['sequence_checksum'] = get_checksum(child.text, child.get('checksum'))
+
+    rows['entry'] = tuple(entry_dict.get(column) for column in ENTRY_COLUMNS)
+    rows['pmids'] = list(pmids.items())
+    rows['subcellular_locations'] = [(location,) for location in subcellular_locations]
+    rows['tissue_in_references'] = [(tissue,) for tissue in tissues]
+
+    return rows
+
+
+def benchmark_extraction(xml_file_path, taxids=None):
+    """Compares the time needed to extract all entries of an UniProt XML file with :func:`extract_entry_rows`
+    (single-pass) and :func:`pyuniprot.manager.database.DbManager.get_entry_rows` (one `get_*` per field).
+
+    Parsing of the XML file is not included in the measured times.
+
+    :param str xml_file_path: path to XML file (gzipped if ends with .gz)
+    :param Optional[iter[int]] taxids: NCBI taxonomy IDs
+    :return: number of entries and seconds per extractor
+    :rtype: dict
+    """
+    results = {'entries': 0, 'single_pass': 0.0, 'per_getter': 0.0}
+
+    with DbManager.open_xml(xml_file_path) as fd:
+        for _, entry in iterparse(fd, events=('end',), tag=ENTRY, huge_tree=True):
+            start = time.perf_counter()
+            extract_entry_rows(entry, taxids)
+            results['single_pass'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            DbManager.get_entry_rows(entry, taxids)
+            results['per_getter'] += time.perf_counter() - start
+
+            results['entries'] += 1
+            entry.clear()
+
+    return results
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""K-mer index of sequences for substring and motif search (``pyuniprot update --kmer-index``).
+
+For every k-mer (peptide of length `k`, default 4) the table :class:`pyuniprot.manager.models.SequenceKmer` stores the
+postings list: the sorted ids of all sequences containing the k-mer, delta encoded and compressed with zlib.
+
+:func:`pyuniprot.manager.query.QueryManager.sequence_search` splits a motif into its k-mers, intersects their postings
+lists (shortest first) and verifies only the remaining candidates with a regular expression. Motifs without a run of
+`k` exact residues can not use the index and scan all sequences.
+
+Motifs are written with residues (``A`` to ``Z``), ``x``, ``X`` or ``.`` for any residue and ``[ST]`` (one of) or
+``[^P]`` (none of) for a choice of residues, e.g. ``N[^P][ST]``.
+
+The index is built by :class:`KmerIndexBuilder` in one pass over the sequences: during a full import with the bulk
+writer while the sequence rows are written, otherwise by :func:`pyuniprot.manager.database.DbManager.build_kmer_index`
+from the sequence table. K-mers are encoded as integers (5 bits per residue) and grouped with numpy. If more than
+`max_pairs` pairs of k-mer and sequence id are collected, they are sorted and spilled to a temporary file (run). The
+postings lists are merged from all runs by ranges of k-mers, so not more than about `max_pairs` pairs are held in
+memory.
+"""
+import logging
+import os
+import re
+import tempfile
+import zlib
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+KMER_SIZE = 4
+MAX_KMER_SIZE = 6  # k-mer (5 bits per residue) and sequence id (32 bits) in a 64 bit integer
+MAX_PAIRS = 20000000  # pairs of k-mer and sequence id in memory (8 bytes each)
+
+RESIDUE_OFFSET = ord('A') - 1  # code of A is 1
+RESIDUE_BITS = 5
+ID_BITS = 32
+
+POSTINGS_ZLIB_LEVEL = 6
+POSTINGS_DTYPES = {b'2': np.dtype('<u2'), b'4': np.dtype('<u4')}
+MAX_UINT16 = np.iinfo(np.uint16).max
+
+MOTIF_TOKEN = re.compile(r'([A-WYZ])|([X.])|\[(\^?)([A-Z]+)\]')
+PATTERN_RUN = re.compile(r'[A-WYZ]+')  # residues between wildcards of LIKE patterns
+
+
+def check_kmer_size(kmer_size):
+    """Raises ValueError if `kmer_size` is not supported
+
+    :param int kmer_size: length of k-mers
+    """
+    if not 2 <= kmer_size <= MAX_KMER_SIZE:
+        raise ValueError('k-mer size must be between 2 and {}'.format(MAX_KMER_SIZE))
+
+
+def get_kmer_codes(sequences, kmer_size=KMER_SIZE):
+    """Returns codes of all k-mers in sequences (k-mers with other characters than ``A`` to ``Z`` are skipped)
+
+    :param list[str] sequences: amino acid sequences
+    :param int kmer_size: length of k-mers
+    :return: k-mer codes and index of the sequence of every k-mer
+    :rtype: tuple[numpy.ndarray,numpy.ndarray]
+    """
+    # sequences separated by an invalid residue, so no k-mer spans two sequences
+    text = '@'.join(sequences).upper().encode('ascii', 'replace')
+    residues = np.frombuffer(text, dtype=np.uint8).astype(np.int64) - RESIDUE_OFFSET
+    valid = (residues >= 1) & (residues <= 26)
+
+    windows = residues.size - kmer_size + 1
+
+    if windows <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    codes = np.zeros(windows, dtype=np.int64)
+    complete = np.ones(windows, dtype=bool)
+
+    for offset in range(kmer_size):
+        codes = (codes << RESIDUE_BITS) | residues[offset:offset + windows]
+        complete &= valid[offset:offset + windows]
+
+    lengths = np.fromiter((len(sequence) + 1 for sequence in sequences), dtype=np.int64, count=len(sequences))
+    indexes = np.repeat(np.arange(len(sequences)), lengths)[:windows]
+
+    return codes[complete], indexes[complete]
+
+
+def get_kmer(code, kmer_size=KMER_SIZE):
+    """Returns the k-mer of a code
+
+    :param int code: k-mer code
+    :param int kmer_size: length of k-mers
+    :rtype: str
+    """
+    mask = (1 << RESIDUE_BITS) - 1
+    return ''.join(chr(((code >> (RESIDUE_BITS * shift)) & mask) + RESIDUE_OFFSET)
+                   for shift in range(kmer_size - 1, -1, -1))
+
+
+def encode_postings(ids):
+    """Encodes a postings list (sorted unique sequence ids) as delta encoded and zlib compressed bytes
+
+    :param numpy.ndarray ids: sorted unique sequence ids
+    :rtype: bytes
+    """
+    deltas = np.diff(ids, prepend=0)
+    return encode_deltas(deltas, deltas.max(initial=0))
+
+
+def encode_deltas(deltas, max_delta):
+    """Encodes the differences between the ids of a postings list (16 bit if possible, otherwise 32 bit)
+
+    :param numpy.ndarray deltas: differences between ids (first id for the first)
+    :param int max_delta: maximum of deltas
+    :rtype: bytes
+    """
+    prefix = b'2' if max_delta <= MAX_UINT16 else b'4'
+    return prefix + zlib.compress(deltas.astype(POSTINGS_DTYPES[prefix]).tobytes(), POSTINGS_ZLIB_LEVEL)
+
+
+def decode_postings(data):
+    """Decodes a postings list encoded by :func:`encode_postings`
+
+    :param bytes data: encoded postings list
+    :return: sorted sequence ids
+    :rtype: numpy.ndarray
+    """
+    data = bytes(data)
+    deltas = np.frombuffer(zlib.decompress(data[1:]), dtype=POSTINGS_DTYPES[data[:1]])
+    return np.cumsum(deltas, dtype=np.int64)
+
+
+def get_kmer_keys(codes, ids):
+    """Returns unique pairs of k-mer code and sequence id as sorted 64 bit integers
+
+    :param numpy.ndarray codes: k-mer codes
+    :param numpy.ndarray ids: sequence ids
+    :rtype: numpy.ndarray
+    """
+    return sorted_unique((codes << ID_BITS) | ids)
+
+
+def sorted_unique(values):
+    """Returns sorted unique values (faster than :func:`numpy.unique` for large arrays of integers)
+
+    :param numpy.ndarray values: integers
+    :rtype: numpy.ndarray
+    """
+    values = np.sort(values)
+    return values[np.append(True, values[1:] != values[:-1])] if values.size else values
+
+
+def iter_postings(keys, kmer_size=KMER_SIZE):
+    """Groups pairs of k-mer code and sequence id (see :func:`get_kmer_keys`) to postings lists
+
+    :param numpy.ndarray keys: pairs of k-mer code and sequence id
+    :param int kmer_size: length of k-mers
+    :return: k-mer, number of sequences and encoded postings list ordered by k-mer
+    :rtype: iter[tuple[str,int,bytes]]
+    """
+    keys = sorted_unique(keys)
+    codes = keys >> ID_BITS
+    ids = keys & ((1 << ID_BITS) - 1)
+
+    starts = np.flatnonzero(np.diff(codes, prepend=-1))
+    ends = np.append(starts[1:], codes.size)
+
+    # deltas of all postings lists at once, first delta of a list is its first id
+    deltas = np.diff(ids, prepend=0)
+    deltas[starts] = ids[starts]
+    max_deltas = np.maximum.reduceat(deltas, starts) if starts.size else starts
+
+    for start, end, code, max_delta in zip(starts.tolist(), ends.tolist(), codes[starts].tolist(),
+                                           max_deltas.tolist()):
+        yield get_kmer(code, kmer_size), end - start, encode_deltas(deltas[start:end], max_delta)
+
+
+def intersect_postings(postings):
+    """Returns sequence ids in all postings lists (intersection starts with the shortest list)
+
+    :param list[numpy.ndarray] postings: postings lists
+    :rtype: numpy.ndarray
+    """
+    postings = sorted(postings, key=len)
+    ids = postings[0]
+
+    for other in postings[1:]:
+        if not ids.size:
+            break
+        ids = np.intersect1d(ids, other, assume_unique=True)
+
+    return ids
+
+
+class KmerIndexBuilder(object):
+    """Collects pairs of k-mer and sequence id in one pass over the sequences and groups them to postings lists
+
+    :param int kmer_size: length of k-mers
+    :param int max_pairs: pairs of k-mer and sequence id held in memory before they are spilled to a sorted run
+    :param int chunk_size: number of sequences encoded to k-mers at once
+    :param Optional[str] directory: directory of temporary files with sorted runs (default: system temp directory)
+    """
+
+    def __init__(self, kmer_size=KMER_SIZE, max_pairs=MAX_PAIRS, chunk_size=10000, directory=None):
+        check_kmer_size(kmer_size)
+        self.kmer_size = kmer_size
+        self.max_pairs = max_pairs
+        self.chunk_size = chunk_size
+        self.directory = directory
+
+        self.ids = []  # sequences not yet encoded to k-mers
+        self.sequences = []
+        self.keys = []  # sorted unique keys (see get_kmer_keys) per chunk
+        self.pairs = 0  # number of keys in memory
+        self.runs = []  # paths of spilled runs
+        self.run_dir = None  # tempfile.TemporaryDirectory of runs, removed by close() (or garbage collection)
+
+    def add(self, sequence_id, sequence):
+        """Adds a sequence (every sequence id only once)
+
+        :param int sequence_id: id of the sequence
+        :param Optional[str] sequence: amino acid sequence
+        """
+        if sequence is None:
+            return
+
+        self.ids.append(sequence_id)
+        self.sequences.append(sequence)
+
+        if len(self.ids) >= self.chunk_size:
+            self.encode()
+
+    def encode(self):
+        """Encodes the added sequences to keys of k-mer and sequence id, spills a run if `max_pairs` is reached"""
+        if not self.ids:
+            return
+
+        codes, indexes = get_kmer_codes(self.sequences, self.kmer_size)
+        keys = get_kmer_keys(codes, np.asarray(self.ids, dtype=np.int64)[indexes])
+        self.ids, self.sequences = [], []
+
+        self.keys.append(keys)
+        self.pairs += keys.size
+
+        if self.pairs >= self.max_pairs:
+            self.spill()
+
+    def spill(self):
+        """Writes all keys in memory as sorted run to a temporary file"""
+        if not self.pairs:
+            return
+
+        if self.run_dir is None:
+            self.run_dir = tempfile.TemporaryDirectory(prefix='pyuniprot_kmers_', dir=self.directory)
+
+        # keys of different chunks are unique, every sequence is added once
+        keys = np.sort(np.concatenate(self.keys))
+        self.keys, self.pairs = [], 0
+
+        path = os.path.join(self.run_dir.name, 'run{}.int64'.format(len(self.runs)))
+        keys.tofile(path)
+        self.runs.append(path)
+
+    def iter_postings(self):
+        """Yields the postings lists of all added sequences ordered by k-mer
+
+        :return: k-mer, number of sequences and encoded postings list (see :func:`iter_postings`)
+        :rtype: iter[tuple[str,int,bytes]]
+        """
+        self.encode()
+
+        if not self.runs:
+            keys = np.concatenate(self.keys) if self.keys else np.zeros(0, dtype=np.int64)
+            self.keys, self.pairs = [], 0
+            yield from iter_postings(keys, self.kmer_size)
+            return
+
+        self.spill()
+        log.info('merge {} sorted runs of k-mers'.format(len(self.runs)))
+
+        runs = [np.memmap(path, dtype=np.int64, mode='r') for path in self.runs]
+        starts = [0] * len(runs)
+        end_code = 1 << (RESIDUE_BITS * self.kmer_size)
+
+        def count(code):
+            return sum(int(np.searchsorted(run, code << ID_BITS)) - start for run, start in zip(runs, starts))
+
+        while any(start < run.size for run, start in zip(runs, starts)):
+            # range of k-mers from the lowest remaining k-mer with not more than max_pairs pairs (at least 1 k-mer)
+            lower = min(int(run[start]) >> ID_BITS for run, start in zip(runs, starts) if start < run.size) + 1
+            upper = end_code
+
+            while lower < upper:
+                middle = (lower + upper + 1) // 2
+
+                if count(middle) <= self.max_pairs:
+                    lower = middle
+                else:
+                    upper = middle - 1
+
+            ends = [int(np.searchsorted(run, lower << ID_BITS)) for run in runs]
+            keys = np.concatenate([np.asarray(run[start:end]) for run, start, end in zip(runs, starts, ends)])
+            starts = ends
+
+            yield from iter_postings(keys, self.kmer_size)
+
+        del runs
+
+    def close(self):
+        """Removes the temporary files of the runs"""
+        self.ids, self.sequences, self.keys, self.pairs = [], [], [], 0
+        self.runs = []
+
+        if self.run_dir is not None:
+            self.run_dir.cleanup()
+            self.run_dir = None
+
+
+def parse_motif(motif, kmer_size=KMER_SIZE):
+    """Parses a motif to a regular expression and the k-mers of its runs of exact residues
+
+    :param str motif: motif (see module documentation), case insensitive
+    :param int kmer_size: length of k-mers
+    :return: compiled regular expression and k-mers (empty if the motif has no run of `kmer_size` exact residues)
+    :rtype: tuple[re.Pattern,list[str]]
+    """
+    motif = motif.upper()
+    parts, runs, run = [], [], ''
+    position = 0
+
+    while position < len(motif):
+        match = MOTIF_TOKEN.match(motif, position)
+
+        if match is None:
+            raise ValueError('invalid motif {!r} at position {}'.format(motif, position + 1))
+
+        residue, _, negation, choices = match.groups()
+
+        if residue:
+            parts.append(residue)
+            run += residue
+        else:
+            parts.append('.' if choices is None else '[{}{}]'.format(negation, choices))
+            runs.append(run)
+            run = ''
+
+        position = match.end()
+
+    runs.append(run)
+
+    if not parts:
+        raise ValueError('empty motif')
+
+    kmers = sorted({run[start:start + kmer_size] for run in runs for start in range(len(run) - kmer_size + 1)})
+
+    return re.compile(''.join(parts)), kmers
+
+
+def get_pattern_kmers(pattern, kmer_size=KMER_SIZE):
+    """Returns the k-mers of the runs of residues in a SQL ``LIKE`` pattern (between the wildcards ``%`` and ``_``)
+
+    :param str pattern: ``LIKE`` pattern of a sequence, case insensitive
+    :param int kmer_size: length of k-mers
+    :return: k-mers (empty if the pattern has no run of `kmer_size` residues)
+    :rtype: list[str]
+    """
+    runs = PATTERN_RUN.findall(pattern.upper())
+    return sorted({run[start:start + kmer_size] for run in runs for start in range(len(run) - kmer_size + 1)})
+
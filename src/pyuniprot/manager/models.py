@@ -9,11 +9,15 @@ Oberview
 .. image:: _static/models/all.png
     :target: _images/all.png
 """
-from sqlalchemy import Column, ForeignKey, Integer, String, Text, Date, Table, DateTime
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, Text, Date, Table, DateTime, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base, declared_attr
+from sqlalchemy.ext.hybrid import Comparator, hybrid_property
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
+from .checksum import crc64
+from .compression import decode_sequence
+from .kmers import MAX_KMER_SIZE
 from .defaults import TABLE_PREFIX
 
 Base = declarative_base()
@@ -266,10 +270,34 @@ class OtherGeneName(Base, MasterModel):
         return "{}: {}".format(self.type_, self.name)
 
 
+class DecodedSequenceComparator(Comparator):
+    """Comparator of :attr:`Sequence.sequence` raising an error in SQL expressions, compressed sequences would be
+    missed"""
+
+    def __clause_element__(self):
+        raise NotImplementedError('Sequence.sequence can not be used in SQL, compressed sequences are decoded in '
+                                  'Python: filter by Sequence.checksum or Sequence.plain_sequence or use '
+                                  'QueryManager.sequence')
+
+    def operate(self, op, *other, **kwargs):
+        return self.__clause_element__()
+
+    def reverse_operate(self, op, other, **kwargs):
+        return self.__clause_element__()
+
+
 class Sequence(Base, MasterModel):
     """Amino acid sequence
 
+    Sequences are stored as text in ``sequence`` or compressed in ``compressed_sequence`` (see
+    :mod:`pyuniprot.manager.compression`), `sequence` always returns the decoded sequence. `sequence` can not be used
+    in SQL expressions (compressed sequences would be missed), filter by `checksum` or `plain_sequence` or use
+    :func:`pyuniprot.manager.query.QueryManager.sequence`.
+
     :cvar str sequence: Amino acid sequence
+    :cvar str plain_sequence: Amino acid sequence stored as text (None if compressed)
+    :cvar bytes compressed_sequence: compressed amino acid sequence (None if stored as text)
+    :cvar str checksum: CRC64 checksum of the sequence (indexed, see :mod:`pyuniprot.manager.checksum`)
     :cvar `Entry` entry: :class:`.Entry` object
 
     **Table view**
@@ -283,15 +311,34 @@ class Sequence(Base, MasterModel):
 
     - `UniProt sequence <hhttp://www.uniprot.org/help/sequences>`_
     """
-    sequence = Column(Text)
+    plain_sequence = Column('sequence', Text)
+    compressed_sequence = Column(LargeBinary)
+    checksum = Column(String(16), index=True)
 
     entry_id = foreign_key_to('entry')
     entry = relationship("Entry", back_populates="sequence")
 
+    @hybrid_property
+    def sequence(self):
+        if self.compressed_sequence is not None:
+            return decode_sequence(self.compressed_sequence)
+        return self.plain_sequence
+
+    @sequence.setter
+    def sequence(self, value):
+        self.plain_sequence = value
+        self.compressed_sequence = None
+        self.checksum = crc64(value)
+
+    @sequence.comparator
+    def sequence(cls):
+        return DecodedSequenceComparator(cls.plain_sequence)
+
     @property
     def data(self):
         data = {
             'sequence': self.sequence,
+            'checksum': self.checksum,
             'entry_name': self.entry.name
         }
         return data
@@ -303,11 +350,27 @@ class Sequence(Base, MasterModel):
         return self.sequence
 
 
+class SequenceKmer(Base, MasterModel):
+    """K-mer of sequences with its postings list (k-mer index, see :mod:`pyuniprot.manager.kmers`)
+
+    :cvar str kmer: k-mer (peptide of length k)
+    :cvar int sequences: number of sequences with the k-mer
+    :cvar bytes postings: encoded ids of all sequences with the k-mer
+    """
+    kmer = Column(String(MAX_KMER_SIZE), unique=True)
+    sequences = Column(Integer)
+    postings = Column(LargeBinary)
+
+    def __repr__(self):
+        return self.kmer
+
+
 class Version(Base, MasterModel):
     """Version information about UniProt knowledgebase
 
     :cvar str knowledgebase_type: Swiss-Prot or TrEMBL
     :cvar datetime release_date: date of release
+    :cvar int import_checkpoint: number of XML entries read and committed by the last import (resume)
     """
     @property
     def data(self):
@@ -320,6 +383,7 @@ class Version(Base, MasterModel):
     release_date = Column(Date)
     import_start_date = Column(DateTime)
     import_completed_date = Column(DateTime)
+    import_checkpoint = Column(Integer)
 
     def __repr__(self):
         return "{}:{}:{}".format(self.knowledgebase, self.release_name,  self.release_date.strftime('%Y-%m-%d'))
@@ -661,12 +725,18 @@ class DbReference(Base, MasterModel):
 class Feature(Base, MasterModel):
     """Sequence annotations describe regions or sites of interest in the protein sequence, such as post-translational
     modifications, binding sites, enzyme active sites, local secondary structure or other characteristics reported
-    in the cited references. In the moment we don't save the positions. If this is strongly neede contact the
-    PyUniProt team on github.
+    in the cited references.
+
+    Features of a single residue have `position`, `begin` and `end` are the same. Unknown positions are None.
+    Overlapping features of an entry are found with the index on `(entry_id, begin, end)` (see
+    :func:`pyuniprot.manager.query.QueryManager.feature`).
 
     :cvar str type\_: Type of feature
     :cvar str identifier: Feature identifier
     :cvar str description: Feature description
+    :cvar int begin: first residue
+    :cvar int end: last residue
+    :cvar int position: residue of a single residue feature (e.g. a modified residue)
     :cvar `Entry` entry: :class:`.Entry` object
 
     **Table view**
@@ -681,16 +751,24 @@ class Feature(Base, MasterModel):
     type_ = Column(String(255))
     identifier = Column(String(255))
     description = Column(Text)
+    begin = Column(Integer)
+    end = Column(Integer)
+    position = Column(Integer)
 
     entry_id = foreign_key_to('entry')
     entry = relationship("Entry", back_populates="features")
 
+    __table_args__ = (Index('ix_{}feature_location'.format(TABLE_PREFIX), 'entry_id', 'begin', 'end'),)
+
     @property
     def data(self):
         data = {
             'type': self.type_,
             'identifier': self.identifier,
             'description': self.description,
+            'begin': self.begin,
+            'end': self.end,
+            'position': self.position,
             'entry_name': self.entry.name
         }
         return data
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Parallel parsing of UniProt XML files.
+
+The XML file is split on ``<entry>`` boundaries into chunks of raw bytes. Chunks are parsed in a pool of worker
+processes with :func:`pyuniprot.manager.extractor.extract_entry_rows`. Workers only return plain row tuples
+(see :func:`pyuniprot.manager.database.DbManager.get_entry_rows`), so a single writer in the main process can insert
+them into the database.
+"""
+import io
+import logging
+import multiprocessing
+
+from collections import deque
+
+from .database import XN_URL, DbManager
+from .extractor import extract_entry_rows
+
+log = logging.getLogger(__name__)
+
+ENTRY_START = b'<entry'
+ENTRY_END = b'</entry>'
+
+CHUNK_HEADER = '<uniprot xmlns="{}">'.format(XN_URL).encode()
+CHUNK_FOOTER = b'</uniprot>'
+
+BLOCK_SIZE = 1 << 20  # bytes read from file at once
+ENTRIES_PER_CHUNK = 500
+
+
+def iter_entry_chunks(fd, entries_per_chunk=ENTRIES_PER_CHUNK, block_size=BLOCK_SIZE, skip=0):
+    """Splits an UniProt XML file object (opened in binary mode) on ``<entry>`` boundaries
+
+    :param fd: file object of UniProt XML
+    :param int entries_per_chunk: maximum number of entries in one chunk
+    :param int block_size: number of bytes read at once
+    :param int skip: number of entries at the beginning of the file dropped without parsing (resume import), they
+        are read and counted, the file object is not seeked
+    :return: generator of bytes, every chunk contains only complete ``<entry>`` elements
+    :rtype: iter[bytes]
+    """
+    buffer = b''
+    started = False
+    search_from = 0
+    chunk_start = 0
+    chunk_end = 0
+    counter = 0
+
+    for block in iter(lambda: fd.read(block_size), b''):
+        buffer += block
+
+        if not started:
+            start = buffer.find(ENTRY_START)
+            if start == -1:
+                buffer = buffer[-len(ENTRY_START):]
+                continue
+            buffer = buffer[start:]
+            started = True
+
+        while True:
+            end = buffer.find(ENTRY_END, search_from)
+
+            if end == -1:
+                search_from = max(len(buffer) - len(ENTRY_END), chunk_end)
+                break
+
+            search_from = chunk_end = end + len(ENTRY_END)
+
+            if skip:
+                skip -= 1
+                chunk_start = chunk_end
+                continue
+
+            counter += 1
+
+            if counter == entries_per_chunk:
+                yield buffer[chunk_start:chunk_end].lstrip()
+                buffer = buffer[chunk_end:]
+                search_from = chunk_start = chunk_end = counter = 0
+
+        if chunk_start:  # drop skipped entries
+            buffer = buffer[chunk_start:]
+            search_from -= chunk_start
+            chunk_end -= chunk_start
+            chunk_start = 0
+
+    if counter:
+        yield buffer[chunk_start:chunk_end].lstrip()
+
+
+def parse_chunk(chunk, taxids=None):
+    """Parses a chunk of ``<entry>`` elements to plain row tuples (runs in worker process)
+
+    Entries of other organisms than `taxids` are filtered by :func:`pyuniprot.manager.database.DbManager.iter_entries`
+    like in a serial import.
+
+    :param bytes chunk: complete ``<entry>`` elements
+    :param Optional[iter[int]] taxids: NCBI taxonomy IDs
+    :return: number of entries in chunk and list of (index of entry in chunk, rows) per parsed entry
+    :rtype: tuple[int,list[tuple[int,dict]]]
+    """
+    entries = chunk.count(ENTRY_END)
+    entries_rows = []
+
+    for number, entry in DbManager.iter_entries(io.BytesIO(CHUNK_HEADER + chunk + CHUNK_FOOTER), taxids):
+        rows = extract_entry_rows(entry, taxids)
+
+        if rows is not None:
+            entries_rows.append((number - 1, rows))
+
+    return entries, entries_rows
+
+
+def parse_xml_parallel(fd, workers, taxids=None, entries_per_chunk=ENTRIES_PER_CHUNK, skip=0):
+    """Parses an UniProt XML file with a pool of processes. Results are returned in the order of the file.
+
+    Not more than 2 * workers chunks are queued, so memory is bounded independent of the file size. With only one
+    worker chunks are parsed in this process.
+
+    :param fd: file object of UniProt XML (binary mode)
+    :param int workers: number of parser processes
+    :param Optional[iter[int]] taxids: NCBI taxonomy IDs
+    :param int entries_per_chunk: maximum number of entries send to a worker at once
+    :param int skip: number of entries at the beginning of the file not parsed
+    :return: generator of results of :func:`parse_chunk`
+    :rtype: iter[tuple[int,list[tuple[int,dict]]]]
+    """
+    taxids = set(taxids) if taxids is not None else None
+    max_pending = 2 * workers
+
+    if workers <= 1:
+        for chunk in iter_entry_chunks(fd, entries_per_chunk, skip=skip):
+            yield parse_chunk(chunk, taxids)
+        return
+
+    log.info('parse XML with %s processes', workers)
+
+    with multiprocessing.Pool(processes=workers) as pool:
+        pending = deque()
+
+        for chunk in iter_entry_chunks(fd, entries_per_chunk, skip=skip):
+            pending.append(pool.apply_async(parse_chunk, (chunk, taxids)))
+
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+
+        while pending:
+            yield pending.popleft().get()
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""Pipelined import (``pyuniprot update --pipeline``): parsing and writing to the database overlap.
+
+A parser thread reads the XML file (with parser processes if `workers` > 1) and groups the rows of the entries into
+batches. Batches are put into a bounded queue consumed by one or more writers (the calling thread and `writers` - 1
+additional threads, each with its own database connection). If the writers are slower than the parser, the parser
+waits for a free place in the queue (backpressure), so not more than `queue_size` batches are held in memory.
+
+Writers can write batches in parallel, but commit them in the order of the XML file. The checkpoint of the import
+saved with every commit (see :func:`pyuniprot.manager.database.DbManager.get_checkpoint`) stays valid, an interrupted
+import can be resumed.
+
+The size of the queue, the throughput of parser and writers and the time they are busy or wait for each other are
+logged every `log_interval` seconds and at the end (see :func:`ImportPipeline.get_stats`). A parser mostly blocked by
+the full queue means the database is the bottleneck, writers mostly waiting for batches mean the parser is.
+"""
+import logging
+import queue
+import threading
+import time
+
+from collections import OrderedDict, namedtuple
+
+log = logging.getLogger(__name__)
+
+QUEUE_SIZE = 4  # batches between parser and writers
+LOG_INTERVAL = 60  # seconds between log messages
+POLL_SECONDS = 0.1  # seconds between checks whether the pipeline was stopped
+
+Batch = namedtuple('Batch', ('data', 'entries', 'checkpoint'))
+Batch.__doc__ = """Batch of entries: data (e.g. rows), number of entries and XML entries read after the batch"""
+
+
+class ImportPipeline(object):
+    """Producer/consumer pipeline of batches between a parser thread and writers
+
+    `write` is called with every :class:`Batch` by the writers. It returns None if the batch was committed or a
+    function committing the batch, which is called in the order of the batches. If the pipeline fails before the
+    commit, the attribute `rollback` of the function (if any) is called instead.
+
+    :param batches: iterable of :class:`Batch` (iterated in parser thread)
+    :param write: function writing a batch
+    :param int writers: number of writers (calling thread and writers - 1 threads)
+    :param int queue_size: maximum number of batches in queue
+    :param int log_interval: seconds between log messages
+    """
+
+    def __init__(self, batches, write, writers=1, queue_size=QUEUE_SIZE, log_interval=LOG_INTERVAL):
+        self.batches = batches
+        self.write = write
+        self.writers = writers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.queue_size = queue_size
+        self.log_interval = log_interval
+
+        self.stopped = threading.Event()
+        self.errors = []
+        self.lock = threading.Lock()
+        self.committed = threading.Condition(self.lock)
+        self.next_commit = 0  # sequence number of next batch to commit
+
+        self.start = self.end = self.last_log = None
+        self.queue_depths = [0, 0, 0]  # samples, sum, max
+        self.stats = {stage: OrderedDict([('batches', 0), ('entries', 0), ('busy_seconds', 0.0),
+                                          ('wait_seconds', 0.0)])
+                      for stage in ('parser', 'writer')}
+        self.order_seconds = 0.0  # seconds writers waited for the commit of previous batches
+
+    def run(self):
+        """Runs the pipeline until all batches are written, raises the first error of parser or writers"""
+        self.start = self.last_log = time.perf_counter()
+
+        producer = threading.Thread(target=self.produce, name='pyuniprot-parser', daemon=True)
+        producer.start()
+
+        threads = [threading.Thread(target=self.consume, name='pyuniprot-writer-{}'.format(number), daemon=True)
+                   for number in range(1, self.writers)]
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            self.consume()
+        finally:
+            for thread in threads:
+                thread.join()
+
+            self.stopped.set()
+            producer.join()
+            self.end = time.perf_counter()
+
+        if self.errors:
+            raise self.errors[0]
+
+        log.info('import pipeline finished: {}'.format(self.get_status()))
+
+    def fail(self, error):
+        """Stops parser and writers after an error
+
+        :param BaseException error: error
+        """
+        with self.lock:
+            self.errors.append(error)
+            self.committed.notify_all()
+
+        self.stopped.set()
+
+    def produce(self):
+        """Puts batches into the queue (parser thread)"""
+        iterator = iter(self.batches)
+        stats = self.stats['parser']
+        sequence = 0
+
+        try:
+            while not self.stopped.is_set():
+                start = time.perf_counter()
+
+                try:
+                    batch = next(iterator)
+                except StopIteration:
+                    break
+
+                with self.lock:
+                    stats['batches'] += 1
+                    stats['entries'] += batch.entries
+                    stats['busy_seconds'] += time.perf_counter() - start
+
+                self.put((sequence, batch))
+                sequence += 1
+
+        except BaseException as e:
+            self.fail(e)
+
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+
+            for _ in range(self.writers):
+                self.put(None)
+
+    def put(self, item):
+        """Puts an item into the queue, waits while the queue is full (backpressure) unless the pipeline is stopped
+
+        :param item: (sequence number, :class:`Batch`) or None (end)
+        """
+        start = time.perf_counter()
+
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+
+        depth = self.queue.qsize()
+
+        with self.lock:
+            self.stats['parser']['wait_seconds'] += time.perf_counter() - start
+
+            if item is not None:
+                self.queue_depths[0] += 1
+                self.queue_depths[1] += depth
+                self.queue_depths[2] = max(self.queue_depths[2], depth)
+
+    def get(self):
+        """Returns next item of the queue, None at the end or if the pipeline is stopped"""
+        start = time.perf_counter()
+
+        try:
+            while not self.stopped.is_set():
+                try:
+                    return self.queue.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    continue
+        finally:
+            with self.lock:
+                self.stats['writer']['wait_seconds'] += time.perf_counter() - start
+
+    def consume(self):
+        """Writes batches from the queue and commits them in order (writer)"""
+        stats = self.stats['writer']
+        commit = None
+
+        try:
+            while True:
+                item = self.get()
+
+                if item is None:
+                    break
+
+                sequence, batch = item
+                start = time.perf_counter()
+                commit = self.write(batch)
+                busy = time.perf_counter() - start
+
+                with self.committed:
+                    wait_start = time.perf_counter()
+
+                    while self.next_commit != sequence and not self.errors:
+                        self.committed.wait(POLL_SECONDS)
+
+                    self.order_seconds += time.perf_counter() - wait_start
+
+                    if self.errors:
+                        break
+
+                if commit is not None:
+                    start = time.perf_counter()
+                    commit()
+                    busy += time.perf_counter() - start
+                    commit = None
+
+                with self.committed:
+                    self.next_commit = sequence + 1
+                    self.committed.notify_all()
+
+                    stats['batches'] += 1
+                    stats['entries'] += batch.entries
+                    stats['busy_seconds'] += busy
+
+                self.log_status()
+
+        except BaseException as e:
+            self.fail(e)
+
+        finally:
+            # batch written but not committed
+            rollback = getattr(commit, 'rollback', None)
+
+            if rollback is not None:
+                try:
+                    rollback()
+                except BaseException as e:
+                    log.warning('rollback of uncommitted batch failed: %s', e)
+
+    def log_status(self):
+        now = time.perf_counter()
+
+        with self.lock:
+            if now - self.last_log < self.log_interval:
+                return
+            self.last_log = now
+
+        log.info(self.get_status())
+
+    def get_stats(self):
+        """Returns statistics of the pipeline (JSON serializable): size of queue, entries, busy and waiting time and
+        throughput (entries per busy second) of parser and writers
+
+        :rtype: dict
+        """
+        wall = (self.end or time.perf_counter()) - self.start if self.start else 0.0
+        samples, total_depth, max_depth = self.queue_depths
+
+        stats = OrderedDict([
+            ('writers', self.writers),
+            ('queue_size', self.queue_size),
+            ('queue_depth_max', max_depth),
+            ('queue_depth_mean', round(total_depth / samples, 2) if samples else 0.0),
+            ('wall_seconds', round(wall, 3)),
+        ])
+
+        with self.lock:
+            for stage, stage_stats in self.stats.items():
+                stage_stats = OrderedDict(stage_stats)
+                busy = stage_stats['busy_seconds']
+
+                # writers work in parallel, busy and waiting time is the sum over all writers
+                stage_wall = wall * (self.writers if stage == 'writer' else 1)
+
+                stage_stats['busy_seconds'] = round(busy, 3)
+                stage_stats['wait_seconds'] = round(stage_stats['wait_seconds'], 3)
+                stage_stats['busy_percent'] = round(100 * busy / stage_wall, 1) if stage_wall else 0.0
+                stage_stats['wait_percent'] = round(100 * stage_stats['wait_seconds'] / stage_wall, 1) \
+                    if stage_wall else 0.0
+                stage_stats['entries_per_second'] = round(stage_stats['entries'] / busy, 1) if busy else 0.0
+                stats[stage] = stage_stats
+
+            stats['writer']['order_seconds'] = round(self.order_seconds, 3)
+
+        return stats
+
+    def get_status(self):
+        """Returns size of queue, busy and waiting time of parser and writers as string
+
+        :rtype: str
+        """
+        stats = self.get_stats()
+        parser, writer = stats['parser'], stats['writer']
+
+        return ('{} batches in queue (max {}, mean {}), '
+                'parser: busy {}% ({} entries/s), blocked by full queue {}%, '
+                'writers: busy {}% ({} entries/s), waiting for batches {}%').format(
+            self.queue.qsize(), stats['queue_depth_max'], stats['queue_depth_mean'],
+            parser['busy_percent'], parser['entries_per_second'], parser['wait_percent'],
+            writer['busy_percent'], writer['entries_per_second'], writer['wait_percent'],
+        )
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""Opt-in profiling of the import stages (``pyuniprot update --profile``).
+
+Stages are timed with :func:`time.perf_counter`. Stages can be nested (e.g. `flush` inside `commit`); like in
+:mod:`cProfile` every stage has a cumulative time (including nested stages) and a self time (without nested stages).
+The sum of all self times and `other` (not profiled) is the wall time of the import.
+
+Only functions wrapped while profiling is active are timed, so imports without profiling have no overhead.
+
+Stages are nested per thread. In a pipelined import (see :mod:`pyuniprot.manager.pipeline`) parser and writers run at
+the same time, so the sum of the self times can be larger than the wall time.
+"""
+import json
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+log = logging.getLogger(__name__)
+
+
+class StageProfiler(object):
+    """Cumulative time, self time and number of calls per import stage"""
+
+    def __init__(self):
+        self.stats = OrderedDict()  # stage -> [calls, cumulative seconds, self seconds]
+        self.local = threading.local()  # stack of [stage, start, seconds of nested stages] per thread
+        self.lock = threading.Lock()
+        self.patched = []
+        self.start = time.perf_counter()
+        self.end = None
+        self.entries = 0
+
+    @property
+    def stack(self):
+        stack = getattr(self.local, 'stack', None)
+
+        if stack is None:
+            stack = self.local.stack = []
+
+        return stack
+
+    def enter(self, stage):
+        self.stack.append([stage, time.perf_counter(), 0.0])
+
+    def exit(self):
+        stack = self.stack
+        stage, start, nested = stack.pop()
+        elapsed = time.perf_counter() - start
+
+        with self.lock:
+            stats = self.stats.get(stage)
+
+            if stats is None:
+                stats = self.stats[stage] = [0, 0.0, 0.0]
+
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] += elapsed - nested
+
+        if stack:
+            stack[-1][2] += elapsed
+
+    @contextmanager
+    def stage(self, stage):
+        """Context manager timing a stage
+
+        :param str stage: name of stage
+        """
+        self.enter(stage)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def wrap(self, stage, function):
+        """Returns `function` timed as `stage` for every call
+
+        :param str stage: name of stage
+        :param function: function or method
+        """
+        @wraps(function)
+        def timed(*args, **kwargs):
+            self.enter(stage)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.exit()
+
+        return timed
+
+    def iter_timed(self, stage, iterable):
+        """Times every step of an iterator (e.g. parsing of the next XML entry) as `stage`
+
+        :param str stage: name of stage
+        :param iterable: iterable
+        :rtype: iter
+        """
+        iterator = iter(iterable)
+
+        while True:
+            self.enter(stage)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.exit()
+
+            yield item
+
+    def patch(self, obj, attribute, stage):
+        """Replaces method `attribute` of `obj` (instance) by a timed version until :func:`restore`
+
+        :param obj: object
+        :param str attribute: name of method
+        :param str stage: name of stage
+        """
+        self.patched.append((obj, attribute))
+        setattr(obj, attribute, self.wrap(stage, getattr(obj, attribute)))
+
+    def restore(self):
+        """Removes all timed methods added by :func:`patch`"""
+        for obj, attribute in reversed(self.patched):
+            delattr(obj, attribute)
+
+        self.patched = []
+
+    def stop(self, entries=0):
+        """Stops profiling
+
+        :param int entries: number of imported XML entries
+        """
+        self.restore()
+        self.end = time.perf_counter()
+        self.entries = entries
+
+    def get_report(self):
+        """Returns profile as dictionary (JSON serializable)
+
+        :rtype: dict
+        """
+        wall = (self.end or time.perf_counter()) - self.start
+        profiled = min(sum(stats[2] for stats in self.stats.values()), wall)
+
+        stages = OrderedDict()
+
+        for stage, (calls, cumulative, self_time) in self.stats.items():
+            stages[stage] = OrderedDict([
+                ('calls', calls),
+                ('seconds', round(cumulative, 6)),
+                ('self_seconds', round(self_time, 6)),
+                ('percent', round(100 * self_time / wall, 2) if wall else 0.0),
+            ])
+
+        stages['other'] = OrderedDict([
+            ('calls', 1),
+            ('seconds', round(wall - profiled, 6)),
+            ('self_seconds', round(wall - profiled, 6)),
+            ('percent', round(100 * (wall - profiled) / wall, 2) if wall else 0.0),
+        ])
+
+        return OrderedDict([
+            ('wall_seconds', round(wall, 6)),
+            ('entries', self.entries),
+            ('entries_per_second', round(self.entries / wall, 2) if wall else 0.0),
+            ('stages', stages),
+        ])
+
+    def write_report(self, path):
+        """Writes profile as JSON file
+
+        :param str path: path to JSON file
+        """
+        with open(path, 'w') as fd:
+            json.dump(self.get_report(), fd, indent=2)
+
+        log.info('profile written to {}'.format(path))
+
+
+def format_report(report):
+    """Formats a profile (see :func:`StageProfiler.get_report`) as table sorted by self time
+
+    :param dict report: profile
+    :rtype: str
+    """
+    header = ('stage', 'calls', 'self [s]', 'cumul. [s]', 'self [%]', 'per call [us]')
+    rows = []
+
+    stages = sorted(report['stages'].items(), key=lambda item: item[1]['self_seconds'], reverse=True)
+
+    for stage, stats in stages:
+        rows.append((
+            stage,
+            str(stats['calls']),
+            '{:.3f}'.format(stats['self_seconds']),
+            '{:.3f}'.format(stats['seconds']),
+            '{:.1f}'.format(stats['percent']),
+            '{:.1f}'.format(1e6 * stats['seconds'] / stats['calls']),
+        ))
+
+    widths = [max(len(row[index]) for row in rows + [header]) for index in range(len(header))]
+    line = '  '.join('{:<%d}' % widths[0] if index == 0 else '{:>%d}' % width for index, width in enumerate(widths))
+
+    lines = [line.format(*header), '  '.join('-' * width for width in widths)]
+    lines.extend(line.format(*row) for row in rows)
+    lines.append('{} entries in {:.1f} s ({:.1f} entries/s)'.format(
+        report['entries'], report['wall_seconds'], report['entries_per_second']))
+
+    return '\n'.join(lines)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""Progress of long running imports (e.g. TrEMBL).
+
+The number of entries in an UniProt XML file is not known in advance, but the size of the (gzipped) file is. The
+progress is therefore measured in bytes read from the file. This allows an estimation of the remaining time (ETA)
+also for files which are decompressed or downloaded while importing.
+
+The peak resident set size (RSS) of the process is recorded every `memory_interval` entries to size the memory of
+import hosts and containers.
+"""
+import logging
+import os
+import sys
+import time
+
+from datetime import timedelta
+
+from tqdm import tqdm
+
+log = logging.getLogger(__name__)
+
+LOG_INTERVAL = 60  # seconds between log messages
+POSTFIX_INTERVAL = 1000  # entries between updates of the entry counter on the progress bar
+MEMORY_INTERVAL = 100000  # entries between reports of peak RSS
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError):
+    PAGE_SIZE = 4096
+
+
+def get_peak_rss(children=False):
+    """Returns peak resident set size (RSS) of this process in bytes, None if not available on the platform
+
+    :param bool children: if True peak RSS of the largest terminated child process (e.g. parser process)
+    :rtype: Optional[int]
+    """
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024  # bytes on macOS, kilobytes on Linux
+
+
+def get_rss():
+    """Returns current resident set size (RSS) of this process in bytes, peak RSS if the current RSS is not
+    available on the platform (only Linux) and None if neither is available
+
+    :rtype: Optional[int]
+    """
+    try:
+        with open('/proc/self/statm') as fd:
+            return int(fd.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return get_peak_rss()
+
+
+class ProgressReader(object):
+    """Binary file object counting the bytes read from the wrapped file object
+
+    :param fd: binary file object
+    :param progress: :class:`ImportProgress` updated with the number of bytes read
+    """
+
+    def __init__(self, fd, progress):
+        self.fd = fd
+        self.progress = progress
+
+    def read(self, size=-1):
+        data = self.fd.read(size)
+        self.progress.update_bytes(len(data))
+        return data
+
+    def close(self):
+        self.fd.close()
+
+
+class ImportProgress(object):
+    """Reports imported entries, entries per second, bytes read and ETA on a progress bar and every `log_interval`
+    seconds in the log
+
+    :param str desc: description of the progress bar (e.g. knowledgebase)
+    :param bool silent: no progress bar if True
+    :param int initial_entries: number of entries already imported (resumed import)
+    :param int log_interval: seconds between log messages
+    :param int memory_interval: entries between reports of peak RSS (see `memory_reports`)
+    """
+
+    def __init__(self, desc=None, silent=False, initial_entries=0, log_interval=LOG_INTERVAL,
+                 memory_interval=MEMORY_INTERVAL):
+        self.bar = tqdm(desc=desc, unit='B', unit_scale=True, mininterval=1, disable=silent)
+        self.entries = initial_entries
+        self.initial_entries = initial_entries
+        self.log_interval = log_interval
+        self.start = self.last_log = time.time()
+        self.bytes_read = 0
+        self.total_bytes = None
+        self.readers = []
+        self.memory_interval = memory_interval
+        self.memory_reports = []  # (entries, peak RSS in bytes)
+
+    def wrap(self, fd, total=None):
+        """Returns file object counting bytes read from `fd`
+
+        :param fd: binary file object
+        :param Optional[int] total: size of file in bytes (needed for ETA)
+        :rtype: ProgressReader
+        """
+        if total:
+            self.total_bytes = total
+            self.bar.reset(total=total)
+
+        reader = ProgressReader(fd, self)
+        self.readers.append(reader)
+        return reader
+
+    def update_bytes(self, number_of_bytes):
+        self.bytes_read += number_of_bytes
+        self.bar.update(number_of_bytes)
+
+    def update(self, entries=1):
+        """Adds read entries
+
+        :param int entries: number of entries
+        """
+        before = self.entries
+        self.entries += entries
+
+        if self.entries // self.memory_interval != before // self.memory_interval:
+            self.report_memory()
+
+        if self.entries // POSTFIX_INTERVAL != before // POSTFIX_INTERVAL:
+            self.bar.set_postfix_str('{} entries'.format(self.entries), refresh=False)
+
+            now = time.time()
+            if now - self.last_log >= self.log_interval:
+                self.last_log = now
+                log.info(self.get_status())
+
+    def report_memory(self):
+        """Logs peak RSS and adds it to `memory_reports`"""
+        peak_rss = get_peak_rss()
+
+        if peak_rss is not None:
+            self.memory_reports.append((self.entries, peak_rss))
+            log.info('{} entries, peak RSS {:.1f} MiB'.format(self.entries, peak_rss / 2 ** 20))
+
+    @property
+    def entries_per_second(self):
+        return (self.entries - self.initial_entries) / max(time.time() - self.start, 1e-9)
+
+    @property
+    def eta(self):
+        """Estimated remaining time, None if size of file is unknown
+
+        :rtype: Optional[datetime.timedelta]
+        """
+        if not self.total_bytes or not self.bytes_read:
+            return None
+
+        elapsed = time.time() - self.start
+        return timedelta(seconds=int(elapsed * (self.total_bytes - self.bytes_read) / self.bytes_read))
+
+    def get_status(self):
+        """Returns status as string: entries, entries per second, percent of file read and ETA
+
+        :rtype: str
+        """
+        status = '{} entries, {:.0f} entries/s'.format(self.entries, self.entries_per_second)
+
+        if self.total_bytes:
+            status += ', {:.1%} of XML read, ETA {}'.format(self.bytes_read / self.total_bytes, self.eta)
+
+        peak_rss = get_peak_rss()
+
+        if peak_rss is not None:
+            status += ', peak RSS {:.1f} MiB'.format(peak_rss / 2 ** 20)
+
+        return status
+
+    def close(self):
+        """Logs final status, closes the progress bar and all wrapped files"""
+        log.info(self.get_status())
+        self.bar.close()
+
+        for reader in self.readers:
+            reader.close()
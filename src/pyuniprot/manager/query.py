@@ -1,11 +1,24 @@
 # -*- coding: utf-8 -*-
 
+import logging
+import re
+
+from .checksum import crc64
+from .compression import decode_sequence
 from .database import BaseDbManager
+from .defaults import TABLE_PREFIX
+from .kmers import KMER_SIZE, decode_postings, get_pattern_kmers, intersect_postings, parse_motif
 from . import models
-from sqlalchemy import distinct
-from pandas import read_sql
+from sqlalchemy import Column, Integer, MetaData, Table, distinct, func, or_, select
+from pandas import concat, read_sql
 from collections import Iterable
 
+log = logging.getLogger(__name__)
+
+# ids of matching compressed sequences, created per connection (too many ids to bind as parameters)
+SEQUENCE_IDS = Table(TABLE_PREFIX + 'sequence_ids', MetaData(), Column('id', Integer, primary_key=True),
+                     prefixes=['TEMPORARY'])
+
 
 class QueryManager(BaseDbManager):
     """Query interface to database."""
@@ -29,7 +42,8 @@ class QueryManager(BaseDbManager):
                 query = query.offset(page * page_size)
 
         if as_df:
-            results = read_sql(query.statement, self.engine)
+            # connection of the session, which has the temporary tables of the query
+            results = read_sql(query.statement, self.session.connection())
 
         else:
             results = query.all()
@@ -296,10 +310,12 @@ class QueryManager(BaseDbManager):
             (alternative_name, models.AlternativeFullName.name),
             (disease_comment, models.DiseaseComment.comment),
             (tissue_specificity, models.TissueSpecificity.comment),
-            (sequence, models.Sequence.sequence),
         )
         q = self.get_one_to_many_queries(q, one_to_many_queries_config)
 
+        if sequence is not None:
+            q = self._sequence_query(q.join(models.Sequence), sequence)
+
         many_to_many_queries_config = (
             (pmid, models.Entry.pmids, models.Pmid.pmid),
             (keyword, models.Entry.keywords, models.Keyword.name),
@@ -694,11 +710,16 @@ class QueryManager(BaseDbManager):
 
         return self._limit_and_df(q, limit, as_df)
 
-    def feature(self, type_=None, identifier=None, description=None, entry_name=None, limit=None, as_df=False):
+    def feature(self, type_=None, identifier=None, description=None, entry_name=None, accession=None, overlaps=None,
+                limit=None, as_df=False):
         """Method to query :class:`.models.Feature` objects in database
 
         Check available features types with ``pyuniprot.query().feature_types``
 
+        Features overlapping residues of an entry (``feature(accession='P28223', overlaps=120)``) are found with the
+        index on `(entry_id, begin, end)` of :class:`.models.Feature`, only the features of the entry beginning before
+        the end of the range are read. Without `entry_name` or `accession` all features are read.
+
         :param type_: type(s) of feature
         :type type_: str or tuple(str) or None
 
@@ -711,6 +732,12 @@ class QueryManager(BaseDbManager):
         :param entry_name: name(s) in :class:`.models.Entry`
         :type entry_name: str or tuple(str) or None
 
+        :param accession: UniProt accession(s) of entry
+        :type accession: str or tuple(str) or None
+
+        :param overlaps: residue or range of residues (start, end), features with at least one residue in the range
+        :type overlaps: int or tuple(int, int) or None
+
         :param limit:
             - if `isinstance(limit,int)==True` -> limit
             - if `isinstance(limit,tuple)==True` -> format:= tuple(page_number, results_per_page)
@@ -720,7 +747,7 @@ class QueryManager(BaseDbManager):
         :param bool as_df: if `True` results are returned as :class:`pandas.DataFrame`
 
         :return:
-            - if `as_df == False` -> list(:class:`.models.Feature`)
+            - if `as_df == False` -> list(:class:`.models.Feature`) (ordered by begin if `overlaps`)
             - if `as_df == True`  -> :class:`pandas.DataFrame`
         :rtype: list(:class:`.models.Feature`) or :class:`pandas.DataFrame`
         """
@@ -733,7 +760,27 @@ class QueryManager(BaseDbManager):
         )
         q = self.get_model_queries(q, model_queries_config)
 
-        q = self.get_one_to_many_queries(q, ((entry_name, models.Entry.name),))
+        entry_queries_config = [(accession, models.Accession.entry_id, models.Accession.accession)]
+
+        if overlaps is None:
+            q = self.get_one_to_many_queries(q, ((entry_name, models.Entry.name),))
+        else:
+            entry_queries_config.append((entry_name, models.Entry.id, models.Entry.name))
+
+        for search4, entry_id, model_attrib in entry_queries_config:
+            if search4 is not None:
+                # entries first, then their features from the index on (entry_id, begin, end)
+                entry_ids = self._model_query(self.session.query(entry_id), search4, model_attrib)
+                q = q.filter(models.Feature.entry_id.in_(entry_ids.scalar_subquery()))
+
+        if overlaps is not None:
+            start, end = (overlaps, overlaps) if isinstance(overlaps, int) else overlaps
+
+            if start > end:
+                raise ValueError('start {} of range after end {}'.format(start, end))
+
+            q = q.filter(models.Feature.begin <= end, models.Feature.end >= start)\
+                .order_by(models.Feature.entry_id, models.Feature.begin, models.Feature.end)
 
         return self._limit_and_df(q, limit, as_df)
 
@@ -800,12 +847,15 @@ class QueryManager(BaseDbManager):
 
         return self._limit_and_df(q, limit, as_df)
 
-    def sequence(self, sequence=None, entry_name=None, limit=None, as_df=False):
+    def sequence(self, sequence=None, checksum=None, entry_name=None, limit=None, as_df=False):
         """Method to query :class:`.models.Sequence` objects in database
 
         :param sequence: AA sequence(s)
         :type sequence: str or tuple(str) or None
 
+        :param checksum: CRC64 checksum(s) of sequence like in UniProt (16 hex digits)
+        :type checksum: str or tuple(str) or None
+
         :param entry_name: name(s) in :class:`.models.Entry`
         :type entry_name: str or tuple(str) or None
 
@@ -824,11 +874,215 @@ class QueryManager(BaseDbManager):
         """
         q = self.session.query(models.Sequence)
 
-        q = self.get_model_queries(q, ((sequence, models.Sequence.sequence),))
+        if sequence is not None:
+            q = self._sequence_query(q, sequence)
 
-        q = self.get_many_to_many_queries(q, ((entry_name, models.SubcellularLocation.entries, models.Entry.name),))
+        q = self.get_model_queries(q, ((checksum, models.Sequence.checksum),))
 
-        return self._limit_and_df(q, limit, as_df)
+        q = self.get_one_to_many_queries(q, ((entry_name, models.Entry.name),))
+
+        return self._sequence_results(q, limit, as_df)
+
+    def duplicate_sequences(self, limit=None, as_df=False):
+        """Method to query :class:`.models.Sequence` objects with the same sequence as at least one other entry
+        (ordered by checksum, identical sequences have the same checksum)
+
+        :param limit:
+            - if `isinstance(limit,int)==True` -> limit
+            - if `isinstance(limit,tuple)==True` -> format:= tuple(page_number, results_per_page)
+            - if limit == None -> all results
+        :type limit: int or tuple(int) or None
+
+        :param bool as_df: if `True` results are returned as :class:`pandas.DataFrame`
+
+        :return:
+            - if `as_df == False` -> list(:class:`.models.Sequence`)
+            - if `as_df == True`  -> :class:`pandas.DataFrame`
+        :rtype: list(:class:`.models.Sequence`) or :class:`pandas.DataFrame`
+        """
+        duplicates = self.session.query(models.Sequence.checksum)\
+            .group_by(models.Sequence.checksum)\
+            .having(func.count(models.Sequence.id) > 1)
+
+        q = self.session.query(models.Sequence)\
+            .filter(models.Sequence.checksum.in_(duplicates.scalar_subquery()))\
+            .order_by(models.Sequence.checksum, models.Sequence.id)
+
+        return self._sequence_results(q, limit, as_df)
+
+    def sequence_search(self, motif, limit=None, as_df=False, chunk_size=1000):
+        """Method to search :class:`.models.Sequence` objects containing a peptide or motif
+
+        With a k-mer index (``pyuniprot update --kmer-index``) only sequences with all k-mers of the motif are
+        verified (see :mod:`pyuniprot.manager.kmers`), otherwise all sequences are scanned.
+
+        :param str motif: peptide or motif: residues, ``x`` for any residue, ``[ST]`` for one of and ``[^P]`` for
+            none of the residues, e.g. ``N[^P][ST]``
+
+        :param limit:
+            - if `isinstance(limit,int)==True` -> limit
+            - if `isinstance(limit,tuple)==True` -> format:= tuple(page_number, results_per_page)
+            - if limit == None -> all results
+        :type limit: int or tuple(int) or None
+
+        :param bool as_df: if `True` results are returned as :class:`pandas.DataFrame`
+
+        :param int chunk_size: number of sequences verified per query
+
+        :return:
+            - if `as_df == False` -> list(:class:`.models.Sequence`) ordered by id
+            - if `as_df == True`  -> :class:`pandas.DataFrame`
+        :rtype: list(:class:`.models.Sequence`) or :class:`pandas.DataFrame`
+        """
+        kmer_size = self.get_kmer_size()
+        regex, kmers = parse_motif(motif, kmer_size or KMER_SIZE)
+
+        if kmer_size and kmers:
+            chunks = self._iter_candidate_chunks(self._get_kmer_candidates(kmers), chunk_size)
+        else:
+            log.info('sequence search of {} scans all sequences (k-mer index: {})'.format(
+                motif, 'no run of {} residues'.format(kmer_size) if kmer_size else 'not built'))
+            chunks = (rows for _, rows in self._iter_sequence_chunks(chunk_size))
+
+        if isinstance(limit, int):
+            first, last = 0, limit or None
+        elif limit:
+            page, page_size = limit
+            first, last = page * page_size, (page + 1) * page_size
+        else:
+            first, last = 0, None
+
+        ids = []
+
+        for rows in chunks:
+            ids.extend(row[0] for row, sequence in zip(rows, self.get_sequences(rows)) if regex.search(sequence))
+
+            if last is not None and len(ids) >= last:
+                break
+
+        ids = ids[first:last]
+        results = [self._sequence_results(
+            self.session.query(models.Sequence).filter(models.Sequence.id.in_(ids[offset:offset + chunk_size]))
+            .order_by(models.Sequence.id), None, as_df) for offset in range(0, max(len(ids), 1), chunk_size)]
+
+        if as_df:
+            return concat(results, ignore_index=True)
+
+        return [sequence for chunk in results for sequence in chunk]
+
+    def _get_kmer_candidates(self, kmers):
+        """Returns ids of sequences with all k-mers (intersection of their postings lists)
+
+        :param list[str] kmers: k-mers
+        :rtype: list[int]
+        """
+        postings = self.session.query(models.SequenceKmer.postings).filter(models.SequenceKmer.kmer.in_(kmers)).all()
+
+        if len(postings) < len(kmers):
+            return []
+
+        return intersect_postings([decode_postings(data) for data, in postings]).tolist()
+
+    def _iter_candidate_chunks(self, ids, chunk_size):
+        """Yields rows (id, sequence, compressed_sequence) of sequences in chunks
+
+        :param list[int] ids: ids of sequences ordered by id
+        :param int chunk_size: number of rows per chunk
+        :rtype: iter[list[tuple]]
+        """
+        columns = (models.Sequence.id, models.Sequence.plain_sequence, models.Sequence.compressed_sequence)
+
+        for offset in range(0, len(ids), chunk_size):
+            yield self.session.query(*columns).filter(models.Sequence.id.in_(ids[offset:offset + chunk_size]))\
+                .order_by(models.Sequence.id).all()
+
+    def _sequence_results(self, query_obj, limit, as_df):
+        """returns results of a query of :class:`.models.Sequence`, compressed sequences are decoded in data frames
+
+        :param query_obj: SQL Alchemy query object
+        :param limit: limit (see :func:`_limit_and_df`)
+        :param bool as_df: if `True` results are returned as :class:`pandas.DataFrame`
+        """
+        results = self._limit_and_df(query_obj, limit, as_df)
+
+        if as_df:
+            # compressed sequences decoded in column sequence
+            compressed = results.pop('compressed_sequence')
+            results['sequence'] = [decode_sequence(data) if data is not None else plain
+                                   for plain, data in zip(results['sequence'], compressed)]
+
+        return results
+
+    def _sequence_query(self, query_obj, search4, chunk_size=1000):
+        """extends and returns a SQLAlchemy query object to search sequences stored as text or compressed (see
+        :mod:`pyuniprot.manager.compression`)
+
+        Exact sequences are looked up by their indexed checksum (see :mod:`pyuniprot.manager.checksum`) first, only
+        compressed sequences with the same checksum are decoded and compared. Compressed bytes are never compared,
+        they depend on the zlib build which stored them.
+
+        To search patterns with ``%`` or ``_`` compressed sequences are decoded. With a k-mer index only sequences
+        with all k-mers of the residues between the wildcards are decoded, otherwise all compressed sequences are
+        scanned (slow on large databases).
+
+        :param query_obj: SQL Alchemy query object
+        :param search4: sequence, pattern (str) or iterable of sequences
+        :param int chunk_size: number of compressed sequences decoded per query
+        """
+        if isinstance(search4, str) and ('%' in search4 or '_' in search4):
+            regex = re.compile(re.escape(search4).replace('%', '.*').replace('_', '.'), re.I | re.S)
+            kmer_size = self.get_kmer_size()
+            kmers = get_pattern_kmers(search4, kmer_size) if kmer_size else []
+
+            if kmers:
+                chunks = self._iter_candidate_chunks(self._get_kmer_candidates(kmers), chunk_size)
+            else:
+                log.info('sequence pattern {} scans all compressed sequences (k-mer index: {})'.format(
+                    search4, 'no run of {} residues'.format(kmer_size) if kmer_size else 'not built'))
+                chunks = (rows for _, rows in self._iter_sequence_chunks(
+                    chunk_size, models.Sequence.__table__.c.compressed_sequence.isnot(None)))
+
+            ids = [row[0] for rows in chunks for row in rows
+                   if row[2] is not None and regex.fullmatch(decode_sequence(row[2]))]
+
+            return query_obj.filter(or_(models.Sequence.plain_sequence.like(search4),
+                                        self._sequence_id_filter(ids, chunk_size)))
+
+        sequences = [search4] if isinstance(search4, str) else list(search4)
+        upper_sequences = {seq.upper() for seq in sequences}
+        checksums = {crc64(seq) for seq in upper_sequences}
+
+        compressed = self.session.query(models.Sequence.id, models.Sequence.compressed_sequence)\
+            .filter(models.Sequence.checksum.in_(checksums), models.Sequence.compressed_sequence.isnot(None))
+        ids = [id_ for id_, data in compressed if decode_sequence(data).upper() in upper_sequences]
+
+        if isinstance(search4, str):
+            plain_filter = models.Sequence.plain_sequence.like(search4)
+        else:
+            plain_filter = models.Sequence.plain_sequence.in_(sequences)
+
+        return query_obj.filter(models.Sequence.checksum.in_(checksums),
+                                or_(plain_filter, models.Sequence.id.in_(ids)))
+
+    def _sequence_id_filter(self, ids, chunk_size=1000):
+        """returns a filter of sequences by id, more than `chunk_size` ids are inserted into the temporary table
+        :data:`SEQUENCE_IDS` of the session connection instead of binding them as parameters (SQLite allows only
+        32766)
+
+        :param list[int] ids: ids of sequences
+        :param int chunk_size: maximum number of ids bound as parameters and ids inserted per query
+        """
+        if len(ids) <= chunk_size:
+            return models.Sequence.id.in_(ids)
+
+        connection = self.session.connection()
+        SEQUENCE_IDS.create(connection, checkfirst=True)
+        connection.execute(SEQUENCE_IDS.delete())
+
+        for offset in range(0, len(ids), chunk_size):
+            connection.execute(SEQUENCE_IDS.insert(), [{'id': id_} for id_ in ids[offset:offset + chunk_size]])
+
+        return models.Sequence.id.in_(select(SEQUENCE_IDS.c.id))
 
     def subcellular_location(self, location=None, entry_name=None, limit=None, as_df=False):
         """Method to query :class:`.models.SubcellularLocation` objects in database
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""Zero-downtime updates (``pyuniprot update --staging``): a new release is imported into staging tables while the
+live tables are queried as before. After validation of the row counts the staging tables replace the live tables in
+one atomic step:
+
+- SQLite: the staging database is the file ``<database>.staging`` next to the database file, it replaces the
+  database file with an atomic rename. Connections opened before (e.g. a running web server) keep reading the old
+  release until they reconnect.
+- PostgreSQL: staging tables are created in the schema ``pyuniprot_staging`` of the same database (search path of the
+  staging connections). In one transaction the live tables are moved into the schema ``pyuniprot_previous`` and the
+  staging tables into the live schema, the previous tables are dropped afterwards.
+- MySQL/MariaDB: staging tables are created in the database ``<database>_staging`` on the same server and swapped
+  with the live tables by one ``RENAME TABLE`` statement.
+
+Users of the web application (:class:`pyuniprot.manager.models.AppUser`) are kept.
+"""
+import logging
+import os
+
+from collections import OrderedDict
+
+import sqlalchemy
+from sqlalchemy.engine import make_url
+
+from . import models
+from .defaults import TABLE_PREFIX
+
+log = logging.getLogger(__name__)
+
+STAGING_SCHEMA = TABLE_PREFIX + 'staging'  # PostgreSQL
+PREVIOUS_SCHEMA = TABLE_PREFIX + 'previous'  # PostgreSQL
+STAGING_FILE_SUFFIX = '.staging'  # SQLite
+STAGING_DATABASE_SUFFIX = '_staging'  # MySQL
+PREVIOUS_TABLE_SUFFIX = '__previous'  # MySQL
+
+MIN_ENTRY_RATIO = 0.9  # entries in staging tables compared with the live tables
+
+DIALECTS = ('sqlite', 'postgresql', 'mysql')
+
+# tables not replaced by an update
+KEPT_TABLES = (models.AppUser.__table__.name,)
+
+
+def get_swapped_tables():
+    """Returns names of all tables replaced by the staging tables (referenced tables first)
+
+    :rtype: list[str]
+    """
+    return [table.name for table in models.Base.metadata.sorted_tables if table.name not in KEPT_TABLES]
+
+
+def get_staging_connection(url):
+    """Returns connection string and DBAPI connect arguments of the staging database
+
+    :param url: SQLAlchemy URL or connection string of the live database
+    :return: connection string and `connect_args` for :func:`sqlalchemy.create_engine`
+    :rtype: tuple[str,dict]
+    """
+    url = make_url(url)
+    dialect = url.get_backend_name()
+
+    if dialect not in DIALECTS:
+        raise ValueError('staging import is not supported for {}, use one of {}'.format(dialect, ', '.join(DIALECTS)))
+
+    if dialect == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            raise ValueError('staging import needs a SQLite database file')
+
+        url = url.set(database=url.database + STAGING_FILE_SUFFIX)
+
+    elif dialect == 'mysql':
+        url = url.set(database=url.database + STAGING_DATABASE_SUFFIX)
+
+    connect_args = {'options': '-csearch_path={}'.format(STAGING_SCHEMA)} if dialect == 'postgresql' else {}
+
+    return url.render_as_string(hide_password=False), connect_args
+
+
+def prepare_staging(engine):
+    """Creates the schema (PostgreSQL) or database (MySQL) of the staging tables if not exists
+
+    :param engine: SQLAlchemy engine of the live database
+    """
+    quote = engine.dialect.identifier_preparer.quote
+
+    with engine.begin() as connection:
+        if engine.dialect.name == 'postgresql':
+            connection.exec_driver_sql('CREATE SCHEMA IF NOT EXISTS {}'.format(quote(STAGING_SCHEMA)))
+
+        elif engine.dialect.name == 'mysql':
+            connection.exec_driver_sql('CREATE DATABASE IF NOT EXISTS {}'.format(
+                quote(engine.url.database + STAGING_DATABASE_SUFFIX)))
+
+
+def count_rows(engine, table_names):
+    """Returns the number of rows of every existing table
+
+    :param engine: SQLAlchemy engine
+    :param list[str] table_names: names of tables
+    :return: table name -> number of rows
+    :rtype: collections.OrderedDict
+    """
+    existing = set(sqlalchemy.inspect(engine).get_table_names())
+    counts = OrderedDict()
+
+    with engine.connect() as connection:
+        for name in table_names:
+            if name in existing:
+                query = sqlalchemy.select(sqlalchemy.func.count()).select_from(models.Base.metadata.tables[name])
+                counts[name] = connection.execute(query).scalar()
+
+    return counts
+
+
+def validate_staging(live_counts, staging_counts, min_entry_ratio=MIN_ENTRY_RATIO):
+    """Raises ValueError if the staging tables are incomplete or have much less entries than the live tables
+
+    :param dict live_counts: rows per table in the live database (see :func:`count_rows`)
+    :param dict staging_counts: rows per table in the staging database
+    :param float min_entry_ratio: minimum ratio of entries in staging and live tables
+    """
+    missing = [name for name in get_swapped_tables() if name not in staging_counts]
+
+    if missing:
+        raise ValueError('staging tables missing: {}'.format(', '.join(missing)))
+
+    entry_table = models.Entry.__tablename__
+    live_entries, staging_entries = live_counts.get(entry_table, 0), staging_counts[entry_table]
+
+    if not staging_entries:
+        raise ValueError('no entries in staging tables')
+
+    if staging_entries < live_entries * min_entry_ratio:
+        raise ValueError('{} entries in staging tables, {} in live tables (minimum ratio {}), set '
+                         'DbManager.staging_min_entry_ratio to swap anyway'.format(staging_entries, live_entries,
+                                                                                   min_entry_ratio))
+
+
+def get_swap_statements(dialect, staged_tables, live_tables, live_schema, staging_schema, quote):
+    """Returns SQL statements swapping staging and live tables in one transaction (PostgreSQL) or one ``RENAME TABLE``
+    statement (MySQL). Previous tables left by a failed cleanup of an earlier swap are dropped first.
+
+    :param str dialect: postgresql or mysql
+    :param list[str] staged_tables: names of staging tables replacing live tables
+    :param list[str] live_tables: names of existing live tables to replace
+    :param str live_schema: schema (PostgreSQL) or database (MySQL) of live tables
+    :param str staging_schema: schema or database of staging tables
+    :param quote: function quoting identifiers
+    :rtype: list[str]
+    """
+    def name(schema, table):
+        return '{}.{}'.format(quote(schema), quote(table))
+
+    if dialect == 'postgresql':
+        # indexes are named per schema, so live tables leave the live schema before staging tables enter it
+        statements = ['DROP SCHEMA IF EXISTS {} CASCADE'.format(quote(PREVIOUS_SCHEMA)),
+                      'CREATE SCHEMA {}'.format(quote(PREVIOUS_SCHEMA))]
+        statements += ['ALTER TABLE {} SET SCHEMA {}'.format(name(live_schema, table), quote(PREVIOUS_SCHEMA))
+                       for table in live_tables]
+        statements += ['ALTER TABLE {} SET SCHEMA {}'.format(name(staging_schema, table), quote(live_schema))
+                       for table in staged_tables]
+        return statements
+
+    if dialect == 'mysql':
+        statements = get_previous_cleanup(dialect, live_tables, staging_schema, quote)
+        renames = ['{} TO {}'.format(name(live_schema, table), name(staging_schema, table + PREVIOUS_TABLE_SUFFIX))
+                   for table in live_tables]
+        renames += ['{} TO {}'.format(name(staging_schema, table), name(live_schema, table))
+                    for table in staged_tables]
+        return statements + ['RENAME TABLE ' + ', '.join(renames)]
+
+    raise ValueError('tables of {} are not swapped with SQL statements'.format(dialect))
+
+
+def get_previous_cleanup(dialect, live_tables, staging_schema, quote):
+    """Returns SQL statements dropping the previous tables moved out of the live schema by a swap
+
+    :param str dialect: postgresql or mysql
+    :param list[str] live_tables: names of live tables replaced by a swap
+    :param str staging_schema: database of staging tables (MySQL)
+    :param quote: function quoting identifiers
+    :rtype: list[str]
+    """
+    if dialect == 'postgresql':
+        return ['DROP SCHEMA IF EXISTS {} CASCADE'.format(quote(PREVIOUS_SCHEMA))]
+
+    return ['DROP TABLE IF EXISTS {}'.format(', '.join(
+        '{}.{}'.format(quote(staging_schema), quote(table + PREVIOUS_TABLE_SUFFIX)) for table in live_tables
+    ))] if live_tables else []
+
+
+def swap_staging(engine, staging_engine):
+    """Replaces the live tables by the staging tables (see module documentation)
+
+    :param engine: SQLAlchemy engine of the live database
+    :param staging_engine: SQLAlchemy engine of the staging database
+    """
+    dialect = engine.dialect.name
+
+    if dialect == 'sqlite':
+        swap_sqlite_file(engine, staging_engine)
+        return
+
+    staged_tables = get_swapped_tables()
+    existing = set(sqlalchemy.inspect(engine).get_table_names())
+    live_tables = [table for table in staged_tables if table in existing]
+    quote = engine.dialect.identifier_preparer.quote
+
+    if dialect == 'postgresql':
+        live_schema = sqlalchemy.inspect(engine).default_schema_name
+        staging_schema = STAGING_SCHEMA
+        leftover = PREVIOUS_SCHEMA in sqlalchemy.inspect(engine).get_schema_names()
+    else:
+        live_schema = engine.url.database
+        staging_schema = staging_engine.url.database
+        existing_staging = set(sqlalchemy.inspect(staging_engine).get_table_names())
+        leftover = any(table + PREVIOUS_TABLE_SUFFIX in existing_staging for table in live_tables)
+
+    if leftover:
+        log.warning('previous tables of an earlier swap were not dropped, they are dropped now')
+
+    statements = get_swap_statements(dialect, staged_tables, live_tables, live_schema, staging_schema, quote)
+    cleanup = get_previous_cleanup(dialect, live_tables, staging_schema, quote)
+
+    staging_engine.dispose()
+
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+
+    log.info('{} staging tables swapped with live tables'.format(len(staged_tables)))
+
+    with engine.begin() as connection:
+        for statement in cleanup:
+            connection.exec_driver_sql(statement)
+
+
+def swap_sqlite_file(engine, staging_engine):
+    """Replaces the SQLite database file by the staging file (rows of kept tables are copied first)
+
+    :param engine: SQLAlchemy engine of the live database
+    :param staging_engine: SQLAlchemy engine of the staging database
+    """
+    path, staging_path = engine.url.database, staging_engine.url.database
+
+    # a write-ahead log of the old file would be applied to the new file
+    if os.path.exists(path + '-wal'):
+        raise ValueError('{} is in WAL mode, staging files can not replace it'.format(path))
+
+    existing = set(sqlalchemy.inspect(engine).get_table_names())
+
+    for name in KEPT_TABLES:
+        if name in existing:
+            table = models.Base.metadata.tables[name]
+
+            with engine.connect() as connection:
+                rows = [row._asdict() for row in connection.execute(sqlalchemy.select(table))]
+
+            with staging_engine.begin() as connection:
+                connection.execute(table.delete())
+
+                if rows:
+                    connection.execute(table.insert(), rows)
+
+    staging_engine.dispose()
+    engine.dispose()
+
+    os.replace(staging_path, path)
+    log.info('{} replaced by {}'.format(path, staging_path))
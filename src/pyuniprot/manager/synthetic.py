@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""Synthetic UniProt XML for scale tests and benchmarks.
+
+Every entry has a unique name, accession and sequence. Like in UniProt, shared data (PubMed references, keywords,
+diseases, subcellular locations, tissues and organisms) is drawn from pools of limited size, so tables with unique
+values and the caches of the importer grow much slower than the number of entries.
+
+Size and shape of the entries are set with a `shape` dictionary, missing keys are taken from :data:`DEFAULT_SHAPE`.
+Ranges are (minimum, maximum) of a uniformly distributed number per entry.
+
+- `features`: range of features per entry
+- `citations`: range of citations per entry, PubMed identifiers are drawn from a pool of size `pmids`
+- `keywords`: range of keywords per entry (pool size `keyword_pool`)
+- `diseases`: fraction of entries with a disease comment (pool size `disease_pool`)
+- `taxids`: list of (NCBI taxonomy ID, fraction of entries), the remaining entries get one of `organisms` other
+  synthetic taxonomy IDs
+- `sequence_length`: range of sequence length
+
+Elements are written in the order of the UniProt XML schema.
+
+Entries are generated while reading, so files with millions of entries can be imported without disk space::
+
+    from pyuniprot.manager.database import DbManager
+    from pyuniprot.manager.synthetic import SyntheticXmlFile
+
+    db = DbManager('sqlite:////tmp/synthetic.db')
+    db.import_xml(SyntheticXmlFile(10000000, dataset='TrEMBL'), bulk=True, knowledgebase='TrEMBL')
+"""
+import gzip
+import random
+
+from .checksum import crc64
+from .database import XN_URL
+
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<uniprot xmlns="{}">\n'.format(XN_URL)
+FOOTER = '</uniprot>\n'
+
+DEFAULT_SHAPE = {
+    'features': (1, 1),
+    'citations': (1, 1),
+    'keywords': (1, 1),
+    'diseases': 1.0,
+    'taxids': [],
+    'sequence_length': (50, 600),
+    'pmids': 1000000,
+    'keyword_pool': 1200,
+    'disease_pool': 5000,
+    'location_pool': 500,
+    'tissue_pool': 1500,
+    'organisms': 10000,
+}
+
+# approximate shape of Swiss-Prot: more features, citations and keywords per entry than TrEMBL, few diseases
+SWISSPROT_SHAPE = dict(DEFAULT_SHAPE, **{
+    'features': (1, 20),
+    'citations': (1, 8),
+    'keywords': (2, 14),
+    'diseases': 0.05,
+    'taxids': [(9606, 0.036), (10090, 0.03), (10116, 0.015), (3702, 0.027), (559292, 0.01)],
+    'pmids': 200000,
+})
+
+FEATURE_TYPES = ('domain', 'binding site', 'modified residue', 'helix', 'strand', 'sequence variant')
+SITE_FEATURE_TYPES = {'binding site', 'modified residue', 'sequence variant'}
+
+ENTRY_HEADER = '''<entry version="{version}" modified="2017-06-07" created="2001-01-01" dataset="{dataset}">
+  <accession>{accession}</accession>
+  <name>{name}</name>
+  <protein>
+    <recommendedName>
+      <fullName>Synthetic protein {number}</fullName>
+      <ecNumber>3.5.1.{ec}</ecNumber>
+    </recommendedName>
+  </protein>
+  <gene>
+    <name type="primary">SYN{number}</name>
+  </gene>
+  <organism>
+    <name type="scientific">Synthetic organism {taxid}</name>
+    <dbReference id="{taxid}" type="NCBI Taxonomy"/>
+  </organism>
+'''
+
+REFERENCE_TEMPLATE = '''  <reference key="{key}">
+    <citation last="10" first="1" volume="{volume}" name="J. Synth." date="2001" type="journal article">
+      <title>Synthetic reference {pmid}</title>
+      <dbReference id="{pmid}" type="PubMed"/>
+    </citation>
+    <scope>NUCLEOTIDE SEQUENCE</scope>
+    <source>
+      <tissue>Tissue {tissue}</tissue>
+    </source>
+  </reference>
+'''
+
+FUNCTION_TEMPLATE = '''  <comment type="function">
+    <text>Function of synthetic protein {number}.</text>
+  </comment>
+  <comment type="subcellular location">
+    <subcellularLocation>
+      <location>Location {location}</location>
+    </subcellularLocation>
+  </comment>
+'''
+
+DISEASE_TEMPLATE = '''  <comment type="disease">
+    <disease id="DI-{disease:05d}">
+      <name>Synthetic disease {disease}</name>
+      <acronym>SD{disease}</acronym>
+      <description>Description of synthetic disease {disease}.</description>
+      <dbReference id="{mim}" type="MIM"/>
+    </disease>
+    <text>Synthetic protein {number} is associated with disease {disease}.</text>
+  </comment>
+'''
+
+DB_REFERENCE_TEMPLATE = '''  <dbReference id="SYN{number}" type="EMBL"/>
+  <dbReference id="{pdb}" type="PDB"/>
+  <proteinExistence type="evidence at protein level"/>
+'''
+
+KEYWORD_TEMPLATE = '  <keyword id="KW-{keyword:04d}">Keyword {keyword}</keyword>\n'
+
+CHAIN_TEMPLATE = '''  <feature description="Synthetic protein {number}" id="PRO_{number:010d}" type="chain">
+    <location>
+      <begin position="1"/>
+      <end position="{length}"/>
+    </location>
+  </feature>
+'''
+
+RANGE_FEATURE_TEMPLATE = '''  <feature description="Synthetic {type} {index}" type="{type}">
+    <location>
+      <begin position="{begin}"/>
+      <end position="{end}"/>
+    </location>
+  </feature>
+'''
+
+SITE_FEATURE_TEMPLATE = '''  <feature description="Synthetic {type} {index}" type="{type}">
+    <location>
+      <position position="{position}"/>
+    </location>
+  </feature>
+'''
+
+VERSION_FILE = '''UniProt Knowledgebase Release 2000_01 consists of:
+UniProtKB/Swiss-Prot Release 2000_01 of 01-Jan-2000
+UniProtKB/TrEMBL Release 2000_01 of 01-Jan-2000
+'''
+
+SEQUENCE_TEMPLATE = ('  <sequence version="1" modified="2001-01-01" checksum="{checksum}" mass="{mass}" length="{length}">'
+                     '{sequence}</sequence>\n</entry>\n')
+
+
+def get_shape(shape=None):
+    """Returns complete shape (missing keys from :data:`DEFAULT_SHAPE`)
+
+    :param Optional[dict] shape: shape of entries
+    :rtype: dict
+    """
+    unknown = set(shape or ()) - set(DEFAULT_SHAPE)
+
+    if unknown:
+        raise ValueError('unknown keys in shape: {}'.format(', '.join(sorted(unknown))))
+
+    return dict(DEFAULT_SHAPE, **(shape or {}))
+
+
+def get_taxid(rng, shape):
+    """Returns NCBI taxonomy ID of an entry drawn from the taxid mix of `shape`
+
+    :param random.Random rng: random number generator
+    :param dict shape: complete shape
+    :rtype: int
+    """
+    value = rng.random()
+
+    for taxid, fraction in shape['taxids']:
+        if value < fraction:
+            return taxid
+        value -= fraction
+
+    return 1000000000 + rng.randint(1, shape['organisms'])  # not used by NCBI
+
+
+def get_features(number, length, rng, shape):
+    """Returns ``<feature>`` elements of one entry as string, the first is the chain
+
+    :param int number: number of entry
+    :param int length: length of sequence
+    :param random.Random rng: random number generator
+    :param dict shape: complete shape
+    :rtype: str
+    """
+    features = [CHAIN_TEMPLATE.format(number=number, length=length)]
+
+    for index in range(1, rng.randint(*shape['features'])):
+        feature_type = rng.choice(FEATURE_TYPES)
+
+        if feature_type in SITE_FEATURE_TYPES:
+            features.append(SITE_FEATURE_TEMPLATE.format(type=feature_type, index=index,
+                                                         position=rng.randint(1, length)))
+        else:
+            begin = rng.randint(1, length)
+            features.append(RANGE_FEATURE_TEMPLATE.format(type=feature_type, index=index, begin=begin,
+                                                          end=min(length, begin + rng.randint(5, 100))))
+
+    return ''.join(features)
+
+
+def get_entry(number, rng, dataset='Swiss-Prot', shape=None):
+    """Returns one synthetic ``<entry>`` as string
+
+    :param int number: number of entry (unique)
+    :param random.Random rng: random number generator
+    :param str dataset: Swiss-Prot or TrEMBL
+    :param Optional[dict] shape: complete shape of entry (see :func:`get_shape`), default shape if None
+    :rtype: str
+    """
+    shape = shape or DEFAULT_SHAPE
+
+    length = rng.randint(*shape['sequence_length'])
+
+    parts = [ENTRY_HEADER.format(
+        number=number,
+        dataset=dataset,
+        version=rng.randint(1, 200),
+        accession='S{:09d}'.format(number),
+        name='SYN{}_SYNTH'.format(number),
+        ec=rng.randint(1, 100),
+        taxid=get_taxid(rng, shape),
+    )]
+
+    # an entry cites every publication only once
+    pmids = rng.sample(range(1, shape['pmids'] + 1), min(rng.randint(*shape['citations']), shape['pmids']))
+
+    for key, pmid in enumerate(pmids, 1):
+        parts.append(REFERENCE_TEMPLATE.format(
+            key=key,
+            volume=rng.randint(1, 500),
+            pmid=pmid,
+            tissue=rng.randint(1, shape['tissue_pool']),
+        ))
+
+    parts.append(FUNCTION_TEMPLATE.format(number=number, location=rng.randint(1, shape['location_pool'])))
+
+    if rng.random() < shape['diseases']:
+        parts.append(DISEASE_TEMPLATE.format(number=number, disease=rng.randint(1, shape['disease_pool']),
+                                             mim=rng.randint(100000, 999999)))
+
+    parts.append(DB_REFERENCE_TEMPLATE.format(number=number,
+                                              pdb='{}S{:02d}'.format(rng.randint(1, 9), rng.randint(0, 99))))
+
+    keywords = rng.sample(range(1, shape['keyword_pool'] + 1), rng.randint(*shape['keywords']))
+    parts.extend(KEYWORD_TEMPLATE.format(keyword=keyword) for keyword in sorted(keywords))
+
+    parts.append(get_features(number, length, rng, shape))
+    sequence = ''.join(rng.choices(AMINO_ACIDS, k=length))
+    parts.append(SEQUENCE_TEMPLATE.format(length=length, mass=length * 110, checksum=crc64(sequence),
+                                          sequence=sequence))
+
+    return ''.join(parts)
+
+
+def iter_synthetic_xml(entries, dataset='Swiss-Prot', seed=0, shape=None):
+    """Generates UniProt XML with synthetic entries
+
+    :param int entries: number of entries
+    :param str dataset: Swiss-Prot or TrEMBL
+    :param int seed: seed of random number generator (same seed generates same XML)
+    :param Optional[dict] shape: shape of entries (see module documentation)
+    :return: generator of XML strings (header, entries, footer)
+    :rtype: iter[str]
+    """
+    rng = random.Random(seed)
+    shape = get_shape(shape)
+
+    yield HEADER
+
+    for number in range(1, entries + 1):
+        yield get_entry(number, rng, dataset, shape)
+
+    yield FOOTER
+
+
+class SyntheticXmlFile(object):
+    """Binary file object of UniProt XML with synthetic entries generated while reading
+
+    :param int entries: number of entries
+    :param str dataset: Swiss-Prot or TrEMBL
+    :param int seed: seed of random number generator
+    :param Optional[dict] shape: shape of entries (see module documentation)
+    """
+
+    def __init__(self, entries, dataset='Swiss-Prot', seed=0, shape=None):
+        self.parts = iter_synthetic_xml(entries, dataset, seed, shape)
+        self.buffer = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            part = next(self.parts, None)
+            if part is None:
+                break
+            self.buffer += part.encode()
+
+        if size < 0:
+            size = len(self.buffer)
+
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def close(self):
+        self.parts.close()
+
+
+def write_synthetic_xml(path, entries, dataset='Swiss-Prot', seed=0, shape=None):
+    """Writes UniProt XML with synthetic entries to file (gzipped if path ends with .gz)
+
+    :param str path: path to file
+    :param int entries: number of entries
+    :param str dataset: Swiss-Prot or TrEMBL
+    :param int seed: seed of random number generator
+    :param Optional[dict] shape: shape of entries (see module documentation)
+    """
+    with (gzip.open(path, 'wt', encoding='utf-8') if path.endswith('.gz') else open(path, 'w')) as fd:
+        for part in iter_synthetic_xml(entries, dataset, seed, shape):
+            fd.write(part)
+
+
+def write_synthetic_version_file(path):
+    """Writes release information (reldate.txt) for synthetic XML files
+
+    :param str path: path to file
+    """
+    with open(path, 'w') as fd:
+        fd.write(VERSION_FILE)
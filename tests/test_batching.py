@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from pyuniprot.manager import batching, models
+from pyuniprot.manager.batching import BatchSizer
+from pyuniprot.manager.database import DbManager
+from pyuniprot.manager.progress import get_rss
+from pyuniprot.manager.synthetic import write_synthetic_version_file, write_synthetic_xml
+
+MIB = 2 ** 20
+
+
+class TestBatchSizer(unittest.TestCase):
+
+    def update(self, sizer, seconds, rss=100 * MIB):
+        with mock.patch.object(batching, 'get_rss', return_value=rss):
+            return sizer.update(sizer.size, seconds)
+
+    def get_sizer(self, size=100, **kwargs):
+        with mock.patch.object(batching, 'get_rss', return_value=100 * MIB):
+            return BatchSizer(size, **kwargs)
+
+    def test_fixed(self):
+        sizer = self.get_sizer(adaptive=False)
+
+        self.assertEqual(100, self.update(sizer, 0.01))
+        self.assertEqual(100, self.update(sizer, 100, rss=10000 * MIB))
+        self.assertEqual(2, len(sizer.history))
+        self.assertRaises(ValueError, BatchSizer, 0)
+
+    def test_grow_while_faster(self):
+        sizer = self.get_sizer(adaptive=True)
+
+        self.assertEqual(200, self.update(sizer, 1.0))  # 100 entries/s
+        self.assertEqual(400, self.update(sizer, 1.0))  # 200 entries/s
+        self.assertEqual(800, self.update(sizer, 1.5))  # 267 entries/s
+
+        # slower than with 400: back to 400 and stay there
+        self.assertEqual(400, self.update(sizer, 6.0))
+        self.assertEqual(400, self.update(sizer, 0.1))
+        self.assertEqual(400, sizer.maximum)
+
+    def test_flush_time(self):
+        sizer = self.get_sizer(1000, adaptive=True, max_seconds=2.0)
+
+        self.assertEqual(250, self.update(sizer, 8.0))
+        self.assertEqual(250, self.update(sizer, 0.1))
+
+    def test_memory_budget(self):
+        sizer = self.get_sizer(adaptive=True, max_rss=200 * MIB)
+
+        self.assertEqual(200, self.update(sizer, 1.0, rss=120 * MIB))
+        # projected RSS 100 + 2 * 60 MiB above budget
+        self.assertEqual(200, self.update(sizer, 0.5, rss=160 * MIB))
+        self.assertEqual(100, self.update(sizer, 0.5, rss=210 * MIB))
+        self.assertEqual(100, self.update(sizer, 0.1, rss=110 * MIB))
+
+    def test_minimum(self):
+        sizer = self.get_sizer(20, adaptive=True, max_rss=MIB)
+
+        for _ in range(5):
+            self.update(sizer, 1.0, rss=2 * MIB)
+
+        self.assertEqual(batching.MIN_BATCH_SIZE, sizer.size)
+
+    def test_last_batch_ignored(self):
+        sizer = self.get_sizer(adaptive=True)
+
+        with mock.patch.object(batching, 'get_rss', return_value=100 * MIB):
+            self.assertEqual(100, sizer.update(5, 100.0))
+
+    def test_get_rss(self):
+        self.assertGreater(get_rss(), MIB)
+
+
+class TestAdaptiveImport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.xml_file_path = os.path.join(self.tmp_dir, 'batching.xml.gz')
+        self.version_file_path = os.path.join(self.tmp_dir, 'reldate.txt')
+        write_synthetic_xml(self.xml_file_path, 400)
+        write_synthetic_version_file(self.version_file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_import(self):
+        for bulk in (False, True):
+            db = DbManager('sqlite:///' + os.path.join(self.tmp_dir, 'batching_{}.db'.format(bulk)))
+            db._create_tables()
+            db.import_version(self.version_file_path)
+
+            try:
+                db.import_xml(self.xml_file_path, silent=True, bulk=bulk, batch_size=10, adaptive_batch=True)
+
+                self.assertEqual(400, db.session.query(models.Entry).count())
+                self.assertTrue(db.batch_sizer.adaptive)
+                sizes = [size for size, _, _, _ in db.batch_sizer.history]
+                self.assertEqual(10, sizes[0])
+                self.assertGreater(len(set(sizes)), 1)
+                self.assertEqual(400, sum(entries for _, entries, _, _ in db.batch_sizer.history))
+            finally:
+                db.session.close()
+
+    def test_fixed_batch_size(self):
+        db = DbManager('sqlite:///' + os.path.join(self.tmp_dir, 'fixed.db'))
+        db._create_tables()
+        db.import_version(self.version_file_path)
+
+        try:
+            db.import_xml(self.xml_file_path, silent=True, bulk=True, batch_size=150)
+            self.assertEqual([150, 150, 100], [entries for _, entries, _, _ in db.batch_sizer.history])
+        finally:
+            db.session.close()
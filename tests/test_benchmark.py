@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import io
+import unittest
+
+from collections import Counter
+
+from pyuniprot.manager.benchmark import format_benchmark, run_benchmark
+from pyuniprot.manager.database import DbManager
+from pyuniprot.manager.extractor import extract_entry_rows
+from pyuniprot.manager.synthetic import SWISSPROT_SHAPE, SyntheticXmlFile, get_shape, iter_synthetic_xml
+
+
+def get_rows(entries, **kwargs):
+    xml = ''.join(iter_synthetic_xml(entries, **kwargs)).encode()
+    return [extract_entry_rows(entry) for _, entry in DbManager.iter_entries(io.BytesIO(xml))]
+
+
+class TestSynthetic(unittest.TestCase):
+
+    def test_default_shape(self):
+        rows = get_rows(50)
+
+        self.assertEqual(50, len(rows))
+        self.assertEqual(50, len({x['entry'][4] for x in rows}))
+        self.assertTrue(all(len(x['features']) == 1 and len(x['pmids']) == 1 for x in rows))
+        self.assertTrue(all(len(x['disease_comments']) == 1 for x in rows))
+
+    def test_shape(self):
+        shape = {
+            'features': (3, 6),
+            'citations': (2, 4),
+            'pmids': 20,
+            'diseases': 0.0,
+            'taxids': [(9606, 0.5), (10090, 0.5)],
+        }
+        rows = get_rows(200, shape=shape)
+
+        self.assertTrue(all(3 <= len(x['features']) <= 6 for x in rows))
+        self.assertTrue(all(2 <= len(x['pmids']) <= 4 for x in rows))
+        self.assertLessEqual(len({pmid for x in rows for pmid, _ in x['pmids']}), 20)
+        self.assertFalse(any(x['disease_comments'] for x in rows))
+
+        taxids = Counter(x['entry'][7] for x in rows)
+        self.assertEqual({9606, 10090}, set(taxids))
+        self.assertGreater(min(taxids.values()), 50)
+
+        self.assertRaises(ValueError, get_shape, {'unknown': 1})
+
+    def test_same_seed_same_xml(self):
+        self.assertEqual(SyntheticXmlFile(20, seed=1, shape=SWISSPROT_SHAPE).read(),
+                         b''.join(x.encode() for x in iter_synthetic_xml(20, seed=1, shape=SWISSPROT_SHAPE)))
+        self.assertNotEqual(SyntheticXmlFile(20, seed=1).read(), SyntheticXmlFile(20, seed=2).read())
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_run_benchmark(self):
+        results = run_benchmark(100, shape={'features': (2, 2)}, bulk=True)
+
+        self.assertEqual(100, results['entries'])
+        self.assertGreater(results['entries_per_second'], 0)
+        self.assertEqual(100, results['tables']['entry']['rows'])
+        self.assertEqual(200, results['tables']['feature']['rows'])
+        self.assertGreater(results['tables']['feature']['rows_per_second'], 0)
+        self.assertGreaterEqual(results['peak_rss'], results['baseline_rss'])
+        self.assertIn('entries/s', format_benchmark(results))
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+import sqlalchemy
+
+from sqlalchemy import text
+
+from pyuniprot.manager import models
+from pyuniprot.manager.checksum import crc64, get_checksum
+from pyuniprot.manager.compression import ZLIB
+from pyuniprot.manager.database import DbManager
+from pyuniprot.manager.query import QueryManager
+from pyuniprot.manager.synthetic import write_synthetic_version_file, write_synthetic_xml
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'uniprot_sprot.xml.gz')
+
+
+class TestChecksum(unittest.TestCase):
+
+    def test_crc64(self):
+        with gzip.open(TEST_DATA, 'rt') as xml_file:
+            sequences = re.findall(r'<sequence [^>]*checksum="(\w+)"[^>]*>([^<]+)<', xml_file.read())
+
+        self.assertEqual(4, len(sequences))
+
+        for checksum, sequence in sequences:
+            self.assertEqual(checksum, crc64(sequence.replace('\n', '')))
+
+        self.assertEqual('0000000000000000', crc64(''))
+        self.assertIsNone(crc64(None))
+
+    def test_get_checksum(self):
+        self.assertEqual('8231AD580BEE2A8F', get_checksum('MKV', '8231ad580bee2a8f'))
+        self.assertEqual(crc64('MKV'), get_checksum('MKV', '0'))
+        self.assertEqual(crc64('MKV'), get_checksum('MKV'))
+
+    def test_model(self):
+        self.assertEqual(crc64('MKV'), models.Sequence(sequence='MKV').checksum)
+
+
+class TestChecksumQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.xml_file_path = os.path.join(self.tmp_dir, 'checksum.xml.gz')
+        self.version_file_path = os.path.join(self.tmp_dir, 'reldate.txt')
+        write_synthetic_xml(self.xml_file_path, 30)
+        write_synthetic_version_file(self.version_file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def import_xml(self, name, **kwargs):
+        connection = 'sqlite:///' + os.path.join(self.tmp_dir, name + '.db')
+        db = DbManager(connection)
+        db._create_tables()
+        db.import_version(self.version_file_path)
+        db.import_xml(self.xml_file_path, silent=True, **kwargs)
+        return db, connection
+
+    def get_checksums(self, db):
+        db.session.expire_all()
+        return {entry.name: entry.sequence.checksum for entry in db.session.query(models.Entry)}
+
+    def test_import(self):
+        for bulk in (False, True):
+            db, connection = self.import_xml('import_{}'.format(bulk), bulk=bulk)
+            query = QueryManager(connection=connection)
+
+            try:
+                for entry in db.session.query(models.Entry):
+                    self.assertEqual(crc64(entry.sequence.sequence), entry.sequence.checksum)
+
+                sequence = db.session.query(models.Sequence).first()
+                self.assertEqual([sequence.id], [s.id for s in query.sequence(checksum=sequence.checksum)])
+                self.assertEqual([sequence.id], [s.id for s in query.sequence(sequence=sequence.sequence.lower())])
+
+                plan = ' '.join(str(row) for row in query.session.execute(text(
+                    'EXPLAIN QUERY PLAN SELECT id FROM pyuniprot_sequence WHERE checksum IN (:checksum)'),
+                    {'checksum': sequence.checksum}))
+                self.assertIn('ix_pyuniprot_sequence_checksum', plan)
+            finally:
+                query.session.close()
+                db.session.close()
+
+    def test_duplicate_sequences(self):
+        db, connection = self.import_xml('duplicates', sequence_compression=ZLIB)
+        query = QueryManager(connection=connection)
+
+        try:
+            self.assertEqual([], query.duplicate_sequences())
+
+            first, second = db.session.query(models.Entry).order_by(models.Entry.id).limit(2)
+            second.sequence.sequence = first.sequence.sequence
+            db.session.commit()
+
+            duplicates = query.duplicate_sequences()
+            self.assertEqual([first.name, second.name], [s.entry.name for s in duplicates])
+            self.assertEqual({first.sequence.sequence}, {s.sequence for s in duplicates})
+
+            df = query.duplicate_sequences(as_df=True)
+            self.assertEqual([first.sequence.sequence] * 2, list(df['sequence']))
+
+            self.assertEqual(2, len(query.sequence(sequence=first.sequence.sequence)))
+        finally:
+            query.session.close()
+            db.session.close()
+
+    def test_upgrade_tables(self):
+        db, connection = self.import_xml('upgrade')
+        expected = self.get_checksums(db)
+        db.session.close()
+
+        # database of an older version without column checksum
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP INDEX ix_pyuniprot_sequence_checksum')
+            connection.exec_driver_sql('ALTER TABLE pyuniprot_sequence DROP COLUMN checksum')
+
+        db._upgrade_tables(chunk_size=7)
+
+        indexes = sqlalchemy.inspect(db.engine).get_indexes('pyuniprot_sequence')
+        self.assertIn(['checksum'], [index['column_names'] for index in indexes])
+
+        self.assertEqual(expected, self.get_checksums(db))
+        self.assertEqual(0, db.update_sequence_checksums())
+        db.session.close()
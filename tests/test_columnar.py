@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyuniprot.constants import PYUNIPROT_DATA_DIR
+from pyuniprot.manager import models
+from pyuniprot.manager.database import DbManager
+from pyuniprot.manager.query import QueryManager
+from pyuniprot.manager.synthetic import write_synthetic_xml
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+this_path = os.path.dirname(os.path.realpath(__file__))
+data_path = os.path.join(this_path, 'data')
+
+test_models = [
+    models.Accession,
+    models.DbReference,
+    models.Disease,
+    models.DiseaseComment,
+    models.Entry,
+    models.Feature,
+    models.Keyword,
+    models.Pmid,
+    models.Sequence,
+    models.SubcellularLocation,
+    models.TissueInReference,
+    models.entry_pmid,
+    models.entry_keyword,
+    models.entry_subcellular_location,
+]
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow not installed')
+class TestColumnar(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        trembl_file_path = os.path.join(cls.tmp_dir, 'uniprot_trembl.xml.gz')
+        write_synthetic_xml(trembl_file_path, 50, dataset='TrEMBL')
+        shutil.copy(os.path.join(data_path, 'reldate.txt'), cls.tmp_dir)
+        cls.urls = [os.path.join(data_path, 'uniprot_sprot.xml.gz'), trembl_file_path]
+
+        cls.reference = DbManager('sqlite:///' + os.path.join(cls.tmp_dir, 'reference.db'))
+        cls.reference.db_import_xml(cls.urls, silent=True, dataset='both', bulk=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.reference.session.close()
+        shutil.rmtree(cls.tmp_dir)
+
+        for file_name in ('uniprot_trembl.xml.gz', 'uniprot_trembl.xml'):
+            if os.path.exists(os.path.join(PYUNIPROT_DATA_DIR, file_name)):
+                os.remove(os.path.join(PYUNIPROT_DATA_DIR, file_name))
+
+    @classmethod
+    def count_rows(cls, db):
+        return {str(model): db.session.query(model).count() for model in test_models}
+
+    def test_convert_and_load(self):
+        for file_format in ('parquet', 'arrow'):
+            directory = os.path.join(self.tmp_dir, file_format)
+            manifest = self.reference.convert_xml(directory, self.urls, silent=True, dataset='both',
+                                                  file_format=file_format, batch_size=20)
+
+            self.assertEqual(54, manifest['entries'])
+            self.assertEqual({'Swiss-Prot', 'TrEMBL'}, {x['knowledgebase'] for x in manifest['releases']})
+
+            with open(os.path.join(directory, 'manifest.json')) as fd:
+                self.assertEqual(manifest['tables'], json.load(fd)['tables'])
+
+            for table in manifest['tables'].values():
+                self.assertTrue(os.path.exists(os.path.join(directory, table['file'])))
+
+            # loaded twice: all tables are replaced
+            for name in ('first', 'second'):
+                connection = 'sqlite:///' + os.path.join(self.tmp_dir, '{}_{}.db'.format(file_format, name))
+                db = DbManager(connection)
+
+                try:
+                    counts = db.load_columnar(directory, batch_size=7)
+                    self.assertEqual({name: table['rows'] for name, table in manifest['tables'].items()},
+                                     dict(counts))
+                    self.assertEqual(self.count_rows(self.reference), self.count_rows(db))
+
+                    entry = db.session.query(models.Entry).filter(models.Entry.name == '5HT2A_PIG').one()
+                    self.assertEqual(['P50129', 'Q29004'], [x.accession for x in entry.accessions])
+                    self.assertEqual('NTVNEKVSCV', entry.sequence.sequence[-10:])
+                    self.assertEqual(2, len(entry.pmids))
+                    self.assertEqual(1996, entry.created.year)
+
+                    versions = db.session.query(models.Version).all()
+                    self.assertEqual({'Swiss-Prot', 'TrEMBL'}, {x.knowledgebase for x in versions})
+                    self.assertTrue(all(x.import_completed_date for x in versions))
+
+                    # indexes and constraints created after loading
+                    self.assertEqual({}, db._create_constraints())
+                finally:
+                    db.session.close()
+
+            self.assertEqual(1, QueryManager(connection).entry(name='5HT2A_PIG', as_df=True).shape[0])
+
+    def test_load_compressed_sequences_with_kmer_index(self):
+        directory = os.path.join(self.tmp_dir, 'compressed')
+        self.reference.convert_xml(directory, self.urls[0], silent=True, sequence_compression='pack')
+
+        connection = 'sqlite:///' + os.path.join(self.tmp_dir, 'compressed.db')
+        db = DbManager(connection)
+
+        try:
+            db.load_columnar(directory, kmer_index=True)
+
+            sequence = db.session.query(models.Sequence).join(models.Entry).filter(
+                models.Entry.name == '5HT2A_PIG').one()
+            self.assertIsNone(sequence.plain_sequence)
+            self.assertEqual('NTVNEKVSCV', sequence.sequence[-10:])
+            self.assertEqual(4, db.get_kmer_size())
+        finally:
+            db.session.close()
+
+        self.assertEqual(1, QueryManager(connection).sequence_search('NTVNEKVSCV', as_df=True).shape[0])
+
+    def test_load_staging(self):
+        directory = os.path.join(self.tmp_dir, 'staging')
+        self.reference.convert_xml(directory, self.urls[0], silent=True)
+
+        path = os.path.join(self.tmp_dir, 'staging.db')
+        shutil.copy(os.path.join(self.tmp_dir, 'reference.db'), path)
+        db = DbManager('sqlite:///' + path)
+
+        try:
+            db.staging_min_entry_ratio = 0
+            db.load_columnar(directory, staging=True)
+            self.assertEqual(4, db.session.query(models.Entry).count())
+            self.assertFalse(os.path.exists(path + '.staging'))
+        finally:
+            db.session.close()
+
+    def test_load_errors(self):
+        db = DbManager('sqlite:///' + os.path.join(self.tmp_dir, 'errors.db'))
+
+        self.assertRaises(IOError, db.load_columnar, os.path.join(self.tmp_dir, 'missing'))
+        self.assertRaises(ValueError, db.convert_xml, os.path.join(self.tmp_dir, 'xlsx'), self.urls[0],
+                          file_format='xlsx')
+
+        # incomplete conversion (no manifest) is not loaded
+        directory = os.path.join(self.tmp_dir, 'incomplete')
+        self.reference.convert_xml(directory, self.urls[0], silent=True)
+        os.remove(os.path.join(directory, 'manifest.json'))
+        self.assertRaises(IOError, db.load_columnar, directory)
+
+        db.session.close()
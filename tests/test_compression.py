@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+from sqlalchemy import select, text
+
+from pyuniprot.manager import models
+from pyuniprot.manager.bulk import encode_tsv
+from pyuniprot.manager.compression import PACK, ZLIB, decode_sequence, encode_sequence, pack_sequence
+from pyuniprot.manager.database import DbManager
+from pyuniprot.manager.query import QueryManager
+from pyuniprot.manager.synthetic import write_synthetic_version_file, write_synthetic_xml
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_round_trip(self):
+        for method in (ZLIB, PACK):
+            for length in list(range(0, 20)) + [300, 35000]:
+                sequence = ('MKVLAAGIWYZ' * (length // 11 + 1))[:length]
+                encoded = encode_sequence(sequence, method)
+                self.assertEqual(sequence, decode_sequence(encoded))
+                self.assertEqual(encoded, encode_sequence(sequence, method))
+
+    def test_pack(self):
+        sequence = 'ACDEFGHIKLMNPQRSTVWY' * 10
+        encoded = encode_sequence(sequence, PACK)
+        self.assertEqual(b'p', encoded[:1])
+        self.assertEqual(1 + len(sequence) * 5 // 8, len(encoded))
+
+        # other characters than A-Z are compressed with zlib
+        self.assertIsNone(pack_sequence('MKV*'))
+        encoded = encode_sequence('mkv*', PACK)
+        self.assertEqual(b'z', encoded[:1])
+        self.assertEqual('mkv*', decode_sequence(encoded))
+
+    def test_errors(self):
+        self.assertIsNone(encode_sequence(None))
+        self.assertIsNone(decode_sequence(None))
+        self.assertRaises(ValueError, encode_sequence, 'MKV', 'gzip')
+        self.assertRaises(ValueError, decode_sequence, b'xMKV')
+
+    def test_model(self):
+        sequence = models.Sequence(sequence='MKV')
+        self.assertEqual('MKV', sequence.sequence)
+        self.assertIsNone(sequence.compressed_sequence)
+
+        sequence = models.Sequence(compressed_sequence=encode_sequence('MKV'))
+        self.assertEqual('MKV', sequence.sequence)
+        self.assertIsNone(sequence.plain_sequence)
+
+    def test_encode_tsv(self):
+        columns, tsv = encode_tsv(models.Sequence.__table__, [{'sequence': None, 'compressed_sequence': b'p\x01\xff'}])
+        self.assertEqual(['sequence', 'compressed_sequence'], columns)
+        self.assertEqual('\\N\t\\\\x7001ff\n', tsv)
+
+
+class TestCompressedImport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.xml_file_path = os.path.join(self.tmp_dir, 'compression.xml.gz')
+        self.version_file_path = os.path.join(self.tmp_dir, 'reldate.txt')
+        write_synthetic_xml(self.xml_file_path, 50)
+        write_synthetic_version_file(self.version_file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def get_db(self, name):
+        connection = 'sqlite:///' + os.path.join(self.tmp_dir, name + '.db')
+        db = DbManager(connection)
+        db._create_tables()
+        db.import_version(self.version_file_path)
+        return db, connection
+
+    def get_sequences(self, db):
+        db.session.expire_all()
+        return {entry.name: entry.sequence.sequence for entry in db.session.query(models.Entry)}
+
+    def test_import(self):
+        reference, _ = self.get_db('reference')
+        reference.import_xml(self.xml_file_path, silent=True)
+        expected = self.get_sequences(reference)
+        reference.session.close()
+
+        for bulk in (False, True):
+            for method in (ZLIB, PACK):
+                db, connection = self.get_db('{}_{}'.format(method, bulk))
+
+                try:
+                    db.import_xml(self.xml_file_path, silent=True, bulk=bulk, sequence_compression=method)
+
+                    self.assertEqual(expected, self.get_sequences(db))
+                    self.assertEqual(0, db.session.query(models.Sequence)
+                                     .filter(models.Sequence.plain_sequence.isnot(None)).count())
+
+                    self.check_queries(QueryManager(connection=connection), expected)
+                finally:
+                    db.session.close()
+
+        # compressed sequences would be missed by SQL
+        with self.assertRaises(NotImplementedError):
+            models.Sequence.sequence.like('M%')
+
+    def check_queries(self, query, expected):
+        name, sequence = sorted(expected.items())[0]
+
+        try:
+            self.assertEqual([name], [entry.name for entry in query.entry(sequence=sequence)])
+            self.assertEqual([sequence], [s.sequence for s in query.sequence(sequence=sequence.lower())])
+            self.assertEqual([sequence], [s.sequence for s in query.sequence(sequence=(sequence, 'MKV'))])
+
+            pattern = sequence[:10] + '%'
+            self.assertIn(sequence, [s.sequence for s in query.sequence(sequence=pattern)])
+            self.assertIn(sequence, [s.sequence for s in query.sequence(sequence='_' + sequence[1:].lower())])
+
+            df = query.sequence(entry_name=name, as_df=True)
+            self.assertEqual([sequence], list(df['sequence']))
+            self.assertNotIn('compressed_sequence', df.columns)
+
+            # more matching sequences than ids bound as parameters
+            q = query._sequence_query(query.session.query(models.Sequence), '%', chunk_size=10)
+            self.assertEqual(sorted(expected.values()), sorted(s.sequence for s in q))
+            self.assertEqual(sorted(expected.values()), sorted(query._sequence_results(q, None, True)['sequence']))
+        finally:
+            query.session.close()
+
+    def test_other_zlib_build(self):
+        db, connection = self.get_db('other_zlib')
+
+        try:
+            db.import_xml(self.xml_file_path, silent=True, sequence_compression=ZLIB)
+            expected = self.get_sequences(db)
+
+            # deflate streams of another zlib build (other bytes for the same sequence)
+            table = models.Sequence.__table__
+
+            for id_, data in db.session.execute(select(table.c.id, table.c.compressed_sequence)).all():
+                compressor = zlib.compressobj(0, zlib.DEFLATED, -zlib.MAX_WBITS)  # stored blocks
+                other = b'z' + compressor.compress(decode_sequence(data).encode('utf-8')) + compressor.flush()
+                db.session.execute(table.update().where(table.c.id == id_).values(compressed_sequence=other))
+
+            db.session.commit()
+            self.assertEqual(expected, self.get_sequences(db))
+
+            self.check_queries(QueryManager(connection=connection), expected)
+
+            # pattern search with k-mer index
+            db.build_kmer_index()
+            self.check_queries(QueryManager(connection=connection), expected)
+        finally:
+            db.session.close()
+
+    def test_compress_sequences(self):
+        db, connection = self.get_db('compress')
+
+        try:
+            db.import_xml(self.xml_file_path, silent=True)
+            expected = self.get_sequences(db)
+
+            size_before, size_after = db.compress_sequences(ZLIB, chunk_size=7)
+            self.assertLess(size_after, size_before)
+            self.assertEqual(expected, self.get_sequences(db))
+            self.assertEqual(0, db.session.execute(
+                text('SELECT count(*) FROM pyuniprot_sequence WHERE sequence IS NOT NULL')).scalar())
+
+            # back to text
+            db.compress_sequences(None)
+            self.assertEqual(expected, self.get_sequences(db))
+            self.assertEqual(0, db.session.query(models.Sequence)
+                             .filter(models.Sequence.compressed_sequence.isnot(None)).count())
+        finally:
+            db.session.close()
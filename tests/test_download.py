@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from unittest import mock
+
+from pyuniprot.manager import download as download_module
+from pyuniprot.manager.database import DbManager
+from pyuniprot.manager.download import DownloadError, download, get_release_checksums, get_segments
+
+this_path = os.path.dirname(os.path.realpath(__file__))
+data_path = os.path.join(this_path, 'data')
+
+METALINK = '''<?xml version="1.0" encoding="UTF-8"?>
+<metalink xmlns="http://www.metalinker.org/" version="3.0">
+  <files>
+    <file name="{name}">
+      <size>{size}</size>
+      <verification>
+        <hash type="md5">{md5}</hash>
+      </verification>
+    </file>
+  </files>
+</metalink>
+'''
+
+
+class RangeHTTPRequestHandler(SimpleHTTPRequestHandler):
+    """Serves files with support of single range requests. Records all requests in `requests` and drops the
+    connection after `drop_after` bytes of the first response."""
+    requests = []
+    drop_after = None
+
+    def log_message(self, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+
+        size = os.path.getsize(path)
+        first, last = 0, size - 1
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+
+        self.requests.append((self.command, self.path, self.headers.get('Range')))
+
+        if match:
+            first = int(match.group(1))
+            last = int(match.group(2)) if match.group(2) else last
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(first, last, size))
+        else:
+            self.send_response(200)
+
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(last - first + 1))
+        self.end_headers()
+
+        with open(path, 'rb') as fd:
+            fd.seek(first)
+            data = fd.read(last - first + 1)
+
+        if self.drop_after is not None and self.command == 'GET':
+            data = data[:self.drop_after]
+            type(self).drop_after = None
+
+        return FileLike(data)
+
+
+class FileLike(object):
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, size=-1):
+        data, self.data = self.data, b''
+        return data
+
+    def close(self):
+        pass
+
+
+class TestDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server_dir = os.path.join(self.tmp_dir, 'server')
+        os.mkdir(self.server_dir)
+
+        self.content = os.urandom(5 * download_module.MIN_SEGMENT_SIZE + 123)
+        self.md5 = hashlib.md5(self.content).hexdigest()
+
+        with open(os.path.join(self.server_dir, 'uniprot_sprot.xml.gz'), 'wb') as fd:
+            fd.write(self.content)
+
+        RangeHTTPRequestHandler.requests = []
+        RangeHTTPRequestHandler.drop_after = None
+
+        self.server = HTTPServer(('127.0.0.1', 0), partial(RangeHTTPRequestHandler, directory=self.server_dir))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.url = 'http://127.0.0.1:{}/uniprot_sprot.xml.gz'.format(self.server.server_port)
+        self.path = os.path.join(self.tmp_dir, 'uniprot_sprot.xml.gz')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def get_ranges(self):
+        return sorted(x[2] for x in RangeHTTPRequestHandler.requests if x[0] == 'GET')
+
+    def read_file(self):
+        with open(self.path, 'rb') as fd:
+            return fd.read()
+
+    def test_get_segments(self):
+        size = download_module.MIN_SEGMENT_SIZE * 10
+        segments = get_segments(size + 1, 4)
+
+        self.assertEqual(4, len(segments))
+        self.assertEqual(0, segments[0][0])
+        self.assertEqual(size, segments[-1][1])
+        self.assertTrue(all(x[1] + 1 == y[0] for x, y in zip(segments, segments[1:])))
+
+        self.assertEqual([(0, 99)], get_segments(100, 4))
+
+    def test_parallel_download(self):
+        self.assertTrue(download(self.url, self.path, segments=4, md5=self.md5))
+        self.assertEqual(self.content, self.read_file())
+        self.assertEqual(4, len(self.get_ranges()))
+        self.assertEqual([], [x for x in os.listdir(self.tmp_dir) if '.part' in x])
+
+    def test_skip_valid_file(self):
+        download(self.url, self.path, md5=self.md5)
+        RangeHTTPRequestHandler.requests = []
+
+        self.assertFalse(download(self.url, self.path, md5=self.md5))
+        self.assertEqual([], self.get_ranges())
+
+        self.assertTrue(download(self.url, self.path, md5=self.md5, force=True))
+
+    def test_keep_file_of_unknown_size(self):
+        with open(self.path, 'wb') as fd:
+            fd.write(b'local copy')
+
+        # FTP: no Content-Length and no metalink
+        with mock.patch.object(download_module, 'get_remote_size', return_value=(None, False)):
+            self.assertFalse(download(self.url, self.path))
+            self.assertEqual(b'local copy', self.read_file())
+            self.assertEqual([], self.get_ranges())
+
+            self.assertTrue(download(self.url, self.path, force=True))
+            self.assertEqual(self.content, self.read_file())
+
+    def test_resume_partial_segment(self):
+        segments = get_segments(len(self.content), 2)
+
+        with open(self.path + '.part0', 'wb') as fd:
+            fd.write(self.content[:1000])
+
+        with open(self.path + '.part1', 'wb') as fd:
+            fd.write(self.content[segments[1][0]:segments[1][1] + 1])
+
+        self.assertTrue(download(self.url, self.path, segments=2, md5=self.md5))
+        self.assertEqual(self.content, self.read_file())
+        self.assertEqual(['bytes=1000-{}'.format(segments[0][1])], self.get_ranges())
+
+    def test_retry_after_dropped_connection(self):
+        RangeHTTPRequestHandler.drop_after = 4096
+
+        with mock.patch.object(download_module.time, 'sleep'):
+            self.assertTrue(download(self.url, self.path, segments=1, md5=self.md5))
+
+        self.assertEqual(self.content, self.read_file())
+        self.assertEqual(['bytes=0-{}'.format(len(self.content) - 1),
+                          'bytes=4096-{}'.format(len(self.content) - 1)], self.get_ranges())
+
+    def test_checksum_mismatch(self):
+        self.assertRaises(DownloadError, download, self.url, self.path, md5='0' * 32)
+        self.assertFalse(os.path.exists(self.path))
+
+        self.assertRaises(DownloadError, download, self.url[:-3] + 'missing', self.path)
+
+    def test_release_checksums(self):
+        with open(os.path.join(self.server_dir, 'RELEASE.metalink'), 'w') as fd:
+            fd.write(METALINK.format(name='uniprot_sprot.xml.gz', size=len(self.content), md5=self.md5))
+
+        metalink_url = os.path.join(os.path.dirname(self.url), 'RELEASE.metalink')
+
+        self.assertEqual({'uniprot_sprot.xml.gz': (len(self.content), self.md5)},
+                         get_release_checksums(metalink_url))
+        self.assertEqual({}, get_release_checksums(metalink_url + '.missing'))
+
+    def test_download_and_extract(self):
+        shutil.copy(os.path.join(data_path, 'uniprot_sprot.xml.gz'), self.server_dir)
+        shutil.copy(os.path.join(data_path, 'reldate.txt'), self.server_dir)
+
+        with open(os.path.join(self.server_dir, 'uniprot_sprot.xml.gz'), 'rb') as fd:
+            md5 = hashlib.md5(fd.read()).hexdigest()
+
+        with open(os.path.join(self.server_dir, 'RELEASE.metalink'), 'w') as fd:
+            fd.write(METALINK.format(name='uniprot_sprot.xml.gz', size=0, md5=md5).replace('<size>0</size>', ''))
+
+        with mock.patch.object(DbManager, 'get_path_to_file_from_url',
+                               lambda url: os.path.join(self.tmp_dir, os.path.basename(url))):
+            xml_file_path, version_file_path = DbManager.download_and_extract(self.url)
+
+            self.assertEqual(os.path.join(self.tmp_dir, 'uniprot_sprot.xml'), xml_file_path)
+            self.assertTrue(os.path.exists(version_file_path))
+
+            RangeHTTPRequestHandler.requests = []
+            os.remove(xml_file_path)
+
+            # valid copy of release is not downloaded (and not extracted) again
+            DbManager.download_and_extract(self.url)
+            self.assertNotIn('/uniprot_sprot.xml.gz', [x[1] for x in RangeHTTPRequestHandler.requests if x[0] == 'GET'])
+            self.assertFalse(os.path.exists(xml_file_path))
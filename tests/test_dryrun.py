@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyuniprot.constants import PYUNIPROT_DATA_DIR
+from pyuniprot.manager import models
+from pyuniprot.manager.database import DbManager
+from pyuniprot.manager.dryrun import format_dry_run
+
+this_path = os.path.dirname(os.path.realpath(__file__))
+data_path = os.path.join(this_path, 'data')
+
+
+class TestDryRun(unittest.TestCase):
+
+    def setUp(self):
+        # removed by other tests, downloads are copied into it
+        if not os.path.exists(PYUNIPROT_DATA_DIR):
+            os.mkdir(PYUNIPROT_DATA_DIR)
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.url = os.path.join(data_path, 'uniprot_sprot.xml.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_database_not_touched(self):
+        path = os.path.join(self.tmp_dir, 'dry_run.db')
+        db = DbManager('sqlite:///' + path)
+
+        report = db.db_import_xml(self.url, silent=True, dry_run=True)
+
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(['Swiss-Prot'], report['knowledgebases'])
+        self.assertEqual(4, report['entries'])
+        self.assertEqual(4, report['entries_read'])
+        self.assertGreater(report['entries_per_second'], 0)
+        self.assertGreater(report['bytes_read'], 0)
+        self.assertEqual({}, report['table_rows'])
+
+        if report['peak_rss'] is not None:
+            self.assertGreater(report['peak_rss'], 0)
+
+        self.assertIn('dry run of Swiss-Prot: 4 entries extracted', format_dry_run(report))
+
+    def test_counts_match_import(self):
+        db = DbManager('sqlite:///' + os.path.join(self.tmp_dir, 'import.db'))
+        db.db_import_xml(self.url, silent=True, bulk=True)
+
+        try:
+            report = db.dry_run_xml(self.url, silent=True, bulk=True, workers=2, batch_size=3)
+            fields = report['fields']
+
+            self.assertEqual(db.session.query(models.Accession).count(), fields['accessions'])
+            self.assertEqual(db.session.query(models.DbReference).count(), fields['db_references'])
+            self.assertEqual(db.session.query(models.Feature).count(), fields['features'])
+            self.assertEqual(db.session.query(models.Sequence).count(), fields['sequences'])
+            self.assertEqual(db.session.query(models.entry_pmid).count(), fields['pmids'])
+            self.assertEqual(db.session.query(models.entry_keyword).count(), fields['keywords'])
+
+            # rows of the bulk writer are the rows of an import
+            for table in models.Base.metadata.sorted_tables:
+                if table.name in report['table_rows']:
+                    self.assertEqual(db.session.query(table).count(), report['table_rows'][table.name], table.name)
+
+            self.assertEqual(2, report['workers'])
+
+            if report['peak_rss'] is not None:
+                self.assertIn('per parser process', format_dry_run(report))
+        finally:
+            db.session.close()
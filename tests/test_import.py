@@ -0,0 +1,656 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from datetime import datetime
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+from lxml.etree import iterparse
+from sqlalchemy import event, exc, inspect
+
+from pyuniprot.manager import models
+from pyuniprot.manager.bulk import BulkWriter, encode_tsv
+from pyuniprot.manager.database import DbManager, XN
+from pyuniprot.manager.extractor import ENTRY, extract_entry_rows, benchmark_extraction
+from pyuniprot.constants import PYUNIPROT_DATA_DIR
+from pyuniprot.manager.parallel import iter_entry_chunks, parse_chunk
+from pyuniprot.manager.profiler import StageProfiler, format_report
+from pyuniprot.manager.progress import ImportProgress
+from pyuniprot.manager.synthetic import write_synthetic_xml
+
+this_path = os.path.dirname(os.path.realpath(__file__))
+data_path = os.path.join(this_path, 'data')
+
+
+class QuietHTTPRequestHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class InterruptedFile(object):
+    """Binary file object raising an IOError after `limit` bytes"""
+    def __init__(self, path, limit):
+        self.fd = open(path, 'rb')
+        self.limit = limit
+
+    def read(self, size=-1):
+        if self.fd.tell() >= self.limit:
+            raise IOError('connection lost')
+        return self.fd.read(size)
+
+    def close(self):
+        self.fd.close()
+
+
+test_models = [
+    models.Accession,
+    models.AlternativeFullName,
+    models.AlternativeShortName,
+    models.DbReference,
+    models.Disease,
+    models.DiseaseComment,
+    models.ECNumber,
+    models.Entry,
+    models.Feature,
+    models.Function,
+    models.Keyword,
+    models.OrganismHost,
+    models.OtherGeneName,
+    models.Pmid,
+    models.Sequence,
+    models.SubcellularLocation,
+    models.TissueInReference,
+    models.TissueSpecificity,
+    models.entry_pmid,
+    models.entry_keyword,
+]
+
+
+class TestImport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.xml_file_path = os.path.join(cls.tmp_dir, 'uniprot_sprot.xml')
+        cls.version_file_path = os.path.join(data_path, 'reldate.txt')
+        cls.gz_file_path = os.path.join(data_path, 'uniprot_sprot.xml.gz')
+
+        with gzip.open(cls.gz_file_path, 'rb') as f_in:
+            with open(cls.xml_file_path, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def get_db(self, name):
+        db = DbManager('sqlite:///' + os.path.join(self.tmp_dir, name + '.db'))
+        db._drop_tables()
+        db._create_tables()
+        db.import_version(self.version_file_path)
+        return db
+
+    @classmethod
+    def count_rows(cls, db):
+        return {str(model): db.session.query(model).count() for model in test_models}
+
+    def test_iter_entry_chunks(self):
+        with open(self.xml_file_path, 'rb') as fd:
+            chunks = list(iter_entry_chunks(fd, entries_per_chunk=3, block_size=100))
+
+        self.assertEqual(2, len(chunks))
+        self.assertEqual([3, 1], [chunk.count(b'</entry>') for chunk in chunks])
+
+        for chunk in chunks:
+            self.assertTrue(chunk.startswith(b'<entry '))
+            self.assertTrue(chunk.endswith(b'</entry>'))
+
+        with open(self.xml_file_path, 'rb') as fd:
+            skipped = list(iter_entry_chunks(fd, entries_per_chunk=3, block_size=100, skip=2))
+
+        self.assertEqual(1, len(skipped))
+        self.assertTrue(skipped[0].startswith(b'<entry '))
+        self.assertEqual(2, skipped[0].count(b'</entry>'))
+        self.assertTrue(skipped[0].endswith(chunks[1]))
+        self.assertIn(b'<name>1C06_HUMAN</name>', skipped[0])
+
+    def test_parallel_import(self):
+        serial = self.get_db('serial')
+        serial.import_xml(self.xml_file_path, silent=True)
+
+        parallel = self.get_db('parallel')
+        parallel.import_xml(self.xml_file_path, silent=True, workers=2)
+
+        self.assertEqual(self.count_rows(serial), self.count_rows(parallel))
+        self.assertEqual(4, parallel.session.query(models.Entry).count())
+
+        serial.session.close()
+        parallel.session.close()
+
+    def test_parallel_import_taxids(self):
+        db = self.get_db('parallel_taxids')
+        db.import_xml(self.xml_file_path, taxids=[9606, 9823], silent=True, workers=2)
+
+        self.assertEqual({9606, 9823}, {x.taxid for x in db.session.query(models.Entry).all()})
+
+        db.session.close()
+
+    def test_iter_entries_taxids(self):
+        with open(self.xml_file_path, 'rb') as fd:
+            self.assertEqual([1, 2, 3, 4], [number for number, _ in DbManager.iter_entries(fd)])
+
+        with open(self.xml_file_path, 'rb') as fd:
+            entries = [(number, x.findtext('n:name', namespaces=XN))
+                       for number, x in DbManager.iter_entries(fd, taxids=[9606])]
+
+        self.assertEqual([(3, '1C06_HUMAN')], entries)
+
+    def test_taxids_entry_without_organism(self):
+        with open(self.xml_file_path, 'rb') as fd:
+            xml = fd.read()
+
+        # <organism> of 1C06_HUMAN removed
+        human = xml.index(b'<name>1C06_HUMAN</name>')
+        start = xml.index(b'<organism', human)
+        xml = xml[:start] + xml[xml.index(b'</organism>', start) + len(b'</organism>'):]
+
+        entries = [number for number, _ in DbManager.iter_entries(io.BytesIO(xml), taxids=[9606, 9823])]
+        self.assertEqual([1], entries)
+
+        # same filter in parser processes
+        chunk = next(iter_entry_chunks(io.BytesIO(xml)))
+        self.assertEqual([0], [index for index, _ in parse_chunk(chunk, {9606, 9823})[1]])
+
+    def test_parse_chunk_taxids(self):
+        with open(self.xml_file_path, 'rb') as fd:
+            chunk = next(iter_entry_chunks(fd))
+
+        self.assertEqual((4, []), parse_chunk(chunk, {-1}))
+        self.assertEqual([0, 1, 2, 3], [index for index, _ in parse_chunk(chunk, {9606, 9823, 3702, 654924})[1]])
+
+        entries_in_chunk, entries_rows = parse_chunk(chunk, {9606})
+        self.assertEqual(4, entries_in_chunk)
+        self.assertEqual([2], [index for index, _ in entries_rows])
+        self.assertEqual('1C06_HUMAN', entries_rows[0][1]['entry'][4])
+
+    def test_import_taxids(self):
+        db = self.get_db('serial_taxids')
+        db.import_xml(self.xml_file_path, taxids=[9823], silent=True)
+
+        self.assertEqual(['5HT2A_PIG'], [x.name for x in db.session.query(models.Entry).all()])
+
+        db.session.close()
+
+    def test_import_gzipped(self):
+        serial = self.get_db('extracted')
+        serial.import_xml(self.xml_file_path, silent=True)
+
+        gzipped = self.get_db('gzipped')
+        gzipped.import_xml(self.gz_file_path, silent=True)
+
+        self.assertEqual(self.count_rows(serial), self.count_rows(gzipped))
+
+        serial.session.close()
+        gzipped.session.close()
+
+    def test_import_file_object(self):
+        db = self.get_db('file_object')
+
+        with gzip.open(self.gz_file_path, 'rb') as fd:
+            db.import_xml(fd, silent=True, workers=2)
+            self.assertFalse(fd.closed)
+
+        self.assertEqual(4, db.session.query(models.Entry).count())
+
+        db.session.close()
+
+    def test_import_http_stream(self):
+        server = HTTPServer(('127.0.0.1', 0), partial(QuietHTTPRequestHandler, directory=data_path))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        url = 'http://127.0.0.1:{}/uniprot_sprot.xml.gz'.format(server.server_port)
+
+        try:
+            db = self.get_db('http_stream')
+            xml_source, _ = db.download_and_extract(url, stream=True)
+            self.assertEqual(url, xml_source)
+
+            db.import_xml(xml_source, silent=True)
+            self.assertEqual(4, db.session.query(models.Entry).count())
+            db.session.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_bulk_import(self):
+        orm = self.get_db('orm')
+        orm.import_xml(self.xml_file_path, silent=True)
+
+        for workers in (1, 2):
+            bulk = self.get_db('bulk_{}'.format(workers))
+            bulk.import_xml(self.xml_file_path, silent=True, workers=workers, bulk=True)
+
+            self.assertEqual(self.count_rows(orm), self.count_rows(bulk))
+
+            entry = bulk.session.query(models.Entry).filter(models.Entry.name == '5HT2A_PIG').one()
+            self.assertEqual(['P50129', 'Q29004'], [x.accession for x in entry.accessions])
+            self.assertEqual('NTVNEKVSCV', entry.sequence.sequence[-10:])
+            self.assertEqual(2, len(entry.pmids))
+
+            bulk.session.close()
+
+        orm.session.close()
+
+    def get_new_release(self):
+        """Returns path to XML of a new release: 5HT2A_PIG changed, AAH_ARATH removed and 5HT2A_PIG2 new"""
+        with open(self.xml_file_path, 'rb') as fd:
+            content = fd.read()
+
+        entries = content.split(b'</entry>')
+        header_pig, pig = entries[0].split(b'<entry ', 1)
+        new_pig = pig.replace(b'<name>5HT2A_PIG</name>', b'<name>5HT2A_PIG2</name>')
+        changed_pig = pig.replace(b'version="111" modified="2017-05-10"', b'version="112" modified="2017-07-05"')
+        changed_pig = changed_pig.replace(b'NTVNEKVSCV', b'NTVNEKVSCA')
+
+        content = b'</entry>'.join(
+            [header_pig + b'<entry ' + changed_pig] + entries[2:-1] + [b'\n<entry ' + new_pig, entries[-1]]
+        )
+
+        path = os.path.join(self.tmp_dir, 'uniprot_sprot_new.xml')
+        with open(path, 'wb') as fd:
+            fd.write(content)
+        return path
+
+    def test_incremental_import(self):
+        new_release = self.get_new_release()
+
+        reference = self.get_db('reference')
+        reference.import_xml(new_release, silent=True)
+
+        for bulk in (False, True):
+            db = self.get_db('incremental_{}'.format(bulk))
+            db.import_xml(self.xml_file_path, silent=True)
+
+            unchanged = db.session.query(models.Entry).filter(models.Entry.name == '1C06_HUMAN').one().id
+            db.session.close()
+
+            delta = db.import_xml(new_release, silent=True, bulk=bulk, incremental=True)
+            self.assertEqual({'inserted': 1, 'updated': 1, 'deleted': 1, 'unchanged': 2}, delta)
+
+            # shared tables keep rows of deleted entries
+            shared = {str(x) for x in (models.Pmid, models.Keyword, models.Disease, models.SubcellularLocation,
+                                        models.TissueInReference)}
+            db_counts = self.count_rows(db)
+            for key, count in self.count_rows(reference).items():
+                if key not in shared:
+                    self.assertEqual(count, db_counts[key], key)
+
+            self.assertEqual(unchanged, db.session.query(models.Entry).filter_by(name='1C06_HUMAN').one().id)
+            self.assertEqual([], db.session.query(models.Entry).filter_by(name='AAH_ARATH').all())
+
+            pig = db.session.query(models.Entry).filter_by(name='5HT2A_PIG').one()
+            self.assertEqual(112, pig.version)
+            self.assertEqual('NTVNEKVSCA', pig.sequence.sequence[-10:])
+
+            pig2 = db.session.query(models.Entry).filter_by(name='5HT2A_PIG2').one()
+            self.assertEqual({x.pmid for x in pig.pmids}, {x.pmid for x in pig2.pmids})
+            self.assertEqual(len({x.pmid for x in db.session.query(models.Pmid).all()}),
+                             db.session.query(models.Pmid).count())
+
+            delta = db.import_xml(new_release, silent=True, bulk=bulk, incremental=True)
+            self.assertEqual({'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 4}, delta)
+
+            db.session.close()
+
+        reference.session.close()
+
+    def test_resume_import(self):
+        reference = self.get_db('reference_resume')
+        reference.import_xml(self.xml_file_path, silent=True)
+
+        for bulk in (False, True):
+            db = self.get_db('resume_{}'.format(bulk))
+            db.batch_commit_after = 1
+
+            with self.assertRaises(IOError):
+                db.import_xml(InterruptedFile(self.xml_file_path, 40000), silent=True)
+            db.session.rollback()
+
+            checkpoint = db.get_checkpoint(self.version_file_path)
+            self.assertIn(checkpoint, (1, 2, 3))
+            self.assertEqual(checkpoint, db.session.query(models.Entry).count())
+
+            db.import_xml(self.xml_file_path, silent=True, bulk=bulk, skip=checkpoint)
+
+            self.assertEqual(self.count_rows(reference), self.count_rows(db))
+            self.assertIsNone(db.get_checkpoint(self.version_file_path))  # import completed
+            self.assertEqual(4, db.session.query(models.Version).filter_by(knowledgebase='Swiss-Prot').one()
+                             .import_checkpoint)
+
+            db.session.close()
+
+        reference.session.close()
+
+    def test_encode_tsv(self):
+        rows = [
+            {'name': 'A\tB\nC\\D', 'created': datetime(2017, 5, 10), 'version': 111, 'taxid': None},
+            {'name': 'E', 'created': None, 'version': 1, 'taxid': 9606},
+        ]
+        columns, data = encode_tsv(models.Entry.__table__, rows)
+
+        self.assertEqual(['name', 'created', 'version', 'taxid'], columns)
+        self.assertEqual('A\\tB\\nC\\\\D\t2017-05-10\t111\t\\N\nE\t\\N\t1\t9606\n', data)
+
+    def test_bulk_writer_sqlite_pragmas(self):
+        db = self.get_db('bulk_pragmas')
+
+        def get_pragmas(connection):
+            return [connection.exec_driver_sql('PRAGMA ' + x).scalar() for x in ('journal_mode', 'synchronous')]
+
+        writer = BulkWriter(db.engine)
+        self.assertEqual(['memory', 0], get_pragmas(writer.connection))
+        writer.connection.rollback()
+
+        for entry_rows in db.iter_entry_rows(open(self.xml_file_path, 'rb'), silent=True):
+            writer.add_entry(entry_rows)
+
+        connection = writer.connection
+        writer.close()
+        self.assertTrue(connection.closed)
+
+        with db.engine.connect() as connection:
+            self.assertEqual(['delete', 2], get_pragmas(connection))
+
+        self.assertEqual(4, db.session.query(models.Entry).count())
+        db.session.close()
+
+    def test_bulk_writer_error(self):
+        db = self.get_db('bulk_error')
+
+        def get_pragmas(connection):
+            return [connection.exec_driver_sql('PRAGMA ' + x).scalar() for x in ('journal_mode', 'synchronous')]
+
+        def failing_entries():
+            yield from db.iter_entry_rows(open(self.xml_file_path, 'rb'), silent=True)
+            raise IOError('connection lost')
+
+        with self.assertRaises(IOError):
+            with BulkWriter(db.engine, batch_size=2) as writer:
+                for entry_rows in failing_entries():
+                    writer.add_entry(entry_rows)
+
+        self.assertTrue(writer.connection.closed)
+
+        with db.engine.connect() as connection:
+            self.assertEqual(['delete', 2], get_pragmas(connection))
+
+        # committed batches are kept, buffered rows are discarded
+        self.assertEqual(4, db.session.query(models.Entry).count())
+        db.session.close()
+
+    def test_bulk_writer_rollback(self):
+        db = self.get_db('bulk_rollback')
+        xml_file_path = os.path.join(self.tmp_dir, 'rollback.xml')
+        write_synthetic_xml(xml_file_path, 600)
+
+        def fail_second_batch(connection):
+            if writer.written_entries:
+                raise IOError('checkpoint not saved')
+
+        writer = BulkWriter(db.engine, batch_size=100, on_flush=fail_second_batch)
+        self.assertEqual(['memory', 0], [writer.connection.exec_driver_sql('PRAGMA ' + x).scalar()
+                                         for x in ('journal_mode', 'synchronous')])
+
+        # pages of the failed batch are written to the database file before the rollback
+        writer.connection.exec_driver_sql('PRAGMA cache_size = 10')
+        writer.connection.commit()
+
+        with self.assertRaises(IOError):
+            with writer:
+                for number, entry_rows in enumerate(db.iter_entry_rows(open(xml_file_path, 'rb'), silent=True)):
+                    if number == 100:
+                        writer.batch_size = 500
+                    writer.add_entry(entry_rows)
+
+        with db.engine.connect() as connection:
+            self.assertEqual('ok', connection.exec_driver_sql('PRAGMA integrity_check').scalar())
+
+        self.assertEqual(100, db.session.query(models.Entry).count())
+        self.assertEqual(100, db.session.query(models.Sequence).count())
+        db.session.close()
+
+    def test_deferred_constraints(self):
+        db = DbManager('sqlite:///' + os.path.join(self.tmp_dir, 'deferred.db'))
+        db._drop_tables()
+        db._create_tables(defer_constraints=True)
+        db.import_version(self.version_file_path)
+
+        inspector = inspect(db.engine)
+        self.assertEqual([], inspector.get_indexes(models.Disease.__tablename__))
+        self.assertEqual([], inspector.get_indexes(models.DbReference.__tablename__))
+
+        db.import_xml(self.xml_file_path, silent=True, bulk=True)
+
+        timings = db._create_constraints()
+        self.assertEqual(10, len(timings))  # 7 unique (with Version, AppUser and SequenceKmer), 3 indexes
+        self.assertEqual({}, db._create_constraints())
+
+        inspector = inspect(db.engine)
+        self.assertEqual([(['identifier'], 1)], [(x['column_names'], x['unique'])
+                                                  for x in inspector.get_indexes(models.Disease.__tablename__)])
+        self.assertEqual([(['identifier'], 0)], [(x['column_names'], x['unique'])
+                                                  for x in inspector.get_indexes(models.DbReference.__tablename__)])
+
+        db.session.add(models.Disease(identifier='DI-02231'))
+        self.assertRaises(exc.IntegrityError, db.session.commit)
+        db.session.rollback()
+
+        self.assertEqual({}, self.get_db('not_deferred')._create_constraints())
+
+        db.session.close()
+
+    def test_stage_profiler(self):
+        profiler = StageProfiler()
+
+        with profiler.stage('outer'):
+            profiler.wrap('inner', time.sleep)(0.01)
+            profiler.wrap('inner', time.sleep)(0.01)
+
+        self.assertEqual([1, 2, 3], list(profiler.iter_timed('step', [1, 2, 3])))
+
+        db = DbManager('sqlite://')
+        profiler.patch(db, 'get_checkpoint', 'checkpoint')
+        self.assertIn('get_checkpoint', vars(db))
+        profiler.stop(entries=10)
+        self.assertNotIn('get_checkpoint', vars(db))
+
+        report = profiler.get_report()
+        stages = report['stages']
+
+        self.assertEqual(1, stages['outer']['calls'])
+        self.assertEqual(2, stages['inner']['calls'])
+        self.assertEqual(4, stages['step']['calls'])
+        self.assertGreaterEqual(stages['inner']['seconds'], 0.02)
+        self.assertAlmostEqual(stages['outer']['seconds'] - stages['inner']['seconds'],
+                               stages['outer']['self_seconds'], places=4)
+        self.assertAlmostEqual(100, sum(stats['percent'] for stats in stages.values()), delta=0.1)
+        self.assertIn('10 entries', format_report(report))
+
+    def test_import_profile(self):
+        profile_path = os.path.join(self.tmp_dir, 'profile.json')
+
+        db = self.get_db('profile')
+        db.profiler = StageProfiler()
+        db.import_xml(self.gz_file_path, silent=True)
+        report = db.stop_profiler(db.entries_read, profile_path)
+
+        with open(profile_path) as fd:
+            self.assertEqual(report, json.load(fd))
+
+        stages = report['stages']
+
+        self.assertEqual(4, report['entries'])
+        self.assertEqual(4, stages['extract entry']['calls'])
+        self.assertEqual(4, stages['orm objects']['calls'])
+        self.assertEqual(4, stages['orm objects: pmids']['calls'])
+        self.assertEqual(1, stages['flush']['calls'])
+        self.assertEqual(1, stages['commit']['calls'])
+        self.assertIsNone(db.profiler)
+        self.assertNotIn('insert_entry_rows', vars(db))
+
+        db.session.close()
+
+    def test_import_both_datasets(self):
+        trembl_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        trembl_file_path = os.path.join(trembl_dir, 'uniprot_trembl.xml.gz')
+        write_synthetic_xml(trembl_file_path, 50, dataset='TrEMBL')
+        shutil.copy(self.version_file_path, trembl_dir)
+
+        db = DbManager('sqlite:///' + os.path.join(self.tmp_dir, 'both.db'))
+        urls = [self.gz_file_path, trembl_file_path]
+
+        try:
+            db.db_import_xml(urls, silent=True, dataset='both')
+
+            self.assertEqual({'Swiss-Prot': 4, 'TrEMBL': 50},
+                             {dataset: db.session.query(models.Entry).filter_by(dataset=dataset).count()
+                              for dataset in ('Swiss-Prot', 'TrEMBL')})
+
+            versions = db.session.query(models.Version).all()
+            self.assertEqual({'Swiss-Prot', 'TrEMBL'}, {x.knowledgebase for x in versions})
+            self.assertTrue(all(x.import_completed_date for x in versions))
+
+            pmids = [x.pmid for x in db.session.query(models.Pmid).all()]
+            self.assertEqual(len(set(pmids)), len(pmids))
+
+            self.assertIsNone(db.get_checkpoint(self.version_file_path, 'TrEMBL'))
+
+            # nothing to resume
+            db.db_import_xml(urls, silent=True, dataset='both', resume=True)
+            self.assertEqual(54, db.session.query(models.Entry).count())
+
+            self.assertRaises(ValueError, db.db_import_xml, urls, dataset='trembl')
+        finally:
+            db.session.close()
+            for file_name in ('uniprot_trembl.xml.gz', 'uniprot_trembl.xml'):
+                if os.path.exists(os.path.join(PYUNIPROT_DATA_DIR, file_name)):
+                    os.remove(os.path.join(PYUNIPROT_DATA_DIR, file_name))
+
+    def test_import_progress(self):
+        progress = ImportProgress(silent=True)
+
+        with DbManager.open_xml(self.gz_file_path, progress) as fd:
+            entries = list(DbManager.iter_entries(fd, progress=progress))
+
+        progress.close()
+
+        self.assertEqual(4, progress.entries)
+        self.assertEqual(os.path.getsize(self.gz_file_path), progress.total_bytes)
+        self.assertEqual(progress.total_bytes, progress.bytes_read)
+        self.assertEqual(0, progress.eta.total_seconds())
+        self.assertIn('4 entries', progress.get_status())
+        self.assertIn('100.0% of XML read', progress.get_status())
+        self.assertTrue(progress.readers[0].fd.closed)
+
+    def test_memory_reports(self):
+        progress = ImportProgress(silent=True, memory_interval=2)
+
+        for _ in range(5):
+            progress.update()
+
+        progress.close()
+
+        self.assertEqual([2, 4], [entries for entries, _ in progress.memory_reports])
+        self.assertTrue(all(peak_rss > 0 for _, peak_rss in progress.memory_reports))
+        self.assertIn('peak RSS', progress.get_status())
+
+    def test_iter_entries_removes_siblings(self):
+        xml_file_path = os.path.join(self.tmp_dir, 'siblings.xml')
+        write_synthetic_xml(xml_file_path, 2000)
+
+        max_siblings = 0
+
+        with open(xml_file_path, 'rb') as fd:
+            for number, entry in DbManager.iter_entries(fd):
+                max_siblings = max(max_siblings, len(entry.getparent()))
+
+        self.assertEqual(2000, number)
+        self.assertLess(max_siblings, 100)
+
+    def test_caches_hold_ids(self):
+        xml_file_path = os.path.join(self.tmp_dir, 'caches.xml.gz')
+        write_synthetic_xml(xml_file_path, 300)
+
+        db = self.get_db('caches')
+        db.batch_commit_after = 20
+
+        try:
+            db.import_xml(xml_file_path, silent=True)
+
+            caches = (db.pmids, db.keywords, db.subcellular_locations, db.tissues, db.diseases)
+            self.assertTrue(all(isinstance(value, int) for cache in caches for value in cache.values()))
+            self.assertEqual([], db.new_cached)
+
+            # shared rows committed in earlier batches are linked by id, not inserted again
+            with open(xml_file_path[:-3], 'wb') as fd, gzip.open(xml_file_path) as gz_fd:
+                shutil.copyfileobj(gz_fd, fd)
+
+            keywords = set()
+            locations = set()
+
+            for _, entry in iterparse(xml_file_path[:-3], tag=ENTRY):
+                keywords.add(entry.find('n:keyword', namespaces=XN).get('id'))
+                locations.add(entry.find('n:comment/n:subcellularLocation/n:location', namespaces=XN).text)
+
+            self.assertLess(len(keywords), 300)
+            self.assertEqual(len(keywords), db.session.query(models.Keyword).count())
+            self.assertEqual(len(locations), db.session.query(models.SubcellularLocation).count())
+            self.assertEqual(300, db.session.query(models.entry_keyword).count())
+            self.assertEqual(300, db.session.query(models.entry_subcellular_location).count())
+            self.assertTrue(all(len(entry.keywords) == 1 for entry in db.session.query(models.Entry)))
+        finally:
+            db.session.close()
+
+    def test_no_cache_queries(self):
+        db = self.get_db('cache_queries')
+        statements = []
+
+        def log_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', log_statement)
+        db.import_xml(self.xml_file_path, silent=True)
+        event.remove(db.engine, 'before_cursor_execute', log_statement)
+
+        for table in ('pyuniprot_pmid', 'pyuniprot_disease'):
+            selects = [x for x in statements if x.startswith('SELECT') and 'FROM ' + table in x]
+            self.assertEqual(1, len(selects))  # only loading of existing rows in cache before import
+            self.assertNotIn('WHERE', selects[0])
+
+        self.assertEqual(18, db.session.query(models.Pmid).count())
+        self.assertEqual(18, len({x.pmid for x in db.session.query(models.Pmid).all()}))
+
+        disease_comment = db.session.query(models.DiseaseComment).one()
+        self.assertEqual('DI-02231', disease_comment.disease.identifier)
+
+        db.session.close()
+
+    def test_single_pass_extractor(self):
+        for _, entry in iterparse(self.xml_file_path, events=('end',), tag=ENTRY):
+            self.assertIsNone(extract_entry_rows(entry, taxids=[-1]))
+            single_pass_rows = extract_entry_rows(entry)
+            self.assertEqual(DbManager.get_entry_rows(entry), single_pass_rows)  # get_sequence clears sequence
+
+    def test_benchmark_extraction(self):
+        results = benchmark_extraction(self.gz_file_path)
+        self.assertEqual(4, results['entries'])
+        self.assertGreater(results['per_getter'], 0)
+        self.assertGreater(results['single_pass'], 0)
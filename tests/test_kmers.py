@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+import numpy as np
+
+from pyuniprot.constants import PYUNIPROT_DATA_DIR
+from pyuniprot.manager import models
+from pyuniprot.manager.compression import PACK
+from pyuniprot.manager.database import DbManager
+from pyuniprot.manager.kmers import (KmerIndexBuilder, decode_postings, encode_postings, get_kmer, get_kmer_codes,
+                                     get_kmer_keys, get_pattern_kmers, intersect_postings, iter_postings, parse_motif)
+from pyuniprot.manager.query import QueryManager
+from pyuniprot.manager.synthetic import write_synthetic_version_file, write_synthetic_xml
+
+
+class TestKmers(unittest.TestCase):
+
+    def test_kmer_codes(self):
+        codes, indexes = get_kmer_codes(['MKVLA', 'AB', 'MKV*LLLL'], 4)
+        self.assertEqual(['MKVL', 'KVLA', 'LLLL'], [get_kmer(int(code), 4) for code in codes])
+        self.assertEqual([0, 0, 2], indexes.tolist())
+
+        self.assertEqual(0, get_kmer_codes(['MK'], 4)[0].size)
+
+    def test_postings(self):
+        for ids in ([1], [3, 7, 100000], list(range(5, 50000, 3))):
+            ids = np.array(ids, dtype=np.int64)
+            self.assertEqual(ids.tolist(), decode_postings(encode_postings(ids)).tolist())
+
+        codes, indexes = get_kmer_codes(['MKVLA', 'MKVLL', 'MKVLA'], 4)
+        keys = get_kmer_keys(codes, np.array([10, 20, 30])[indexes])
+        postings = [(kmer, sequences, decode_postings(data).tolist())
+                    for kmer, sequences, data in iter_postings(keys, 4)]
+        self.assertEqual([('KVLA', 2, [10, 30]), ('KVLL', 1, [20]), ('MKVL', 3, [10, 20, 30])], postings)
+
+        self.assertEqual([5], intersect_postings([np.array([1, 5, 9]), np.array([5]), np.array([2, 5, 9])]).tolist())
+
+    def test_builder(self):
+        sequences = ['MKVLAGHWYT'[i:] + 'ACDEFGHIKLMNPQRSTVWY'[:i * 2] for i in range(10)] * 20
+
+        def build(max_pairs, directory=None):
+            builder = KmerIndexBuilder(4, max_pairs, chunk_size=7, directory=directory)
+
+            for sequence_id, sequence in enumerate(sequences, 1):
+                builder.add(sequence_id, sequence)
+            builder.add(len(sequences) + 1, None)
+
+            return builder, list(builder.iter_postings())
+
+        builder, expected = build(10 ** 6)
+        self.assertEqual([], builder.runs)
+        self.assertEqual(sorted(expected), expected)
+
+        tmp_dir = tempfile.mkdtemp()
+
+        try:
+            # sorted runs are spilled and merged by ranges of k-mers
+            builder, postings = build(50, tmp_dir)
+            self.assertGreater(len(builder.runs), 10)
+            self.assertEqual(expected, postings)
+
+            builder.close()
+            self.assertEqual([], os.listdir(tmp_dir))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_parse_motif(self):
+        regex, kmers = parse_motif('n[^p][st]x.MKVLAG')
+        self.assertEqual('N[^P][ST]..MKVLAG', regex.pattern)
+        self.assertEqual(['KVLA', 'MKVL', 'VLAG'], kmers)
+
+        self.assertEqual([], parse_motif('NX[ST]')[1])
+        self.assertRaises(ValueError, parse_motif, 'MK*')
+        self.assertRaises(ValueError, parse_motif, '[ST')
+        self.assertRaises(ValueError, parse_motif, '')
+
+    def test_pattern_kmers(self):
+        self.assertEqual(['KVLA', 'MKVL'], get_pattern_kmers('%mkvla_G%'))
+        self.assertEqual([], get_pattern_kmers('MK%VL_AG'))
+
+
+class TestSequenceSearch(unittest.TestCase):
+
+    def setUp(self):
+        # removed by other tests, downloads are copied into it
+        if not os.path.exists(PYUNIPROT_DATA_DIR):
+            os.mkdir(PYUNIPROT_DATA_DIR)
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.xml_file_path = os.path.join(self.tmp_dir, 'kmers.xml.gz')
+        self.version_file_path = os.path.join(self.tmp_dir, 'reldate.txt')
+        write_synthetic_xml(self.xml_file_path, 100)
+        write_synthetic_version_file(self.version_file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def import_xml(self, name, **kwargs):
+        connection = 'sqlite:///' + os.path.join(self.tmp_dir, name + '.db')
+        db = DbManager(connection)
+        db._create_tables()
+        db.import_version(self.version_file_path)
+        db.import_xml(self.xml_file_path, silent=True, **kwargs)
+        return db, QueryManager(connection=connection)
+
+    def get_motifs(self, db):
+        sequence = db.session.query(models.Sequence).order_by(models.Sequence.id).first().sequence
+        return [sequence[10:16], sequence[40:44], 'MKVLAGHWYT', sequence[20:22] + 'x[' + sequence[23] + 'W]' +
+                sequence[24:29], 'W[^P]W', 'ACDE']
+
+    def search(self, query, motif):
+        return [sequence.id for sequence in query.sequence_search(motif)]
+
+    def test_sequence_search(self):
+        for compression in (None, PACK):
+            db, query = self.import_xml('search_{}'.format(compression), sequence_compression=compression)
+
+            try:
+                motifs = self.get_motifs(db)
+                sequences = db.session.query(models.Sequence).order_by(models.Sequence.id).all()
+                expected = {motif: [sequence.id for sequence in sequences
+                                    if parse_motif(motif)[0].search(sequence.sequence)] for motif in motifs}
+
+                # without index all sequences are scanned
+                self.assertIsNone(query.get_kmer_size())
+                self.assertEqual(expected, {motif: self.search(query, motif) for motif in motifs})
+
+                # several sorted runs spilled and merged
+                kmers = db.build_kmer_index(max_pairs=10000, chunk_size=40)
+                self.assertEqual(kmers, db.session.query(models.SequenceKmer).count())
+                self.assertEqual(4, query.get_kmer_size())
+                self.assertEqual(expected, {motif: self.search(query, motif) for motif in motifs})
+
+                self.assertGreater(len(expected[motifs[0]]), 0)
+                self.assertEqual([], expected['MKVLAGHWYT'])
+
+                db.build_kmer_index(3)
+                self.assertEqual(3, query.get_kmer_size())
+                self.assertEqual(expected, {motif: self.search(query, motif) for motif in motifs})
+            finally:
+                query.session.close()
+                db.session.close()
+
+    def get_kmer_rows(self, db):
+        table = models.SequenceKmer.__table__
+        return db.session.execute(table.select().order_by(table.c.kmer)).all()
+
+    def test_index_built_during_import(self):
+        connection = 'sqlite:///' + os.path.join(self.tmp_dir, 'import.db')
+        db = DbManager(connection)
+
+        # release files are copied into the data folder, copies of other tests are restored afterwards
+        version_file_path = DbManager.get_path_to_file_from_url(self.version_file_path)
+        backup_path = os.path.join(self.tmp_dir, 'reldate.txt.backup')
+
+        if os.path.exists(version_file_path):
+            shutil.copy(version_file_path, backup_path)
+
+        try:
+            # k-mers are collected by the bulk writer, the sequence table is not read again
+            with mock.patch.object(DbManager, '_iter_sequence_chunks', side_effect=AssertionError):
+                db.db_import_xml(self.xml_file_path, silent=True, extract=False, bulk=True, kmer_index=True)
+            expected = self.get_kmer_rows(db)
+            self.assertGreater(len(expected), 0)
+
+            db.build_kmer_index(max_pairs=10000)
+            self.assertEqual(expected, self.get_kmer_rows(db))
+
+            # an existing k-mer index is rebuilt by a full update
+            db.build_kmer_index(3)
+
+            with mock.patch.object(DbManager, '_iter_sequence_chunks', side_effect=AssertionError):
+                db.db_import_xml(self.xml_file_path, silent=True, extract=False, bulk=True)
+            self.assertEqual(3, db.get_kmer_size())
+
+            # k-mers of an ORM import are read from the sequence table
+            db.db_import_xml(self.xml_file_path, silent=True, extract=False)
+            self.assertEqual(3, db.get_kmer_size())
+        finally:
+            db.session.close()
+
+            os.remove(DbManager.get_path_to_file_from_url(self.xml_file_path))
+
+            if os.path.exists(backup_path):
+                shutil.copy(backup_path, version_file_path)
+            else:
+                os.remove(version_file_path)
+
+    def test_failed_rebuild(self):
+        db, query = self.import_xml('rebuild')
+
+        try:
+            db.build_kmer_index()
+            expected = self.get_kmer_rows(db)
+            iter_postings = KmerIndexBuilder.iter_postings
+
+            def failing_postings(builder):
+                yield from list(iter_postings(builder))[:100]
+                raise IOError('disk full')
+
+            # the old index is kept until the new index is committed
+            with mock.patch.object(KmerIndexBuilder, 'iter_postings', failing_postings):
+                self.assertRaises(IOError, db.build_kmer_index, chunk_size=40)
+
+            self.assertEqual(expected, self.get_kmer_rows(db))
+        finally:
+            query.session.close()
+            db.session.close()
+
+    def test_limit_and_df(self):
+        db, query = self.import_xml('limit')
+
+        try:
+            db.build_kmer_index()
+            expected = self.search(query, 'W[^P]W')
+            self.assertGreater(len(expected), 3)
+
+            self.assertEqual(expected[:2], [s.id for s in query.sequence_search('W[^P]W', limit=2)])
+            self.assertEqual(expected[2:4], [s.id for s in query.sequence_search('W[^P]W', limit=(1, 2))])
+
+            df = query.sequence_search('w[^p]w', as_df=True, chunk_size=2)
+            self.assertEqual(expected, list(df['id']))
+            self.assertNotIn('compressed_sequence', df.columns)
+
+            self.assertEqual(0, len(query.sequence_search('MKVLAGHWYT', as_df=True)))
+        finally:
+            query.session.close()
+            db.session.close()
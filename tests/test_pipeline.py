@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from functools import partial
+
+from pyuniprot.manager import models
+from pyuniprot.manager.database import DbManager
+from pyuniprot.manager.pipeline import Batch, ImportPipeline
+from pyuniprot.manager.synthetic import write_synthetic_version_file, write_synthetic_xml
+
+
+def iter_batches(number, entries=10, delay=0.0):
+    for index in range(number):
+        time.sleep(delay)
+        yield Batch(index, entries, (index + 1) * entries)
+
+
+class TestImportPipeline(unittest.TestCase):
+
+    def test_commit_order(self):
+        committed = []
+        threads = set()
+        rng = random.Random(0)
+
+        def write(batch):
+            threads.add(threading.get_ident())
+            time.sleep(rng.random() * 0.01)
+            return lambda: committed.append(batch.data)
+
+        pipeline = ImportPipeline(iter_batches(50), write, writers=3)
+        pipeline.run()
+
+        self.assertEqual(list(range(50)), committed)
+        self.assertEqual(3, len(threads))
+
+        stats = pipeline.get_stats()
+        self.assertEqual(500, stats['parser']['entries'])
+        self.assertEqual(500, stats['writer']['entries'])
+        self.assertEqual(50, stats['writer']['batches'])
+
+    def test_backpressure(self):
+        produced = []
+
+        def batches():
+            for batch in iter_batches(20):
+                produced.append(batch.data)
+                yield batch
+
+        def write(batch):
+            # parser is never more than queue size (+ batch in writer and batch waiting for queue) ahead
+            self.assertLessEqual(len(produced) - batch.data, 2 + 2)
+            time.sleep(0.01)
+
+        pipeline = ImportPipeline(batches(), write, queue_size=2)
+        pipeline.run()
+
+        stats = pipeline.get_stats()
+        self.assertLessEqual(stats['queue_depth_max'], 2)
+        self.assertGreater(stats['parser']['wait_seconds'], stats['writer']['wait_seconds'])
+        self.assertIn('batches in queue', pipeline.get_status())
+
+    def test_writer_error(self):
+        produced = []
+
+        def batches():
+            for batch in iter_batches(1000):
+                produced.append(batch)
+                yield batch
+
+        def write(batch):
+            if batch.data == 3:
+                raise ValueError('write failed')
+
+        pipeline = ImportPipeline(batches(), write, writers=2, queue_size=2)
+        self.assertRaises(ValueError, pipeline.run)
+        self.assertLess(len(produced), 20)
+
+    def test_rollback_after_error(self):
+        committed = []
+        rolled_back = []
+
+        def write(batch):
+            if batch.data == 3:
+                time.sleep(0.2)  # batch 4 is written by the other writer and waits for the commit of batch 3
+                raise ValueError('write failed')
+
+            commit = partial(committed.append, batch.data)
+            commit.rollback = partial(rolled_back.append, batch.data)
+            return commit
+
+        pipeline = ImportPipeline(iter_batches(1000), write, writers=2, queue_size=2)
+        self.assertRaises(ValueError, pipeline.run)
+
+        self.assertEqual([0, 1, 2], committed)
+        self.assertEqual([4], rolled_back)
+
+    def test_parser_error(self):
+        def batches():
+            yield Batch(0, 1, 1)
+            raise IOError('parse failed')
+
+        written = []
+        pipeline = ImportPipeline(batches(), written.append)
+        self.assertRaises(IOError, pipeline.run)
+        self.assertLessEqual(len(written), 1)  # batches in queue are not written after an error
+
+
+class TestPipelinedImport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.xml_file_path = os.path.join(self.tmp_dir, 'pipeline.xml.gz')
+        self.version_file_path = os.path.join(self.tmp_dir, 'reldate.txt')
+        write_synthetic_xml(self.xml_file_path, 300, shape={'features': (1, 3)})
+        write_synthetic_version_file(self.version_file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def get_db(self, name):
+        db = DbManager('sqlite:///' + os.path.join(self.tmp_dir, name + '.db'))
+        db._create_tables()
+        db.import_version(self.version_file_path)
+        return db
+
+    def count_rows(self, db):
+        return [db.session.query(model).count() for model in (models.Entry, models.Feature, models.Pmid,
+                                                               models.Keyword, models.Disease, models.Sequence)]
+
+    def test_import(self):
+        reference = self.get_db('reference')
+        reference.import_xml(self.xml_file_path, silent=True)
+        expected = self.count_rows(reference)
+        reference.session.close()
+
+        for bulk in (False, True):
+            db = self.get_db('pipeline_{}'.format(bulk))
+
+            try:
+                db.import_xml(self.xml_file_path, silent=True, bulk=bulk, batch_size=40, pipeline=True, writers=2)
+
+                self.assertEqual(expected, self.count_rows(db))
+
+                version = db.session.query(models.Version).filter_by(knowledgebase='Swiss-Prot').one()
+                self.assertEqual(300, version.import_checkpoint)
+                self.assertIsNotNone(version.import_completed_date)
+
+                stats = db.import_pipeline.get_stats()
+                self.assertEqual(1, stats['writers'])  # SQLite and ORM: one writer
+                self.assertEqual(300, stats['parser']['entries'])
+                self.assertEqual(300, stats['writer']['entries'])
+                self.assertEqual(8, stats['writer']['batches'])
+            finally:
+                db.session.close()
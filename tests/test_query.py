@@ -9,6 +9,7 @@ import datetime
 import pyuniprot
 
 from pandas.core.frame import DataFrame
+from sqlalchemy import text
 from pyuniprot.constants import PYUNIPROT_DATA_DIR
 from pyuniprot.manager.defaults import sqlalchemy_connection_string_4_tests
 from pyuniprot.manager import models
@@ -170,7 +171,10 @@ class TestQuery(unittest.TestCase):
         expected_feature = {
             'description': '5-hydroxytryptamine receptor 2A',
             'identifier': 'PRO_0000068949',
-            'type_': 'chain'}
+            'type_': 'chain',
+            'begin': 1,
+            'end': 470,
+            'position': None}
 
         for attribute, value in expected_feature.items():
             print(feature.__getattribute__(attribute))
@@ -271,6 +275,25 @@ class TestQuery(unittest.TestCase):
     def test_prop_datasets(self):
         self.assertEqual(self.query.datasets, ['Swiss-Prot'])
 
+    def test_query_feature_overlaps(self):
+        features = self.query.feature(accession='P50129', overlaps=120)
+        self.assertEqual([('chain', 1, 470), ('transmembrane region', 111, 132)],
+                         [(x.type_, x.begin, x.end) for x in features])
+
+        features = self.query.feature(entry_name='5HT2A_PIG', overlaps=(275, 285), type_='modified residue')
+        self.assertEqual([(280, 280, 280)], [(x.begin, x.end, x.position) for x in features])
+
+        self.assertEqual([], self.query.feature(accession='P50129', overlaps=(471, 500)))
+        self.assertEqual(2, len(self.query.feature(accession=('Q29004', 'O49434'), overlaps=60, type_='chain')))
+        self.assertRaises(ValueError, self.query.feature, overlaps=(10, 1))
+
+        df = self.query.feature(accession='P50129', overlaps=120, as_df=True)
+        self.assertEqual([1, 111], list(df['begin']))
+
+        plan = ' '.join(str(row) for row in self.query.session.execute(text(
+            'EXPLAIN QUERY PLAN SELECT id FROM pyuniprot_feature WHERE entry_id = 1 AND begin <= 120 AND "end" >= 120')))
+        self.assertIn('ix_pyuniprot_feature_location', plan)
+
     def test_feature_types(self):
         self.assertEqual(len(self.query.feature_types), 15)
 
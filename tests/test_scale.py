@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Scale test of the bulk import with synthetic TrEMBL entries.
+
+The number of entries is set with the environment variable PYUNIPROT_SCALE_ENTRIES (default 5000), e.g. for a test
+over tens of millions of entries::
+
+    PYUNIPROT_SCALE_ENTRIES=20000000 python -m pytest tests/test_scale.py -s
+"""
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from sqlalchemy import event
+
+from pyuniprot.manager import models
+from pyuniprot.manager.database import DbManager
+from pyuniprot.manager.synthetic import SyntheticXmlFile
+
+log = logging.getLogger(__name__)
+
+this_path = os.path.dirname(os.path.realpath(__file__))
+data_path = os.path.join(this_path, 'data')
+
+SCALE_ENTRIES = int(os.environ.get('PYUNIPROT_SCALE_ENTRIES', 5000))
+WINDOWS = 5
+
+
+class TestScale(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_sustained_trembl_import(self):
+        db = DbManager('sqlite:///' + os.path.join(self.tmp_dir, 'scale.db'))
+        db._create_tables(defer_constraints=True)
+        db.import_version(os.path.join(data_path, 'reldate.txt'))
+
+        checkpoints = []
+
+        def save_time(connection):
+            checkpoints.append((time.time(), db.entries_read))
+
+        event.listen(db.engine, 'commit', save_time)
+        start = time.time()
+        db.import_xml(SyntheticXmlFile(SCALE_ENTRIES, dataset='TrEMBL'), silent=True, bulk=True,
+                      knowledgebase='TrEMBL')
+        event.remove(db.engine, 'commit', save_time)
+
+        self.assertEqual(SCALE_ENTRIES, db.session.query(models.Entry).filter_by(dataset='TrEMBL').count())
+
+        # entries per second in windows of equal size
+        window_size = SCALE_ENTRIES // WINDOWS
+        window_start, window_entries = start, 0
+        rates = []
+
+        for checkpoint_time, entries in checkpoints:
+            if entries >= window_entries + window_size:
+                rates.append((entries - window_entries) / (checkpoint_time - window_start))
+                window_start, window_entries = checkpoint_time, entries
+
+        log.info('entries/s per window: %s', [round(rate) for rate in rates])
+        self.assertGreaterEqual(len(rates), WINDOWS - 1)
+
+        # no slow down with growing tables (first window includes warm up)
+        self.assertGreater(min(rates[1:]), 0.5 * max(rates[1:]))
+
+        db.session.close()